@@ -7,9 +7,10 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from config import config
+from app.utils.shard_routing import RoutingSession
 
-# Initialisation des extensions Flask
-db = SQLAlchemy()
+# Initialisation des extensions Flask (session routant les réponses vers leur shard)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 login_manager = LoginManager()
 migrate = Migrate()
 
@@ -32,8 +33,13 @@ def create_app(config_name=None):
     # Charger la configuration
     app.config.from_object(config[config_name])
     
-    # Initialiser les extensions avec l'application
+    # Initialiser les extensions avec l'application (moteurs selon le profil de base de données)
+    from app.utils.database import configure_engines, init_engines
+    from app.utils.shards import configure_shards, init_shards
+    configure_engines(app)
+    configure_shards(app)
     db.init_app(app)
+    init_engines(app)
     migrate.init_app(app, db)
     
     # Configuration de Flask-Login
@@ -74,8 +80,14 @@ def create_app(config_name=None):
     from app.routes.api import api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
+    # Écouteurs de session tenant à jour les compteurs des formulaires, du tableau de bord et les séries temporelles,
+    # masquage des formulaires supprimés et traitements des tâches de fond
+    from app.utils import counters, admin_stats, rollups, deletion  # noqa: F401
+    
     # Création des tables de base de données
     with app.app_context():
         db.create_all()
+    # Bases des réponses séparées (shards), s'il y en a
+    init_shards(app)
     
     return app
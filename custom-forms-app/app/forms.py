@@ -1,6 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField, TextAreaField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+from wtforms import StringField, PasswordField, SubmitField, BooleanField, SelectField, TextAreaField, IntegerField
+from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError, Optional, NumberRange
 from app.models import User
 
 class LoginForm(FlaskForm):
@@ -88,8 +88,27 @@ class FormBuilderForm(FlaskForm):
     auto_email_enabled = BooleanField('Activer l\'envoi automatique d\'emails', default=False)
     fixed_recipients = TextAreaField('Destinataires fixes', description='Un email par ligne. Ces adresses recevront une copie de chaque soumission.', validators=[Length(max=1000)])
     
+    rate_limit_per_ip = StringField('Limite de soumissions par IP', description='Ex: 10/minute, 100/hour. Laissez vide pour la limite par défaut, 0 pour désactiver.', validators=[Length(max=32)])
+    rate_limit_per_form = StringField('Limite de soumissions globale', description='Toutes IP confondues. Ex: 300/minute.', validators=[Length(max=32)])
+    geofence_mode = SelectField('Contrôle des zones autorisées', choices=[('off', 'Désactivé'), ('flag', 'Signaler les réponses hors zone'), ('reject', 'Refuser les réponses hors zone')], default='off', description='Vérifie que la position de la soumission est dans l\'une des zones importées (GeoJSON).')
+    retention_days = IntegerField('Durée de conservation (jours)', description='Au-delà, les données personnelles des réponses sont traitées. Laissez vide pour tout conserver.', validators=[Optional(), NumberRange(min=1, max=36500)])
+    retention_action = SelectField('À l\'expiration', choices=[('anonymize', 'Anonymiser (IP, position, pièces jointes)'), ('delete', 'Supprimer la réponse')], default='anonymize')
     submit = SubmitField('Enregistrer le formulaire')
 
+    def validate_rate_limit_per_ip(self, field):
+        _validate_rate_limit(field)
+
+    def validate_rate_limit_per_form(self, field):
+        _validate_rate_limit(field)
+
+def _validate_rate_limit(field):
+    from app.utils.ratelimit import parse_limit
+    if field.data:
+        try:
+            parse_limit(field.data)
+        except ValueError:
+            raise ValidationError('Format invalide. Utilisez par exemple "10/minute" ou "500/day".')
+
 class ShareForm(FlaskForm):
     email = StringField('Email de l\'utilisateur à partager', validators=[DataRequired(), Email()])
     can_edit = BooleanField('Peut modifier', default=False)
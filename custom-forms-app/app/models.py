@@ -64,7 +64,14 @@ class User(UserMixin, db.Model):
     def is_creator(self):
         """Vérifier si l'utilisateur peut créer des formulaires"""
         return self.role == 'creator' or self.role == 'admin'
-    
+
+    def can_view_form(self, form):
+        """Vérifier si l'utilisateur peut consulter les réponses d'un formulaire (propriétaire ou partage)"""
+        if form.user_id == self.id:
+            return True
+        share = self.shared_forms_with_me.filter_by(form_id=form.id).first()
+        return share is not None and share.can_view_responses
+
     def get_role_display(self):
         """Obtenir le nom d'affichage du rôle"""
         roles = {'user': 'Utilisateur', 'creator': 'Créateur', 'admin': 'Administrateur'}
@@ -99,10 +106,29 @@ class Form(db.Model):
     require_login_to_view = db.Column(db.Boolean, default=False)
     send_email_on_submit = db.Column(db.Boolean, default=False)
     email_recipients = db.Column(db.String(500))  # Comma-separated emails
+    rate_limit_per_ip = db.Column(db.String(32))  # Ex: "10/minute"; vide = limite par défaut
+    rate_limit_per_form = db.Column(db.String(32))  # Limite globale du formulaire, toutes IP confondues
+    geofence_mode = db.Column(db.String(10), nullable=False, default='off', server_default='off')  # 'off', 'flag' ou 'reject'
+    geofences_updated_at = db.Column(db.DateTime)  # Dernière modification des zones (invalide l'index en mémoire)
+    # Conservation des données personnelles (app/utils/retention.py): aucune limite si retention_days est vide
+    retention_days = db.Column(db.Integer)
+    retention_action = db.Column(db.String(10), nullable=False, default='anonymize', server_default='anonymize')  # 'anonymize' ou 'delete'
+    retention_applied_until = db.Column(db.DateTime)  # Réponses antérieures déjà traitées (remis à zéro si la règle change)
+    # Compteurs dénormalisés, tenus à jour à chaque écriture (app/utils/counters.py); ceux d'un formulaire
+    # placé dans un shard sont dans la base du shard (FormCounter)
+    response_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_submitted_at = db.Column(db.DateTime)
+    file_bytes = db.Column(db.BigInteger, nullable=False, default=0, server_default='0')  # Taille totale des fichiers reçus
+    # Suppression demandée: masqué de toutes les requêtes, effacé par une tâche de fond (app/utils/deletion.py)
+    deleted_at = db.Column(db.DateTime)
+    # Base des réponses (app/utils/shards.py): nom du shard, ou vide pour la base principale
+    shard = db.Column(db.String(64))
 
     # Relations
     responses = db.relationship('FormResponse', backref='form', lazy='dynamic')
     shares = db.relationship('FormShare', backref='form', lazy='dynamic')
+    drafts = db.relationship('FormDraft', backref='form', lazy='dynamic')
+    geofences = db.relationship('Geofence', backref='form', lazy='dynamic', cascade='all, delete-orphan')
     email_logs = db.relationship('EmailLog', backref='form', lazy='dynamic')
     
     def __repr__(self):
@@ -119,11 +145,24 @@ class FormResponse(db.Model):
     response_data = db.Column(db.JSON, nullable=False)  # Stores JSON of submitted data
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
     ip_address = db.Column(db.String(45))  # IPv4 or IPv6
+    ip_location = db.Column(db.String(255))  # Lieu déduit de l'adresse IP ("Ville, Région, Pays")
     geolocation = db.Column(db.String(255))  # e.g., "lat,lon" or "City, Country"
+    latitude = db.Column(db.Float)  # Coordonnées typées de la géolocalisation, pour les requêtes spatiales
+    longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))  # Indexé avec form_id (ix_form_responses_form_geohash)
+    address = db.Column(db.Text)  # Adresse issue du géocodage inverse de la géolocalisation
+    geofence_name = db.Column(db.String(255))  # Zone autorisée contenant la position
+    outside_geofence = db.Column(db.Boolean)  # Hors de toute zone (None si le contrôle est désactivé)
     additional_emails = db.Column(db.String(500))  # Emails entered in the form for specific notifications
+
+    __table_args__ = (
+        db.Index('ix_form_responses_form_geohash', 'form_id', 'geohash'),
+        db.Index('ix_form_responses_form_submitted', 'form_id', 'submitted_at', 'id'),  # Pagination par curseur
+    )
     
     # Relations
     files = db.relationship('FormFile', backref='response', lazy='dynamic', cascade='all, delete-orphan')
+    field_values = db.relationship('ResponseFieldValue', backref='response', lazy='dynamic', cascade='all, delete-orphan')
     email_logs = db.relationship('EmailLog', foreign_keys='EmailLog.response_id', backref='response', lazy='dynamic')
     
     def get_response_value(self, field_id):
@@ -142,6 +181,58 @@ class FormResponse(db.Model):
     def __repr__(self):
         return f'<FormResponse {self.id} for Form {self.form_id}>'
 
+class ResponseFieldValue(db.Model):
+    """Valeur d'un champ indexé d'une réponse, pour filtrer les réponses par valeur"""
+    
+    __tablename__ = 'response_field_values'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    response_id = db.Column(db.Integer, db.ForeignKey('form_responses.id', ondelete='CASCADE'), nullable=False, index=True)
+    form_id = db.Column(db.Integer, nullable=False)  # Recopié de la réponse: filtre sans jointure
+    field_id = db.Column(db.String(100), nullable=False)
+    value = db.Column(db.String(255), nullable=False)
+
+    __table_args__ = (db.Index('ix_response_field_values_lookup', 'form_id', 'field_id', 'value'),)
+    
+    def __repr__(self):
+        return f'<ResponseFieldValue {self.field_id}={self.value!r} for Response {self.response_id}>'
+
+class Geofence(db.Model):
+    """Modèle pour les zones autorisées (sites d'intervention) d'un formulaire"""
+    
+    __tablename__ = 'geofences'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    form_id = db.Column(db.Integer, db.ForeignKey('forms.id'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    geometry = db.Column(db.JSON, nullable=False)  # Polygones GeoJSON: [[anneau extérieur, trous...], ...]
+    # Rectangle englobant, pour le préfiltrage
+    min_lat = db.Column(db.Float, nullable=False)
+    min_lon = db.Column(db.Float, nullable=False)
+    max_lat = db.Column(db.Float, nullable=False)
+    max_lon = db.Column(db.Float, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<Geofence {self.name} for Form {self.form_id}>'
+
+class FormDraft(db.Model):
+    """Modèle pour les brouillons de réponses (sauvegarde automatique)"""
+    
+    __tablename__ = 'form_drafts'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    token = db.Column(db.String(36), unique=True, index=True, nullable=False, default=lambda: str(uuid.uuid4()))
+    form_id = db.Column(db.Integer, db.ForeignKey('forms.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)  # Null pour les brouillons anonymes
+    draft_data = db.Column(db.JSON, nullable=False, default=dict)  # Valeurs par identifiant de champ
+    version = db.Column(db.Integer, nullable=False, default=1)  # Incrémentée à chaque sauvegarde
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<FormDraft {self.token} for Form {self.form_id} v{self.version}>'
+
 class FormShare(db.Model):
     """Modèle pour le partage de formulaires entre utilisateurs"""
     
@@ -215,3 +306,148 @@ class EmailLog(db.Model):
     
     def __repr__(self):
         return f'<EmailLog {self.id} to {self.recipient_email} Status: {self.status}>'
+
+class AdminStat(db.Model):
+    """Compteurs matérialisés du tableau de bord administrateur (app/utils/admin_stats.py)"""
+    
+    __tablename__ = 'admin_stats'
+    
+    name = db.Column(db.String(64), primary_key=True)  # Ex: "users", "users.role.admin", "responses.day.2026-10-19"
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<AdminStat {self.name}={self.value}>'
+
+class SubmissionRollup(db.Model):
+    """Nombre de soumissions par formulaire, par heure ou par jour (app/utils/rollups.py)"""
+    
+    __tablename__ = 'submission_rollups'
+    
+    form_id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, primary_key=True, default=0)  # 0: tous les répondants; sinon série du répondant (par jour)
+    granularity = db.Column(db.String(5), primary_key=True)  # 'hour' ou 'day'
+    bucket = db.Column(db.DateTime, primary_key=True)  # Début de l'heure ou du jour (UTC)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<SubmissionRollup Form:{self.form_id} {self.granularity} {self.bucket}={self.count}>'
+
+class FormCounter(db.Model):
+    """Compteurs d'un formulaire placé dans un shard, tenus dans la base du shard (app/utils/counters.py)"""
+    
+    __tablename__ = 'form_counters'
+    
+    form_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    response_count = db.Column(db.Integer, nullable=False, default=0)
+    last_submitted_at = db.Column(db.DateTime)
+    file_bytes = db.Column(db.BigInteger, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<FormCounter Form:{self.form_id} {self.response_count}>'
+
+class ResponseArchive(db.Model):
+    """Bloc de réponses archivées: JSON compressé (zlib) des réponses d'un formulaire sur une période (app/utils/archive.py)"""
+    
+    __tablename__ = 'response_archives'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    form_id = db.Column(db.Integer, db.ForeignKey('forms.id'), nullable=False)
+    period_start = db.Column(db.DateTime, nullable=False)  # submitted_at de la première et de la dernière réponse du bloc
+    period_end = db.Column(db.DateTime, nullable=False)
+    min_response_id = db.Column(db.Integer, nullable=False)  # Bornes des identifiants: retrouver une réponse sans décompresser tous les blocs
+    max_response_id = db.Column(db.Integer, nullable=False)
+    response_count = db.Column(db.Integer, nullable=False)
+    raw_bytes = db.Column(db.Integer, nullable=False)  # Taille du JSON avant compression
+    payload = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (db.Index('ix_response_archives_form_period', 'form_id', 'period_start', 'period_end'),)
+    
+    def __repr__(self):
+        return f'<ResponseArchive {self.id} Form:{self.form_id} {self.response_count} réponse(s)>'
+
+class DatabaseShard(db.Model):
+    """Base SQLite séparée recevant les réponses de certains formulaires (app/utils/shards.py)"""
+    
+    __tablename__ = 'database_shards'
+    
+    id = db.Column(db.Integer, primary_key=True)  # Les identifiants des lignes du shard commencent à id << 40
+    name = db.Column(db.String(64), unique=True, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DatabaseShard {self.name}>'
+
+class DataMigrationCheckpoint(db.Model):
+    """Point de reprise d'une migration de données sur une base (app/utils/data_migrations.py)"""
+    
+    __tablename__ = 'data_migration_checkpoints'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Migration enregistrée (DATA_MIGRATIONS)
+    shard = db.Column(db.String(64), nullable=False, default='', server_default='')  # Base parcourue ('' = principale)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, running, paused, done, failed
+    options = db.Column(db.JSON)  # Options de l'exécution, reprises telles quelles après une interruption
+    last_id = db.Column(db.BigInteger, nullable=False, default=0)  # Dernier identifiant traité: reprise au lot suivant
+    processed = db.Column(db.Integer, nullable=False, default=0)  # Lignes lues
+    changed = db.Column(db.Integer, nullable=False, default=0)  # Lignes modifiées
+    total = db.Column(db.Integer, nullable=False, default=0)  # Lignes à lire (estimation au démarrage)
+    message = db.Column(db.String(255))  # Erreur
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)  # Dernier lot validé: une migration « running » inactive est reprise
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (db.UniqueConstraint('name', 'shard', name='uq_data_migration_checkpoints_name_shard'),)
+    
+    def to_dict(self):
+        """Convertir le point de reprise en dictionnaire"""
+        return {
+            'name': self.name,
+            'shard': self.shard or None,
+            'status': self.status,
+            'processed': self.processed,
+            'changed': self.changed,
+            'total': self.total,
+            'percent': round(100 * self.processed / self.total) if self.total else (100 if self.status == 'done' else 0),
+            'message': self.message,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<DataMigrationCheckpoint {self.name}:{self.shard or "-"} {self.status}>'
+
+class BackgroundJob(db.Model):
+    """Tâche de fond persistée, exécutée par lots (app/utils/jobs.py)"""
+    
+    __tablename__ = 'background_jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # Ex: 'delete_form'
+    target_id = db.Column(db.Integer)  # Objet concerné (formulaire...)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, done, failed
+    progress = db.Column(db.Integer, nullable=False, default=0)  # Éléments traités
+    total = db.Column(db.Integer, nullable=False, default=0)  # Éléments à traiter (estimation au démarrage)
+    message = db.Column(db.String(255))  # Étape en cours ou erreur
+    created_by = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)  # Dernier lot traité: une tâche « running » inactive est reprise
+    finished_at = db.Column(db.DateTime)
+    
+    def to_dict(self):
+        """Convertir la tâche en dictionnaire (API)"""
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'target_id': self.target_id,
+            'status': self.status,
+            'progress': self.progress,
+            'total': self.total,
+            'percent': round(100 * self.progress / self.total) if self.total else (100 if self.status == 'done' else 0),
+            'message': self.message,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+    
+    def __repr__(self):
+        return f'<BackgroundJob {self.id} {self.kind}:{self.target_id} {self.status}>'
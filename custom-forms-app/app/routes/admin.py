@@ -4,10 +4,13 @@ Routes d'administration pour la gestion des utilisateurs et du système
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from functools import wraps # Import functools
-from datetime import datetime, timedelta
 
 from app import db
-from app.models import User, Form, FormResponse, EmailLog
+from app.models import User, Form, FormResponse, EmailLog, BackgroundJob
+from app.utils.admin_stats import get_admin_stats
+from app.utils.counters import popular_forms as get_popular_forms
+from app.utils.deletion import schedule_form_deletion, DELETE_FORM_JOB
+from app.utils.jobs import start_jobs
 from app.forms import UserCreationForm, UserEditForm, ChangePasswordForm # Assurez-vous que ces formulaires existent
 
 # Création du blueprint admin
@@ -29,31 +32,24 @@ def admin_required(f):
 @admin_required
 def dashboard():
    """Tableau de bord administrateur"""
-   # Statistiques générales
-   total_users = User.query.count()
-   total_forms = Form.query.count()
-   total_responses = FormResponse.query.count()
-   active_forms = Form.query.filter_by(is_active=True).count()
+   # Statistiques générales, par rôle et activité récente (7 derniers jours):
+   # compteurs matérialisés, servis depuis un cache de courte durée
+   stats = get_admin_stats()
+   total_users = stats['users']
+   total_forms = stats['forms']
+   total_responses = stats['responses']
+   active_forms = stats['forms.active']
    
-   # Statistiques par rôle
-   admins_count = User.query.filter_by(role='admin').count()
-   creators_count = User.query.filter_by(role='creator').count()
-   users_count = User.query.filter_by(role='user').count()
+   admins_count = stats['users.role.admin']
+   creators_count = stats['users.role.creator']
+   users_count = stats['users.role.user']
    
-   # Activité récente (7 derniers jours)
-   week_ago = datetime.utcnow() - timedelta(days=7)
-   recent_users = User.query.filter(User.created_at >= week_ago).count()
-   recent_forms = Form.query.filter(Form.created_at >= week_ago).count()
-   recent_responses = FormResponse.query.filter(FormResponse.submitted_at >= week_ago).count()
+   recent_users = stats['recent_users']
+   recent_forms = stats['recent_forms']
+   recent_responses = stats['recent_responses']
    
    # Formulaires les plus populaires
-   popular_forms = db.session.query(
-       Form.title,
-       Form.id,
-       db.func.count(FormResponse.id).label('response_count')
-   ).outerjoin(FormResponse).group_by(Form.id).order_by(
-       db.func.count(FormResponse.id).desc()
-   ).limit(5).all()
+   popular_forms = get_popular_forms(5)
    
    # Utilisateurs récents
    recent_users_list = User.query.order_by(User.created_at.desc()).limit(5).all()
@@ -253,8 +249,12 @@ def manage_forms():
    forms = query.order_by(Form.created_at.desc()).paginate(
        page=page, per_page=20, error_out=False
    )
+   # Suppressions en cours ou échouées (tâches de fond)
+   deletion_jobs = BackgroundJob.query.filter(
+       BackgroundJob.kind == DELETE_FORM_JOB, BackgroundJob.status != 'done'
+   ).order_by(BackgroundJob.id.desc()).limit(20).all()
    
-   return render_template('admin/manage_forms.html', forms=forms, search=search)
+   return render_template('admin/manage_forms.html', forms=forms, search=search, deletion_jobs=deletion_jobs)
 
 @admin_bp.route('/forms/<int:form_id>/toggle-status', methods=['POST'])
 @admin_required
@@ -282,9 +282,11 @@ def toggle_form_status(form_id):
 def delete_form(form_id):
     form = Form.query.get_or_404(form_id)
     try:
-        db.session.delete(form)
+        # Formulaire masqué tout de suite, données effacées par lots en tâche de fond
+        schedule_form_deletion(form, current_user.id)
         db.session.commit()
-        flash(f'Formulaire "{form.title}" supprimé avec succès!', 'success')
+        start_jobs()
+        flash(f'Formulaire "{form.title}" supprimé. Ses données sont effacées en arrière-plan.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Erreur lors de la suppression du formulaire: {e}', 'danger')
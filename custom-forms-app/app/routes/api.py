@@ -1,13 +1,31 @@
-from flask import Blueprint, jsonify, request, current_app, send_from_directory
+from flask import Blueprint, jsonify, request, current_app, send_from_directory, send_file, abort, url_for
 from flask_login import login_required, current_user
-from app.models import Form, FormResponse, FormFile, User, EmailLog, FormShare
+from app.models import Form, FormResponse, FormFile, FormDraft, User, EmailLog, FormShare, BackgroundJob
 from app import db
-from app.utils.helpers import allowed_file, save_file, delete_file, get_file_size
+from app.utils.helpers import allowed_file, save_file, delete_file, get_file_size, is_safe_path, API_SIGNATURE_KEY
 from app.utils.exports import export_to_excel, export_to_pdf
 from app.utils.email_service import send_form_submission_email
+from app.utils.validation import get_form_validator
+from app.utils.ingest import persist_response, IngestTimeoutError, DraftAlreadySubmittedError
+from app.utils.async_ingest import get_submission_limiter, run_blocking
+from app.utils.ratelimit import draft_upload_rate_limited, submission_rate_limited
+from app.utils.geocoding import address_for, reverse_geocode
+from app.utils.ipgeo import ip_location_for
+from app.utils.geo import geo_columns
+from app.utils.geofence import check_geofence, geofence_rejects, GEOFENCE_REJECT_MESSAGE
+from app.utils.spatial import responses_in_bbox, responses_within_radius
+from app.utils.clusters import get_clusters, MAX_ZOOM
+from app.utils.field_index import indexed_field_ids, sync_field_index, parse_field_filters, field_filter_conditions
+from app.utils.search import search_responses
+from app.utils.database import read_session
+from app.utils.archive import get_archived_responses
+from app.utils.rollups import submission_series, top_respondents
+from app.utils.drafts import (apply_draft_patch, attach_draft_file, build_draft_response_data,
+                              delete_draft_files, draft_validation_values, new_response_files, DraftConflictError)
+from app.utils.signatures import is_stroke_data, save_signature_strokes, render_signature, RENDER_SIZES
 import os
-import json
-from datetime import datetime
+import asyncio
+from datetime import datetime, timedelta
 from functools import wraps
 
 api_bp = Blueprint('api', __name__)
@@ -25,7 +43,125 @@ def form_edit_access_required(f):
         return f(form_id, *args, **kwargs)
     return decorated_function
 
+def _validate_submission(form, form_data):
+    # Valider les données avant toute écriture de fichier ou en base
+    validator = get_form_validator(form)
+    values = dict(form_data)
+    values.update({name: fs.filename for name, fs in request.files.items() if fs and fs.filename})
+    for field in validator.fields:
+        if field.type == 'signature':
+            values.setdefault(field.name, form_data.get('signature_data'))
+        elif field.type == 'geolocation' and form_data.get('latitude') and form_data.get('longitude'):
+            values.setdefault(field.name, f"{form_data['latitude']},{form_data['longitude']}")
+        elif field.type == 'checkbox':
+            values[field.name] = form_data.get(field.name) in ('on', 'true', '1')
+    errors = validator.validate(values, key='name')
+
+    # Contrôle des zones autorisées (position envoyée dans latitude/longitude), réutilisé par _build_response
+    latitude, longitude = form_data.get('latitude'), form_data.get('longitude')
+    geofence = check_geofence(form, f"{latitude},{longitude}" if latitude and longitude else None)
+    if geofence_rejects(form, geofence):
+        errors['geolocation'] = GEOFENCE_REJECT_MESSAGE
+    return errors, geofence
+
+def _rejected_upload():
+    # Premier fichier non autorisé ou vide, vérifié avant toute écriture
+    for file_storage in request.files.values():
+        if file_storage and not allowed_file(file_storage.filename):
+            return file_storage
+    return None
+
+def _save_upload(field_name, file_storage, upload_folder):
+    filename = save_file(file_storage, upload_folder)
+    return {
+        'field_id': field_name,
+        'filename': filename,
+        'original_filename': file_storage.filename,
+        'file_size': get_file_size(os.path.join(upload_folder, filename)),
+        'mime_type': file_storage.mimetype
+    }
+
+def _save_signature(signature_data_url, upload_folder):
+    if is_stroke_data(signature_data_url):
+        # Signature vectorielle: traits compressés, métadonnées stockées dans la réponse (comme fill_form)
+        return save_signature_strokes(signature_data_url, upload_folder)
+    # La signature est une image base64, la sauvegarder comme fichier
+    return save_file(signature_data_url, upload_folder, is_base64=True)
+
+def _saved_filenames(uploaded_files_data, signature=None):
+    # Fichiers écrits pour une soumission: pièces jointes, signature (vectorielle: dict, image: nom du fichier)
+    filenames = [file_data['filename'] for file_data in uploaded_files_data]
+    if isinstance(signature, dict):
+        filenames.append(signature['filename'])
+    elif signature:
+        filenames.append(signature)
+    return filenames
+
+def _discard_files(upload_folder, filenames):
+    # Fichiers écrits pour une réponse qui n'a pas été enregistrée
+    for filename in filenames:
+        delete_file(os.path.join(upload_folder, filename))
+
+def _build_response(form, form_data, uploaded_files_data, geofence):
+    # Colonnes de la réponse et de ses fichiers, à partir des données restantes
+    latitude = form_data.pop('latitude', None)
+    longitude = form_data.pop('longitude', None)
+    geolocation = f"{latitude},{longitude}" if latitude and longitude else None
+    # Adresse calculée côté serveur; celle envoyée par le navigateur ne sert qu'en l'absence de référentiel
+    client_address = form_data.pop('address', None)
+    address = address_for(geolocation) or client_address or None
+
+    additional_emails_str = form_data.pop('additional_emails', '')
+    additional_emails = [e.strip() for e in additional_emails_str.split(',') if e.strip()]
+
+    values = dict(
+        form_id=form.id,
+        user_id=current_user.id if current_user.is_authenticated else None,
+        response_data=form_data,
+        ip_address=request.remote_addr,
+        ip_location=ip_location_for(request.remote_addr),
+        geolocation=geolocation,
+        **geo_columns(geolocation),
+        **geofence,
+        address=address,
+        additional_emails=','.join(additional_emails) if additional_emails else None
+    )
+    files = [dict(
+        field_id=file_data['field_id'],
+        filename=file_data['filename'],
+        original_filename=file_data['original_filename'],
+        file_size=file_data['file_size'],
+        mime_type=file_data['mime_type']
+    ) for file_data in uploaded_files_data]
+    return values, files, additional_emails
+
+def _notify_submission(form, response_id, additional_emails):
+    # Envoi d'emails si activé
+    if not form.send_email_on_submit:
+        return
+    recipient_list = []
+
+    # Ajouter les destinataires fixes
+    if form.email_recipients:
+        recipient_list.extend([e.strip() for e in form.email_recipients.split(',') if e.strip()])
+
+    # Ajouter les emails additionnels saisis par l'utilisateur
+    recipient_list.extend(additional_emails)
+
+    # Supprimer les doublons et les emails vides
+    recipient_list = list(set(filter(None, recipient_list)))
+
+    if recipient_list:
+        try:
+            response = FormResponse.query.get(response_id)
+            send_form_submission_email(form, response, recipient_list)
+            current_app.logger.info(f"Emails envoyés pour la réponse {response_id} du formulaire {form.id}")
+        except Exception as e:
+            current_app.logger.error(f"Erreur lors de l'envoi des emails pour la réponse {response_id}: {e}")
+            # Ne pas bloquer la soumission du formulaire si l'email échoue
+
 @api_bp.route('/forms/<int:form_id>/submit', methods=['POST'])
+@submission_rate_limited
 def submit_form(form_id):
     form = Form.query.get_or_404(form_id)
     
@@ -36,114 +172,137 @@ def submit_form(form_id):
     # Récupérer les données du formulaire
     form_data = request.form.to_dict()
     
+    errors, geofence = _validate_submission(form, form_data)
+    if errors:
+        return jsonify({'success': False, 'message': 'Données invalides.', 'errors': errors}), 400
+
+    rejected = _rejected_upload()
+    if rejected is not None:
+        current_app.logger.warning(f"Fichier non autorisé ou vide: {rejected.filename}")
+        return jsonify({'success': False, 'message': f'Type de fichier non autorisé ou fichier vide: {rejected.filename}.'}), 400
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+
     # Gérer les fichiers uploadés
     uploaded_files_data = []
     for field_name, file_storage in request.files.items():
-        if file_storage and allowed_file(file_storage.filename):
-            try:
-                filename = save_file(file_storage, current_app.config['UPLOAD_FOLDER'])
-                file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file_size = get_file_size(file_path)
-                mime_type = file_storage.mimetype
-                
-                uploaded_files_data.append({
-                    'field_id': field_name,
-                    'filename': filename,
-                    'original_filename': file_storage.filename,
-                    'file_size': file_size,
-                    'mime_type': mime_type
-                })
-                # Remplacer la valeur du champ par le nom du fichier sauvegardé
-                form_data[field_name] = filename 
-            except Exception as e:
-                current_app.logger.error(f"Erreur lors de l'upload du fichier {file_storage.filename}: {e}")
-                return jsonify({'success': False, 'message': f'Erreur lors de l\'upload du fichier {file_storage.filename}.'}), 500
-        elif file_storage: # Fichier non autorisé ou vide
-            current_app.logger.warning(f"Fichier non autorisé ou vide: {file_storage.filename}")
-            return jsonify({'success': False, 'message': f'Type de fichier non autorisé ou fichier vide: {file_storage.filename}.'}), 400
+        if not file_storage:
+            continue
+        try:
+            uploaded_files_data.append(_save_upload(field_name, file_storage, upload_folder))
+            # Remplacer la valeur du champ par le nom du fichier sauvegardé
+            form_data[field_name] = uploaded_files_data[-1]['filename']
+        except Exception as e:
+            _discard_files(upload_folder, _saved_filenames(uploaded_files_data))
+            current_app.logger.error(f"Erreur lors de l'upload du fichier {file_storage.filename}: {e}")
+            return jsonify({'success': False, 'message': f'Erreur lors de l\'upload du fichier {file_storage.filename}.'}), 500
 
     # Gérer la signature
     signature_data_url = form_data.pop('signature_data', None)
-    signature_filename = None
     if signature_data_url:
         try:
-            # La signature est une image base64, la sauvegarder comme fichier
-            signature_filename = save_file(signature_data_url, current_app.config['UPLOAD_FOLDER'], is_base64=True)
-            form_data['signature'] = signature_filename # Ajouter le nom du fichier de signature aux réponses
+            form_data[API_SIGNATURE_KEY] = _save_signature(signature_data_url, upload_folder)
         except Exception as e:
+            _discard_files(upload_folder, _saved_filenames(uploaded_files_data))
             current_app.logger.error(f"Erreur lors de la sauvegarde de la signature: {e}")
             return jsonify({'success': False, 'message': 'Erreur lors de la sauvegarde de la signature.'}), 500
 
-    # Gérer la géolocalisation
-    latitude = form_data.pop('latitude', None)
-    longitude = form_data.pop('longitude', None)
-    address = form_data.pop('address', None)
-
-    # Gérer les emails additionnels
-    additional_emails_str = form_data.pop('additional_emails', '')
-    additional_emails = [e.strip() for e in additional_emails_str.split(',') if e.strip()]
+    # Créer une nouvelle réponse (avec ses fichiers, dans la même transaction)
+    values, files, additional_emails = _build_response(form, form_data, uploaded_files_data, geofence)
+    # Réponse non enregistrée (un délai dépassé annule l'écriture): fichiers et signature supprimés
+    saved = _saved_filenames(uploaded_files_data, form_data.get(API_SIGNATURE_KEY))
+    try:
+        response_id = persist_response(values, files=files)
+    except IngestTimeoutError as e:
+        _discard_files(upload_folder, saved)
+        current_app.logger.error(f"Délai dépassé lors de la soumission du formulaire {form.id}: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 503
+    except Exception as e:
+        _discard_files(upload_folder, saved)
+        current_app.logger.error(f"Erreur lors de la soumission du formulaire {form.id}: {e}")
+        return jsonify({'success': False, 'message': f'Erreur lors de la soumission du formulaire: {e}'}), 500
 
-    # Créer une nouvelle réponse
-    response = FormResponse(
-        form_id=form.id,
-        user_id=current_user.id if current_user.is_authenticated else None,
-        responses_json=json.dumps(form_data),
-        ip_address=request.remote_addr,
-        latitude=latitude,
-        longitude=longitude,
-        address=address,
-        signature_filename=signature_filename,
-        additional_emails=json.dumps(additional_emails) if additional_emails else None
-    )
+    _notify_submission(form, response_id, additional_emails)
     
+    return jsonify({'success': True, 'message': 'Formulaire soumis avec succès!', 'response_id': response_id}), 200
+
+@api_bp.route('/forms/<int:form_id>/submit/async', methods=['POST'])
+@submission_rate_limited
+async def submit_form_async(form_id):
+    # Variante async: fichiers et signature écrits en parallèle dans le pool d'E/S,
+    # commit attendu sans bloquer la boucle d'événements.
+    # Le corps (potentiellement lent) est lu avant de réserver une place et une connexion
+    form_data = request.form.to_dict()
+
+    limiter = get_submission_limiter(current_app)
+    if not limiter.try_acquire():
+        response = jsonify({'success': False, 'message': 'Trop de soumissions en cours, veuillez réessayer.'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+
     try:
-        db.session.add(response)
-        db.session.commit()
+        form = Form.query.get_or_404(form_id)
+
+        if not form.is_active:
+            return jsonify({'success': False, 'message': 'Ce formulaire n\'est pas actif et ne peut pas être soumis.'}), 403
+
+        errors, geofence = _validate_submission(form, form_data)
+        if errors:
+            return jsonify({'success': False, 'message': 'Données invalides.', 'errors': errors}), 400
+
+        # Rendre la connexion au pool: le commit est fait depuis le pool d'E/S
+        db.session.close()
+
+        rejected = _rejected_upload()
+        if rejected is not None:
+            current_app.logger.warning(f"Fichier non autorisé ou vide: {rejected.filename}")
+            return jsonify({'success': False, 'message': f'Type de fichier non autorisé ou fichier vide: {rejected.filename}.'}), 400
 
-        # Enregistrer les fichiers liés à la réponse
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        uploads = [(name, fs) for name, fs in request.files.items() if fs]
+        signature_data_url = form_data.pop('signature_data', None)
+
+        tasks = [run_blocking(_save_upload, name, fs, upload_folder) for name, fs in uploads]
+        if signature_data_url:
+            tasks.append(run_blocking(_save_signature, signature_data_url, upload_folder))
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+        failed = [r for r in results if isinstance(r, Exception)]
+        if failed:
+            # Ne pas laisser de fichiers orphelins si une partie des écritures a échoué
+            signature = results[-1] if signature_data_url else None
+            _discard_files(upload_folder, _saved_filenames(
+                [r for r in results[:len(uploads)] if not isinstance(r, Exception)],
+                signature if not isinstance(signature, Exception) else None
+            ))
+            current_app.logger.error(f"Erreur lors de l'enregistrement des fichiers du formulaire {form.id}: {failed[0]}")
+            return jsonify({'success': False, 'message': 'Erreur lors de l\'enregistrement des fichiers.'}), 500
+
+        uploaded_files_data = results[:len(uploads)]
         for file_data in uploaded_files_data:
-            form_file = FormFile(
-                form_id=form.id,
-                response_id=response.id,
-                field_id=file_data['field_id'],
-                filename=file_data['filename'],
-                original_filename=file_data['original_filename'],
-                file_size=file_data['file_size'],
-                mime_type=file_data['mime_type']
-            )
-            db.session.add(form_file)
-        db.session.commit()
+            form_data[file_data['field_id']] = file_data['filename']
+        if signature_data_url:
+            form_data[API_SIGNATURE_KEY] = results[-1]
 
-        # Envoi d'emails si activé
-        if form.auto_email_enabled:
-            recipient_list = []
-            
-            # Ajouter le créateur du formulaire
-            if form.creator and form.creator.email:
-                recipient_list.append(form.creator.email)
-            
-            # Ajouter les destinataires fixes
-            recipient_list.extend(form.fixed_recipients_list)
-            
-            # Ajouter les emails additionnels saisis par l'utilisateur
-            recipient_list.extend(additional_emails)
-            
-            # Supprimer les doublons et les emails vides
-            recipient_list = list(set(filter(None, recipient_list)))
-
-            if recipient_list:
-                try:
-                    send_form_submission_email(form, response, recipient_list)
-                    current_app.logger.info(f"Emails envoyés pour la réponse {response.id} du formulaire {form.id}")
-                except Exception as e:
-                    current_app.logger.error(f"Erreur lors de l'envoi des emails pour la réponse {response.id}: {e}")
-                    # Ne pas bloquer la soumission du formulaire si l'email échoue
-        
-        return jsonify({'success': True, 'message': 'Formulaire soumis avec succès!', 'response_id': response.id}), 200
-    except Exception as e:
-        db.session.rollback()
-        current_app.logger.error(f"Erreur lors de la soumission du formulaire {form.id}: {e}")
-        return jsonify({'success': False, 'message': f'Erreur lors de la soumission du formulaire: {e}'}), 500
+        values, files, additional_emails = _build_response(form, form_data, uploaded_files_data, geofence)
+        # Réponse non enregistrée (un délai dépassé annule l'écriture): fichiers et signature supprimés
+        saved = _saved_filenames(uploaded_files_data, form_data.get(API_SIGNATURE_KEY))
+        try:
+            response_id = await run_blocking(persist_response, values, files=files)
+        except IngestTimeoutError as e:
+            _discard_files(upload_folder, saved)
+            current_app.logger.error(f"Délai dépassé lors de la soumission du formulaire {form.id}: {e}")
+            return jsonify({'success': False, 'message': str(e)}), 503
+        except Exception as e:
+            _discard_files(upload_folder, saved)
+            current_app.logger.error(f"Erreur lors de la soumission du formulaire {form.id}: {e}")
+            return jsonify({'success': False, 'message': f'Erreur lors de la soumission du formulaire: {e}'}), 500
+
+        _notify_submission(form, response_id, additional_emails)
+
+        return jsonify({'success': True, 'message': 'Formulaire soumis avec succès!', 'response_id': response_id}), 200
+    finally:
+        limiter.release()
 
 @api_bp.route('/forms/<int:form_id>/export/excel', methods=['GET'])
 @login_required
@@ -163,7 +322,10 @@ def export_form_responses_excel(form_id):
 @login_required
 def export_form_response_pdf(form_id, response_id):
     form = Form.query.get_or_404(form_id)
-    response = FormResponse.query.get_or_404(response_id)
+    # Réponse active, sinon relue dans les archives
+    response = FormResponse.query.get(response_id) or get_archived_responses(form.id, [response_id]).get(response_id)
+    if response is None:
+        abort(404)
     
     if not current_user.can_view_form(form) or response.form_id != form.id:
         return jsonify({'success': False, 'message': 'Accès non autorisé.'}), 403
@@ -175,11 +337,199 @@ def export_form_response_pdf(form_id, response_id):
         current_app.logger.error(f"Erreur lors de l'export PDF de la réponse {response_id} du formulaire {form_id}: {e}")
         return jsonify({'success': False, 'message': f'Erreur lors de l\'export PDF: {e}'}), 500
 
+def _spatial_limit():
+    limit = request.args.get('limit', 1000, type=int)
+    return max(1, min(limit, current_app.config.get('SPATIAL_MAX_RESULTS', 10000)))
+
+def _field_filter_conditions(form):
+    # Filtres field.<champ>=valeur sur les champs indexés (ValueError si le champ n'est pas indexé)
+    return field_filter_conditions(form.id, parse_field_filters(form, request.args))
+
+def _spatial_row(row, distance=None):
+    item = {
+        'id': row.id,
+        'latitude': row.latitude,
+        'longitude': row.longitude,
+        'submitted_at': row.submitted_at.isoformat()
+    }
+    if distance is not None:
+        item['distance_m'] = round(distance, 1)
+    return item
+
+@api_bp.route('/forms/<int:form_id>/responses/within', methods=['GET'])
+@login_required
+def responses_within_bbox(form_id):
+    # Réponses dans un rectangle: bbox=ouest,sud,est,nord (ordre de Leaflet toBBoxString)
+    form = Form.query.get_or_404(form_id)
+    if not current_user.can_view_form(form):
+        return jsonify({'success': False, 'message': 'Accès non autorisé.'}), 403
+
+    try:
+        west, south, east, north = (float(v) for v in request.args.get('bbox', '').split(','))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Paramètre bbox invalide (ouest,sud,est,nord).'}), 400
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180):
+        return jsonify({'success': False, 'message': 'Paramètre bbox invalide (ouest,sud,est,nord).'}), 400
+
+    try:
+        conditions = _field_filter_conditions(form)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    rows = responses_in_bbox(form.id, south, west, north, east, limit=_spatial_limit(), conditions=conditions)
+    return jsonify({'success': True, 'count': len(rows), 'responses': [_spatial_row(row) for row in rows]}), 200
+
+@api_bp.route('/forms/<int:form_id>/responses/nearby', methods=['GET'])
+@login_required
+def responses_nearby(form_id):
+    # Réponses à moins de radius mètres d'un point, les plus proches d'abord
+    form = Form.query.get_or_404(form_id)
+    if not current_user.can_view_form(form):
+        return jsonify({'success': False, 'message': 'Accès non autorisé.'}), 403
+
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    radius = request.args.get('radius', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'success': False, 'message': 'Paramètres lat et lon invalides.'}), 400
+    if radius is None or not 0 < radius <= current_app.config.get('SPATIAL_MAX_RADIUS_M', 100000):
+        return jsonify({'success': False, 'message': 'Paramètre radius invalide.'}), 400
+
+    try:
+        conditions = _field_filter_conditions(form)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    matches = responses_within_radius(form.id, lat, lon, radius, limit=_spatial_limit(), conditions=conditions)
+    return jsonify({
+        'success': True,
+        'count': len(matches),
+        'responses': [_spatial_row(row, distance) for row, distance in matches]
+    }), 200
+
+@api_bp.route('/forms/<int:form_id>/responses/search', methods=['GET'])
+@login_required
+def search_form_responses(form_id):
+    # Recherche plein texte (q), résultats par pertinence décroissante et paginés
+    form = Form.query.get_or_404(form_id)
+    if not current_user.can_view_form(form):
+        return jsonify({'success': False, 'message': 'Accès non autorisé.'}), 403
+
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'message': 'Paramètre q manquant.'}), 400
+    try:
+        filters = parse_field_filters(form, request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = max(1, min(request.args.get('per_page', current_app.config.get('SEARCH_RESULTS_PER_PAGE', 25), type=int), 100))
+    responses, has_next = search_responses(form.id, query, page=page, per_page=per_page, filters=filters,
+                                           session=read_session())
+    return jsonify({
+        'success': True,
+        'page': page,
+        'has_next': has_next,
+        'responses': [{
+            'id': r.id,
+            'submitted_at': r.submitted_at.isoformat(),
+            'response_data': r.response_data
+        } for r in responses]
+    }), 200
+
+def _parse_period(default_days):
+    # Période start/end (AAAA-MM-JJ ou ISO 8601, UTC, bornes incluses), par défaut les default_days derniers jours
+    end = request.args.get('end')
+    start = request.args.get('start')
+    end = datetime.fromisoformat(end) if end else datetime.utcnow()
+    if len(request.args.get('end', '')) == 10:
+        end = end.replace(hour=23, minute=59, second=59)
+    start = datetime.fromisoformat(start) if start else end - timedelta(days=default_days)
+    if start > end:
+        raise ValueError('Période invalide: start est postérieur à end.')
+    return start, end
+
+@api_bp.route('/forms/<int:form_id>/stats/submissions', methods=['GET'])
+@login_required
+def submission_stats(form_id):
+    # Courbe des soumissions lue dans les agrégats (jamais dans les réponses)
+    form = Form.query.get_or_404(form_id)
+    if not current_user.can_view_form(form):
+        return jsonify({'success': False, 'message': 'Accès non autorisé.'}), 403
+
+    granularity = request.args.get('granularity', 'day')
+    default_days = {'hour': 2, 'day': 90, 'month': 3 * 365}.get(granularity, 90)
+    try:
+        start, end = _parse_period(default_days)
+        series = submission_series(form.id, granularity, start, end, user_id=request.args.get('user_id', type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'granularity': granularity,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'total': sum(count for _, count in series),
+        'series': [{'t': bucket.isoformat(), 'count': count} for bucket, count in series],
+        'top_respondents': [
+            {'user_id': user_id, 'username': username, 'count': count}
+            for user_id, username, count in top_respondents(form.id, start, end)
+        ]
+    }), 200
+
+@api_bp.route('/forms/<int:form_id>/map/clusters', methods=['GET'])
+@login_required
+def map_clusters(form_id):
+    # Regroupements des réponses d'une tuile de la carte (z, x, y au format Leaflet)
+    form = Form.query.get_or_404(form_id)
+    if not current_user.can_view_form(form):
+        return jsonify({'success': False, 'message': 'Accès non autorisé.'}), 403
+
+    z = request.args.get('z', type=int)
+    x = request.args.get('x', type=int)
+    y = request.args.get('y', type=int)
+    if z is None or x is None or y is None or not 0 <= z <= MAX_ZOOM or not (0 <= x < 1 << z and 0 <= y < 1 << z):
+        return jsonify({'success': False, 'message': 'Paramètres de tuile invalides.'}), 400
+
+    response = jsonify({'success': True, 'clusters': get_clusters(form.id, z, x, y)})
+    response.headers['Cache-Control'] = 'private, max-age=30'
+    return response, 200
+
+@api_bp.route('/jobs/<int:job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    # Progression d'une tâche de fond (suppression d'un formulaire...)
+    job = BackgroundJob.query.get_or_404(job_id)
+    if job.created_by != current_user.id and not current_user.is_admin():
+        return jsonify({'success': False, 'message': 'Accès non autorisé.'}), 403
+    return jsonify({'success': True, 'job': job.to_dict()}), 200
+
 @api_bp.route('/files/<filename>', methods=['GET'])
 def serve_file(filename):
     # Sécurité: s'assurer que le fichier est dans le dossier d'upload
     return send_from_directory(current_app.config['UPLOAD_FOLDER'], filename)
 
+@api_bp.route('/signatures/<path:filename>', methods=['GET'])
+def serve_signature(filename):
+    # Rendu PNG d'une signature vectorielle à la taille demandée (mis en cache sur disque)
+    size = request.args.get('size', 'thumb')
+    if size not in RENDER_SIZES:
+        return jsonify({'error': 'Taille de rendu inconnue.'}), 400
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    if not filename.endswith('.sig') or not is_safe_path(filename, upload_folder) \
+            or not os.path.exists(os.path.join(upload_folder, filename)):
+        abort(404)
+
+    try:
+        render_path = render_signature(upload_folder, filename, size)
+    except Exception as e:
+        current_app.logger.error(f"Erreur lors du rendu de la signature {filename}: {e}")
+        abort(404)
+    return send_file(os.path.abspath(render_path), mimetype='image/png', max_age=86400)
+
 @api_bp.route('/forms/<int:form_id>/save_fields', methods=['POST'])
 @form_edit_access_required
 def save_form_fields(form_id):
@@ -190,8 +540,11 @@ def save_form_fields(form_id):
         if not data or 'form_data' not in data:
             return jsonify({'error': 'Données de formulaire manquantes.'}), 400
         
-        form_obj.form_data = json.dumps(data['form_data'])
+        previous_indexed = indexed_field_ids(form_obj.form_data)
+        form_obj.form_data = data['form_data']
         db.session.commit()
+        # Indexer les réponses existantes pour les champs nouvellement marqués « indexé »
+        sync_field_index(form_obj, previous_indexed)
         return jsonify({'message': 'Champs du formulaire sauvegardés avec succès!'}), 200
     except Exception as e:
         db.session.rollback()
@@ -205,9 +558,170 @@ def get_form_fields(form_id):
     
     try:
         if form_obj.form_data:
-            return jsonify(json.loads(form_obj.form_data)), 200
+            return jsonify(form_obj.form_data), 200
         else:
             return jsonify([]), 200 # Retourne un tableau vide si pas de données
     except Exception as e:
         current_app.logger.error(f"Error getting form fields for form {form_id}: {e}")
         return jsonify({'error': f'Erreur lors de la récupération des champs du formulaire: {e}'}), 500
+
+# Brouillons de réponses (sauvegarde automatique des formulaires longs)
+
+def _fill_access_error(form):
+    if not form.is_active:
+        return jsonify({'success': False, 'message': 'Ce formulaire n\'est pas actif et ne peut pas être soumis.'}), 403
+    if (form.require_login_to_view or not form.allow_anonymous) and not current_user.is_authenticated:
+        return jsonify({'success': False, 'message': 'Vous devez être connecté pour remplir ce formulaire.'}), 401
+    return None
+
+def _get_draft_or_404(token):
+    draft = FormDraft.query.filter_by(token=token).first_or_404()
+    # Un brouillon rattaché à un compte n'est accessible qu'à ce compte
+    if draft.user_id and (not current_user.is_authenticated or current_user.id != draft.user_id):
+        abort(404)
+    return draft
+
+def _draft_payload(draft):
+    return {
+        'token': draft.token,
+        'form_id': draft.form_id,
+        'version': draft.version,
+        'data': draft.draft_data or {},
+        'updated_at': draft.updated_at.isoformat()
+    }
+
+@api_bp.route('/forms/<int:form_id>/drafts', methods=['POST'])
+@submission_rate_limited
+def create_draft(form_id):
+    form = Form.query.get_or_404(form_id)
+    error = _fill_access_error(form)
+    if error:
+        return error
+
+    draft = FormDraft(
+        form_id=form.id,
+        user_id=current_user.id if current_user.is_authenticated else None,
+        draft_data={}
+    )
+    db.session.add(draft)
+    db.session.commit()
+    return jsonify(_draft_payload(draft)), 201
+
+@api_bp.route('/drafts/<token>', methods=['GET'])
+def get_draft(token):
+    return jsonify(_draft_payload(_get_draft_or_404(token))), 200
+
+@api_bp.route('/drafts/<token>', methods=['PATCH'])
+def patch_draft(token):
+    # Corps attendu: {"version": n, "changes": {field_id: valeur | null}}
+    draft = _get_draft_or_404(token)
+    payload = request.get_json(silent=True) or {}
+    try:
+        version = apply_draft_patch(draft, payload.get('changes'), payload.get('version'),
+                                    current_app.config['UPLOAD_FOLDER'])
+    except DraftConflictError as e:
+        db.session.refresh(draft)
+        return jsonify(dict(_draft_payload(draft), success=False, message=str(e))), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'version': version}), 200
+
+@api_bp.route('/drafts/<token>/files/<field_id>', methods=['POST'])
+@draft_upload_rate_limited
+def upload_draft_file(token, field_id):
+    draft = _get_draft_or_404(token)
+    file_storage = request.files.get('file')
+    if not file_storage or not allowed_file(file_storage.filename):
+        return jsonify({'success': False, 'message': 'Type de fichier non autorisé ou fichier vide.'}), 400
+
+    try:
+        attachment = attach_draft_file(draft, field_id, file_storage, current_app.config['UPLOAD_FOLDER'])
+    except DraftConflictError as e:
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    return jsonify({'success': True, 'version': draft.version, 'file': attachment}), 200
+
+@api_bp.route('/drafts/<token>/submit', methods=['POST'])
+@submission_rate_limited
+def submit_draft(token):
+    draft = _get_draft_or_404(token)
+    form = draft.form
+    error = _fill_access_error(form)
+    if error:
+        return error
+
+    validator = get_form_validator(form)
+    errors = validator.validate(draft_validation_values(draft), key='id')
+    if errors:
+        return jsonify({'success': False, 'message': 'Données invalides.', 'errors': errors,
+                        'messages': validator.format_errors(errors)}), 400
+
+    draft_values = draft.draft_data or {}
+    geolocation = next((draft_values.get(f.field_id) for f in validator.fields
+                        if f.type == 'geolocation' and draft_values.get(f.field_id)), None)
+    geofence = check_geofence(form, geolocation)
+    if geofence_rejects(form, geofence):
+        return jsonify({'success': False, 'message': GEOFENCE_REJECT_MESSAGE, 'messages': [GEOFENCE_REJECT_MESSAGE]}), 400
+
+    try:
+        response_data, additional_emails = build_draft_response_data(draft, current_app.config['UPLOAD_FOLDER'])
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    # Promotion et suppression du brouillon dans la même transaction: les pièces
+    # jointes passent à la réponse sans jamais être orphelines ni supprimées
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    written = new_response_files(draft, response_data)
+    values = dict(
+        form_id=form.id,
+        user_id=current_user.id if current_user.is_authenticated else draft.user_id,
+        response_data=response_data,
+        ip_address=request.remote_addr,
+        ip_location=ip_location_for(request.remote_addr),
+        geolocation=geolocation,
+        **geo_columns(geolocation),
+        **geofence,
+        address=address_for(geolocation),
+        additional_emails=','.join(additional_emails) if additional_emails else None
+    )
+    # En cas d'échec le brouillon reste: seules les signatures encodées pour la réponse sont supprimées
+    try:
+        response_id = persist_response(values, draft_id=draft.id)
+    except DraftAlreadySubmittedError as e:
+        _discard_files(upload_folder, written)
+        return jsonify({'success': False, 'message': str(e)}), 409
+    except IngestTimeoutError as e:
+        _discard_files(upload_folder, written)
+        current_app.logger.error(f"Délai dépassé lors de la finalisation du brouillon {token}: {e}")
+        return jsonify({'success': False, 'message': str(e)}), 503
+    except Exception as e:
+        _discard_files(upload_folder, written)
+        current_app.logger.error(f"Erreur lors de la finalisation du brouillon {token}: {e}")
+        return jsonify({'success': False, 'message': f'Erreur lors de la soumission du formulaire: {e}'}), 500
+
+    _notify_submission(form, response_id, additional_emails)
+
+    return jsonify({'success': True, 'message': 'Votre réponse a été soumise avec succès!', 'response_id': response_id,
+                    'redirect': url_for('forms.view_form', form_id=form.id)}), 200
+
+@api_bp.route('/drafts/<token>', methods=['DELETE'])
+def delete_draft(token):
+    draft = _get_draft_or_404(token)
+    delete_draft_files(draft, current_app.config['UPLOAD_FOLDER'])
+    db.session.delete(draft)
+    db.session.commit()
+    return jsonify({'success': True}), 200
+
+@api_bp.route('/geocode/reverse', methods=['GET'])
+def reverse_geocode_position():
+    # Géocodage inverse hors ligne, utilisé par geolocation.js à la place des services externes
+    lat = request.args.get('lat', type=float)
+    lon = request.args.get('lon', type=float)
+    if lat is None or lon is None or not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return jsonify({'error': 'Paramètres lat et lon invalides.'}), 400
+
+    place = reverse_geocode(lat, lon)
+    if place is None:
+        return jsonify({'error': 'Aucune adresse connue à proximité.'}), 404
+    return jsonify(place), 200
@@ -1,15 +1,33 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app, send_file
 from flask_login import login_required, current_user
+from sqlalchemy.orm import selectinload
 from functools import wraps
 from app import db
 from app.models import Form, FormResponse, FormShare, User
 from app.forms import FormBuilderForm, ShareForm
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import os
 from app.utils.helpers import save_file, delete_file, get_file_size, get_file_extension, generate_unique_filename
 from app.utils.exports import export_to_excel
 from app.utils.email_service import send_form_submission_email
+from app.utils.signatures import is_stroke_data, save_signature_strokes
+from app.utils.validation import get_form_validator
+from app.utils.ingest import persist_response, IngestTimeoutError
+from app.utils.ratelimit import submission_rate_limited, invalidate_form_limits
+from app.utils.geocoding import address_for
+from app.utils.ipgeo import ip_location_for
+from app.utils.geo import geo_columns
+from app.utils.geofence import (check_geofence, geofence_rejects, import_geofences, clear_geofences,
+                                GEOFENCE_REJECT_MESSAGE)
+from app.utils.field_index import indexed_field_ids, parse_field_filters, field_filter_conditions
+from app.utils.search import search_responses
+from app.utils.pagination import keyset_paginate, SORT_ORDERS, DEFAULT_SORT
+from app.utils.database import read_session
+from app.utils.counters import attach_form_counters
+from app.utils.archive import archived_page, archived_responses
+from app.utils.deletion import schedule_form_deletion
+from app.utils.jobs import start_jobs
 import uuid
 import base64
 
@@ -55,6 +73,8 @@ def list_forms():
     shared_forms_entries = FormShare.query.filter_by(shared_with_id=current_user.id).all()
     shared_forms_ids = [s.form_id for s in shared_forms_entries]
     shared_forms = Form.query.filter(Form.id.in_(shared_forms_ids)).order_by(Form.created_at.desc()).all()
+    # Compteurs des formulaires placés dans un shard: relus dans leur base
+    attach_form_counters(my_forms + shared_forms)
 
     return render_template('forms/list.html', my_forms=my_forms, shared_forms=shared_forms)
 
@@ -69,12 +89,15 @@ def create_form():
             title=form.title.data,
             description=form.description.data,
             user_id=current_user.id,
-            form_data=json.dumps([]), # Initialiser avec un tableau JSON vide
+            form_data=[], # Initialiser avec un tableau JSON vide
             is_active=form.is_active.data,
             allow_anonymous=form.allow_anonymous.data,
             require_login_to_view=form.require_login_to_view.data,
             send_email_on_submit=form.send_email_on_submit.data,
-            email_recipients=form.email_recipients.data
+            email_recipients=form.email_recipients.data,
+            rate_limit_per_ip=form.rate_limit_per_ip.data or None,
+            rate_limit_per_form=form.rate_limit_per_form.data or None,
+            geofence_mode=form.geofence_mode.data
         )
         db.session.add(new_form)
         db.session.commit()
@@ -103,15 +126,52 @@ def edit_form(form_id):
         form_obj.require_login_to_view = form.require_login_to_view.data
         form_obj.send_email_on_submit = form.send_email_on_submit.data
         form_obj.email_recipients = form.email_recipients.data
+        form_obj.rate_limit_per_ip = form.rate_limit_per_ip.data or None
+        form_obj.rate_limit_per_form = form.rate_limit_per_form.data or None
+        form_obj.geofence_mode = form.geofence_mode.data
+        if (form.retention_days.data, form.retention_action.data) != (form_obj.retention_days, form_obj.retention_action):
+            # Nouvelle règle de conservation: toutes les réponses seront réexaminées
+            form_obj.retention_days = form.retention_days.data
+            form_obj.retention_action = form.retention_action.data
+            form_obj.retention_applied_until = None
         form_obj.updated_at = datetime.utcnow()
         db.session.commit()
+        invalidate_form_limits(form_obj.id)
         flash('Paramètres du formulaire mis à jour avec succès!', 'success')
         return redirect(url_for('forms.edit_form', form_id=form_obj.id)) # Rester sur la page d'édition
 
     # Passer les données du formulaire existant au template pour le constructeur JS
-    existing_form_data = json.dumps(form_obj.form_data) if form_obj.form_data else '[]'
+    existing_form_data = form_obj.form_data or []
     return render_template('forms/edit.html', form=form, form_obj=form_obj, existing_form_data=existing_form_data)
 
+@forms_bp.route('/edit/<int:form_id>/geofences', methods=['POST'])
+@creator_required
+def upload_geofences(form_id):
+    form_obj = Form.query.get_or_404(form_id)
+    if form_obj.user_id != current_user.id:
+        share = FormShare.query.filter_by(form_id=form_obj.id, shared_with_id=current_user.id).first()
+        if not share or not share.can_edit:
+            flash('Accès non autorisé à l\'édition de ce formulaire.', 'danger')
+            return redirect(url_for('forms.list_forms'))
+
+    if request.form.get('action') == 'clear':
+        clear_geofences(form_obj)
+        flash('Zones autorisées supprimées.', 'success')
+        return redirect(url_for('forms.edit_form', form_id=form_obj.id))
+
+    geojson_file = request.files.get('geojson')
+    if not geojson_file or not geojson_file.filename:
+        flash('Veuillez choisir un fichier GeoJSON.', 'warning')
+        return redirect(url_for('forms.edit_form', form_id=form_obj.id))
+    try:
+        count = import_geofences(form_obj, json.load(geojson_file.stream), replace=request.form.get('replace') == 'on')
+    except (ValueError, UnicodeDecodeError) as e:
+        db.session.rollback()
+        flash(f'Fichier GeoJSON invalide: {e}', 'danger')
+    else:
+        flash(f'{count} zone(s) importée(s).', 'success')
+    return redirect(url_for('forms.edit_form', form_id=form_obj.id))
+
 @forms_bp.route('/delete/<int:form_id>', methods=['POST'])
 @creator_required
 def delete_form(form_id):
@@ -121,14 +181,11 @@ def delete_form(form_id):
         return redirect(url_for('forms.list_forms'))
     
     try:
-        # Supprimer les réponses associées
-        FormResponse.query.filter_by(form_id=form_obj.id).delete()
-        # Supprimer les partages associés
-        FormShare.query.filter_by(form_id=form_obj.id).delete()
-        
-        db.session.delete(form_obj)
+        # Formulaire masqué tout de suite; réponses, fichiers, partages et journaux effacés par lots en tâche de fond
+        schedule_form_deletion(form_obj, current_user.id)
         db.session.commit()
-        flash('Formulaire supprimé avec succès!', 'success')
+        start_jobs()
+        flash('Formulaire supprimé. Ses réponses et fichiers sont effacés en arrière-plan.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Erreur lors de la suppression du formulaire: {e}', 'danger')
@@ -153,9 +210,19 @@ def view_form(form_id):
             flash('Accès non autorisé à ce formulaire.', 'danger')
             return redirect(url_for('main.dashboard')) # Ou une page d'erreur
 
-    return render_template('forms/view.html', form_obj=form_obj)
+    # Carte des réponses: formulaires avec un champ géolocalisation, pour qui peut voir les réponses
+    fields = form_obj.form_data or []
+    show_responses_map = (current_user.is_authenticated and current_user.can_view_form(form_obj)
+                          and any(isinstance(f, dict) and f.get('type') == 'geolocation' for f in fields))
+
+    # Tendance des réponses (agrégats par heure/jour): pour qui peut voir les réponses
+    show_trends = current_user.is_authenticated and current_user.can_view_form(form_obj)
+
+    return render_template('forms/view.html', form_obj=form_obj, show_responses_map=show_responses_map,
+                           show_trends=show_trends)
 
 @forms_bp.route('/fill/<int:form_id>', methods=['GET', 'POST'])
+@submission_rate_limited
 def fill_form(form_id):
     form_obj = Form.query.get_or_404(form_id)
 
@@ -172,6 +239,29 @@ def fill_form(form_id):
         return redirect(url_for('auth.login', next=request.url))
 
     if request.method == 'POST':
+        # Valider les données avant toute écriture de fichier ou en base
+        validator = get_form_validator(form_obj)
+        errors = validator.validate_request(request.form, request.files)
+        if errors:
+            for message in validator.format_errors(errors):
+                flash(message, 'danger')
+            return render_template('forms/fill.html', form_obj=form_obj, errors=errors), 400
+
+        # Position de la réponse: premier champ géolocalisation renseigné
+        geolocation = None
+        for field in validator.fields:
+            lat = request.form.get(f'{field.name}_lat')
+            lon = request.form.get(f'{field.name}_lon')
+            if field.type == 'geolocation' and lat and lon:
+                geolocation = f"{lat},{lon}"
+                break
+
+        # Contrôle des zones autorisées, avant toute écriture de fichier
+        geofence = check_geofence(form_obj, geolocation)
+        if geofence_rejects(form_obj, geofence):
+            flash(GEOFENCE_REJECT_MESSAGE, 'danger')
+            return render_template('forms/fill.html', form_obj=form_obj), 400
+
         response_data = {}
         additional_emails = []
         
@@ -199,8 +289,15 @@ def fill_form(form_id):
                     response_data[field_id] = None # Pas de fichier uploadé
             elif field_type == 'signature':
                 signature_data = request.form.get(field_name)
-                if signature_data:
-                    # Sauvegarder la signature comme une image PNG
+                if is_stroke_data(signature_data):
+                    # Signature vectorielle: stocker les traits compressés
+                    try:
+                        response_data[field_id] = save_signature_strokes(signature_data, current_app.config['UPLOAD_FOLDER'])
+                    except ValueError as e:
+                        flash(f'Erreur lors de la sauvegarde de la signature: {e}', 'danger')
+                        response_data[field_id] = None
+                elif signature_data:
+                    # Ancien format: sauvegarder la signature comme une image PNG
                     # Le chemin sera uploads/signatures/unique_id.png
                     signature_filename = generate_unique_filename('signatures', 'png')
                     signature_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'signatures', signature_filename)
@@ -250,16 +347,22 @@ def fill_form(form_id):
         user_id = current_user.id if current_user.is_authenticated else None
         ip_address = request.remote_addr
 
-        new_response = FormResponse(
-            form_id=form_id,
-            user_id=user_id,
-            response_data=json.dumps(response_data),
-            ip_address=ip_address,
-            additional_emails=','.join(additional_emails) if additional_emails else None
-        )
-        
-        db.session.add(new_response)
-        db.session.commit()
+        try:
+            response_id = persist_response(dict(
+                form_id=form_id,
+                user_id=user_id,
+                response_data=response_data,
+                ip_address=ip_address,
+                ip_location=ip_location_for(ip_address),
+                geolocation=geolocation,
+                **geo_columns(geolocation),
+                **geofence,
+                address=address_for(geolocation),
+                additional_emails=','.join(additional_emails) if additional_emails else None
+            ))
+        except IngestTimeoutError as e:
+            flash(f'Erreur lors de l\'enregistrement de votre réponse: {e}', 'danger')
+            return redirect(url_for('forms.fill_form', form_id=form_id))
 
         flash('Votre réponse a été soumise avec succès!', 'success')
 
@@ -273,6 +376,7 @@ def fill_form(form_id):
             
             if recipients:
                 try:
+                    new_response = FormResponse.query.get(response_id)
                     send_form_submission_email(form_obj, new_response, recipients)
                     flash('Un email de confirmation a été envoyé.', 'info')
                 except Exception as e:
@@ -282,11 +386,68 @@ def fill_form(form_id):
 
     return render_template('forms/fill.html', form_obj=form_obj)
 
+def _submission_period():
+    # Période start/end (AAAA-MM-JJ, bornes incluses) de la page des réponses et de l'export
+    try:
+        start = datetime.strptime(request.args['start'], '%Y-%m-%d') if request.args.get('start') else None
+        end = datetime.strptime(request.args['end'], '%Y-%m-%d') + timedelta(days=1, microseconds=-1) if request.args.get('end') else None
+    except ValueError:
+        flash('Période invalide (dates attendues au format AAAA-MM-JJ).', 'warning')
+        return None, None
+    return start, end
+
 @forms_bp.route('/responses/<int:form_id>')
 @form_access_required
 def view_responses(form_id):
     form_obj = Form.query.get_or_404(form_id)
-    responses = FormResponse.query.filter_by(form_id=form_id).order_by(FormResponse.submitted_at.desc()).all()
+    # Lectures sur la réplique si elle est configurée (app/utils/database.py)
+    session = read_session()
+    # Répondants chargés en une requête groupée pour toute la page (pas de chargement par ligne)
+    query = session.query(FormResponse).filter_by(form_id=form_id).options(selectinload(FormResponse.responder))
+
+    # Filtres field.<champ>=valeur sur les champs indexés (parcours de l'index response_field_values)
+    try:
+        filters = parse_field_filters(form_obj, request.args)
+    except ValueError as e:
+        flash(str(e), 'warning')
+        filters = []
+    start, end = _submission_period()
+    if start is not None:
+        query = query.filter(FormResponse.submitted_at >= start)
+    if end is not None:
+        query = query.filter(FormResponse.submitted_at <= end)
+    # Recherche plein texte: résultats par pertinence, paginés
+    search_query = request.args.get('q', '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    has_next = False
+    sort = request.args.get('sort', DEFAULT_SORT)
+    if sort not in SORT_ORDERS:
+        sort = DEFAULT_SORT
+    keyset = None
+    if search_query:
+        responses, has_next = search_responses(form_obj.id, search_query, page=page,
+                                               per_page=current_app.config.get('SEARCH_RESULTS_PER_PAGE', 25),
+                                               filters=filters, session=session)
+    else:
+        # Pagination par curseur sur (submitted_at, id): coût constant quelle que soit la page
+        query = query.filter(*field_filter_conditions(form_obj.id, filters))
+
+        def archived(position, descending, limit, bound):
+            # Réponses archivées de la période, fusionnées quand la page atteint leurs dates
+            return archived_page(form_obj.id, limit, position=position, descending=descending, bound=bound,
+                                 start=start, end=end, filters=filters, session=session)
+
+        try:
+            keyset = keyset_paginate(query, current_app.config.get('RESPONSES_PER_PAGE', 50),
+                                     after=request.args.get('after'), before=request.args.get('before'),
+                                     descending=SORT_ORDERS[sort], extra=archived)
+        except ValueError as e:
+            flash(str(e), 'warning')
+            keyset = keyset_paginate(query, current_app.config.get('RESPONSES_PER_PAGE', 50), descending=SORT_ORDERS[sort],
+                                     extra=archived)
+        responses = keyset.items
+    indexed_ids = indexed_field_ids(form_obj.form_data)
+    indexed_fields = [f for f in form_obj.form_data or [] if f.get('id') in indexed_ids]
     
     # Préparer les en-têtes de colonne pour le tableau
     # Utiliser les labels des champs du form_data
@@ -295,13 +456,25 @@ def view_responses(form_id):
         for field in form_obj.form_data:
             column_headers.append(field.get('label', field.get('name', field.get('id'))))
     
-    return render_template('forms/responses.html', form_obj=form_obj, responses=responses, column_headers=column_headers)
+    return render_template('forms/responses.html', form_obj=form_obj, responses=responses, column_headers=column_headers,
+                           indexed_fields=indexed_fields, active_filters=dict(filters),
+                           search_query=search_query, page=page, has_next=has_next, keyset=keyset, sort=sort,
+                           period_start=request.args.get('start', ''), period_end=request.args.get('end', ''))
 
 @forms_bp.route('/responses/<int:form_id>/export')
 @form_access_required
 def export_responses(form_id):
     form_obj = Form.query.get_or_404(form_id)
-    responses = FormResponse.query.filter_by(form_id=form_id).order_by(FormResponse.submitted_at.asc()).all()
+    session = read_session()
+    start, end = _submission_period()
+    query = session.query(FormResponse).filter_by(form_id=form_id)
+    if start is not None:
+        query = query.filter(FormResponse.submitted_at >= start)
+    if end is not None:
+        query = query.filter(FormResponse.submitted_at <= end)
+    # Réponses archivées (plus anciennes) puis réponses actives
+    responses = archived_responses(form_id, start=start, end=end, session=session) + \
+        query.order_by(FormResponse.submitted_at.asc(), FormResponse.id.asc()).all()
 
     try:
         # Le chemin de sortie sera un fichier temporaire
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for
 from flask_login import login_required, current_user
 from app.models import Form, FormResponse
+from app.utils.shard_routing import each_shard
 
 main_bp = Blueprint('main', __name__)
 
@@ -13,4 +14,6 @@ def index():
 @main_bp.route('/dashboard')
 @login_required
 def dashboard():
-    return render_template('dashboard.html')
+    # Réponses de l'utilisateur dans la base principale et dans chaque shard
+    response_count = sum(current_user.form_responses.count() for _ in each_shard())
+    return render_template('dashboard.html', response_count=response_count)
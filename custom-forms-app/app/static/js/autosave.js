@@ -0,0 +1,286 @@
+/**
+ * Sauvegarde automatique des formulaires dans un brouillon côté serveur
+ *
+ * Seuls les champs modifiés depuis la dernière sauvegarde sont envoyés
+ * (patch JSON). Les pièces jointes sont envoyées dès leur sélection et la
+ * soumission finale se contente de promouvoir le brouillon en réponse.
+ */
+
+class DraftAutosave {
+  constructor(form, options) {
+    this.form = form
+    this.createUrl = options.createUrl
+    this.draftUrlTemplate = options.draftUrl // Contient "__token__" à remplacer
+    this.interval = options.interval || 5000
+    this.storageKey = `draft:${options.formId}`
+    this.token = null
+    this.version = null
+    this.saved = {} // Dernières valeurs confirmées par le serveur, par identifiant de champ
+    this.saving = null
+    this.timer = null
+    this.status = document.getElementById("autosaveStatus")
+  }
+
+  async start() {
+    try {
+      await this.loadOrCreate()
+    } catch (error) {
+      // Sans brouillon, le formulaire garde son envoi classique
+      this.showStatus("Sauvegarde automatique indisponible.", "muted")
+      return
+    }
+
+    this.form.querySelectorAll("[data-field-id]").forEach((wrapper) => {
+      wrapper.addEventListener("change", (e) => this.onChange(wrapper, e))
+      wrapper.addEventListener("input", () => this.schedule())
+    })
+    // Les signatures et la géolocalisation ne déclenchent pas d'événement: vérification périodique
+    setInterval(() => this.save(), this.interval)
+    window.addEventListener("pagehide", () => this.save())
+    this.form.addEventListener("submit", (e) => this.onSubmit(e))
+  }
+
+  draftUrl(suffix = "") {
+    return this.draftUrlTemplate.replace("__token__", this.token) + suffix
+  }
+
+  async loadOrCreate() {
+    const token = localStorage.getItem(this.storageKey)
+    if (token) {
+      this.token = token
+      const response = await fetch(this.draftUrl(), { credentials: "same-origin" })
+      if (response.ok) {
+        this.apply(await response.json())
+        this.showStatus("Brouillon restauré.", "success")
+        return
+      }
+      localStorage.removeItem(this.storageKey)
+    }
+
+    const response = await fetch(this.createUrl, { method: "POST", credentials: "same-origin" })
+    if (!response.ok) throw new Error(`HTTP ${response.status}`)
+    const draft = await response.json()
+    this.token = draft.token
+    this.version = draft.version
+    this.saved = this.collect()
+    localStorage.setItem(this.storageKey, this.token)
+  }
+
+  /**
+   * Restaurer les valeurs d'un brouillon dans le formulaire
+   */
+  apply(draft) {
+    this.version = draft.version
+    const data = draft.data || {}
+
+    this.form.querySelectorAll("[data-field-id]").forEach((wrapper) => {
+      const fieldId = wrapper.dataset.fieldId
+      const value = data[fieldId]
+      if (value === undefined || value === null) return
+
+      switch (wrapper.dataset.fieldType) {
+        case "checkbox":
+          wrapper.querySelector("input[type=checkbox]").checked = value === true
+          break
+        case "radio":
+          wrapper.querySelectorAll("input[type=radio]").forEach((input) => {
+            input.checked = input.value === value
+          })
+          break
+        case "signature":
+          if (window.signaturePads && window.signaturePads[fieldId]) {
+            window.signaturePads[fieldId].setStrokeData(value)
+          }
+          break
+        case "geolocation": {
+          const [lat, lon] = String(value).split(",")
+          document.getElementById(`${fieldId}_lat`).value = lat
+          document.getElementById(`${fieldId}_lon`).value = lon
+          document.getElementById(`${fieldId}_display`).value = `${lat}, ${lon}`
+          break
+        }
+        case "file":
+          this.markAttached(wrapper, value)
+          break
+        default: {
+          const input = wrapper.querySelector("input, textarea, select")
+          if (input) input.value = value
+        }
+      }
+    })
+
+    this.saved = this.collect()
+  }
+
+  /**
+   * Lire les valeurs courantes du formulaire, par identifiant de champ
+   */
+  collect() {
+    const values = {}
+    this.form.querySelectorAll("[data-field-id]").forEach((wrapper) => {
+      const fieldId = wrapper.dataset.fieldId
+      switch (wrapper.dataset.fieldType) {
+        case "file":
+          return // Envoyés séparément
+        case "checkbox":
+          values[fieldId] = wrapper.querySelector("input[type=checkbox]").checked
+          break
+        case "radio": {
+          const checked = wrapper.querySelector("input[type=radio]:checked")
+          values[fieldId] = checked ? checked.value : null
+          break
+        }
+        case "signature": {
+          const pad = window.signaturePads && window.signaturePads[fieldId]
+          values[fieldId] = pad && !pad.isEmpty() ? pad.getStrokeData() : null
+          break
+        }
+        case "geolocation": {
+          const lat = document.getElementById(`${fieldId}_lat`).value
+          const lon = document.getElementById(`${fieldId}_lon`).value
+          values[fieldId] = lat && lon ? `${lat},${lon}` : null
+          break
+        }
+        default: {
+          const input = wrapper.querySelector("input, textarea, select")
+          values[fieldId] = input && input.value !== "" ? input.value : null
+        }
+      }
+    })
+    return values
+  }
+
+  diff() {
+    const current = this.collect()
+    const changes = {}
+    Object.keys(current).forEach((fieldId) => {
+      if ((this.saved[fieldId] ?? null) !== current[fieldId]) {
+        changes[fieldId] = current[fieldId]
+      }
+    })
+    return { current, changes }
+  }
+
+  schedule() {
+    clearTimeout(this.timer)
+    this.timer = setTimeout(() => this.save(), 1500)
+  }
+
+  async save() {
+    if (!this.token) return
+    if (this.saving) return this.saving
+
+    const { current, changes } = this.diff()
+    if (Object.keys(changes).length === 0) return
+
+    this.saving = this.sendPatch(changes)
+      .then(() => {
+        Object.assign(this.saved, current)
+        this.showStatus(`Brouillon enregistré à ${new Date().toLocaleTimeString()}`, "success")
+      })
+      .catch(() => this.showStatus("Hors ligne: le brouillon sera enregistré plus tard.", "warning"))
+      .finally(() => {
+        this.saving = null
+      })
+    return this.saving
+  }
+
+  async sendPatch(changes) {
+    let response = await this.patch(changes)
+    if (response.status === 409) {
+      // Brouillon modifié ailleurs (autre onglet): réappliquer nos changements sur la dernière version
+      const draft = await response.json()
+      this.version = draft.version
+      response = await this.patch(changes)
+    }
+    if (!response.ok) throw new Error(`HTTP ${response.status}`)
+    this.version = (await response.json()).version
+  }
+
+  patch(changes) {
+    return fetch(this.draftUrl(), {
+      method: "PATCH",
+      credentials: "same-origin",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ version: this.version, changes }),
+    })
+  }
+
+  async onChange(wrapper, event) {
+    if (wrapper.dataset.fieldType !== "file") {
+      this.schedule()
+      return
+    }
+
+    const input = event.target
+    if (!input.files || input.files.length === 0) return
+
+    const body = new FormData()
+    body.append("file", input.files[0])
+    this.showStatus("Envoi de la pièce jointe...", "muted")
+    try {
+      const response = await fetch(this.draftUrl(`/files/${wrapper.dataset.fieldId}`), {
+        method: "POST",
+        credentials: "same-origin",
+        body,
+      })
+      const result = await response.json()
+      if (!response.ok) throw new Error(result.message)
+      this.version = result.version
+      this.markAttached(wrapper, result.file)
+      input.value = "" // Le fichier est sur le serveur: ne pas le renvoyer à la soumission
+      this.showStatus("Pièce jointe enregistrée.", "success")
+    } catch (error) {
+      this.showStatus(`Erreur lors de l'envoi de la pièce jointe: ${error.message}`, "danger")
+    }
+  }
+
+  markAttached(wrapper, file) {
+    const input = wrapper.querySelector("input[type=file]")
+    input.required = false
+    let note = wrapper.querySelector(".draft-attachment")
+    if (!note) {
+      note = document.createElement("small")
+      note.className = "draft-attachment form-text text-success d-block"
+      input.insertAdjacentElement("afterend", note)
+    }
+    note.textContent = `Fichier enregistré: ${file.original_name || file.filename}`
+  }
+
+  async onSubmit(event) {
+    event.preventDefault()
+    try {
+      // Attendre une sauvegarde en cours puis envoyer les dernières modifications
+      if (this.saving) await this.saving
+      await this.save()
+      const response = await fetch(this.draftUrl("/submit"), { method: "POST", credentials: "same-origin" })
+      const result = await response.json()
+      if (response.ok) {
+        localStorage.removeItem(this.storageKey)
+        window.location = result.redirect
+        return
+      }
+      this.showStatus((result.messages || [result.message]).join(" — "), "danger")
+    } catch (error) {
+      // Serveur injoignable: le brouillon est conservé, l'utilisateur pourra réessayer
+      this.showStatus("Impossible de soumettre pour le moment, votre saisie est conservée.", "danger")
+    }
+  }
+
+  showStatus(message, type) {
+    if (!this.status) return
+    this.status.textContent = message
+    this.status.className = `small text-${type}`
+  }
+}
+
+document.addEventListener("DOMContentLoaded", () => {
+  const form = document.querySelector("form[data-draft-create-url]")
+  if (!form) return
+  new DraftAutosave(form, {
+    formId: form.dataset.formId,
+    createUrl: form.dataset.draftCreateUrl,
+    draftUrl: form.dataset.draftUrl,
+    interval: parseInt(form.dataset.autosaveInterval, 10) * 1000,
+  }).start()
+})
@@ -136,6 +136,13 @@ $(document).ready(() => {
                             Champ requis
                         </label>
                     </div>
+                    ${field.type !== "file" && field.type !== "signature" ? `
+                    <div class="form-check mb-2">
+                        <input class="form-check-input" type="checkbox" id="indexed_${field.id}" data-field-property="indexed" ${field.indexed ? "checked" : ""}>
+                        <label class="form-check-label" for="indexed_${field.id}">
+                            Indexé (filtrer les réponses sur ce champ)
+                        </label>
+                    </div>` : ""}
                     ${optionsHtml}
                 </div>
             </div>
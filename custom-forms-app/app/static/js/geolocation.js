@@ -53,54 +53,13 @@ class GeolocationManager {
   }
 
   /**
-   * Géocodage inverse pour obtenir l'adresse
+   * Géocodage inverse pour obtenir l'adresse (référentiel local du serveur)
    */
   async reverseGeocode(lat, lng) {
-    try {
-      // Utiliser l'API Nominatim d'OpenStreetMap (gratuite)
-      const response = await fetch(
-        `https://nominatim.openstreetmap.org/reverse?format=json&lat=${lat}&lon=${lng}&zoom=18&addressdetails=1`,
-        {
-          headers: {
-            "User-Agent": "FormBuilder/1.0",
-          },
-        },
-      )
-
-      if (response.ok) {
-        const data = await response.json()
-        if (data && data.display_name) {
-          this.address = data.display_name
-          this.updateAddressDisplay(data)
-        }
-      }
-    } catch (error) {
-      console.error("Erreur lors du géocodage inverse:", error)
-      // Essayer avec une API alternative si disponible
-      this.tryAlternativeGeocoding(lat, lng)
-    }
-  }
-
-  /**
-   * Essayer une API de géocodage alternative
-   */
-  async tryAlternativeGeocoding(lat, lng) {
-    try {
-      // API alternative gratuite
-      const response = await fetch(
-        `https://api.bigdatacloud.net/data/reverse-geocode-client?latitude=${lat}&longitude=${lng}&localityLanguage=fr`,
-      )
-
-      if (response.ok) {
-        const data = await response.json()
-        if (data && data.locality) {
-          const address = `${data.locality}, ${data.principalSubdivision}, ${data.countryName}`
-          this.address = address
-          this.updateAddressDisplay({ display_name: address })
-        }
-      }
-    } catch (error) {
-      console.error("Erreur avec l'API alternative:", error)
+    const data = await reverseGeocodePosition(lat, lng)
+    if (data && data.label) {
+      this.address = data.label
+      this.updateAddressDisplay({ display_name: data.label })
     }
   }
 
@@ -304,6 +263,21 @@ class GeolocationManager {
 // Instance globale du gestionnaire de géolocalisation
 let geolocationManager
 
+/**
+ * Géocodage inverse via l'API du serveur
+ * Retourne le lieu le plus proche ({label, city, postcode, country, distance_m}) ou null
+ */
+async function reverseGeocodePosition(lat, lon) {
+  try {
+    const response = await fetch(`/api/geocode/reverse?lat=${encodeURIComponent(lat)}&lon=${encodeURIComponent(lon)}`)
+    if (!response.ok) return null
+    return await response.json()
+  } catch (error) {
+    console.error("Erreur lors du géocodage inverse:", error)
+    return null
+  }
+}
+
 // Initialisation
 document.addEventListener("DOMContentLoaded", () => {
   geolocationManager = new GeolocationManager()
@@ -373,23 +347,16 @@ GeolocationManager.prototype.getLocation = (addressInput, latitudeInput, longitu
         longitudeInput.value = lon
         statusText.textContent = `Position trouvée: ${lat}, ${lon}`
 
-        // Utiliser un service de géocodage inverse (ex: OpenStreetMap Nominatim)
-        fetch(`https://nominatim.openstreetmap.org/reverse?format=jsonv2&lat=${lat}&lon=${lon}`)
-          .then((response) => response.json())
-          .then((data) => {
-            if (data && data.display_name) {
-              addressInput.value = data.display_name
-              statusText.textContent = "Adresse trouvée."
-            } else {
-              addressInput.value = "Adresse non trouvée."
-              statusText.textContent = "Adresse non trouvée pour cette position."
-            }
-          })
-          .catch((error) => {
-            console.error("Erreur de géocodage inverse:", error)
-            addressInput.value = "Erreur de géocodage."
-            statusText.textContent = "Erreur lors de la récupération de l'adresse."
-          })
+        // Géocodage inverse par le serveur (référentiel local, sans service externe)
+        reverseGeocodePosition(lat, lon).then((data) => {
+          if (data && data.label) {
+            addressInput.value = data.label
+            statusText.textContent = "Adresse trouvée."
+          } else {
+            addressInput.value = ""
+            statusText.textContent = "Adresse non trouvée pour cette position."
+          }
+        })
       },
       (error) => {
         let errorMessage = "Erreur de géolocalisation: "
@@ -451,6 +418,11 @@ function getGeolocation(fieldId) {
         latInput.value = lat
         lonInput.value = lon
         displayInput.value = `${lat.toFixed(6)}, ${lon.toFixed(6)}`
+        reverseGeocodePosition(lat, lon).then((data) => {
+          if (data && data.label) {
+            displayInput.value = `${lat.toFixed(6)}, ${lon.toFixed(6)} — ${data.label}`
+          }
+        })
 
         // Afficher la carte
         mapContainer.style.display = "block"
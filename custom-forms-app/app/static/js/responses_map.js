@@ -0,0 +1,80 @@
+/**
+ * Carte des réponses géolocalisées
+ *
+ * Les positions ne sont pas toutes envoyées au navigateur: pour chaque tuile
+ * affichée, la carte demande au serveur les regroupements de la tuile
+ * (nombre de réponses et centre) et les retire quand la tuile sort de l'écran.
+ */
+
+const ClusterLayer = L.GridLayer.extend({
+  initialize(url, options) {
+    this.url = url
+    this.tileMarkers = {} // Marqueurs affichés, par clé de tuile
+    L.GridLayer.prototype.initialize.call(this, options)
+    this.on("tileunload", (e) => this.removeTileMarkers(this._tileCoordsToKey(e.coords)))
+  },
+
+  createTile(coords, done) {
+    const tile = document.createElement("div")
+    const key = this._tileCoordsToKey(coords)
+
+    fetch(`${this.url}?z=${coords.z}&x=${coords.x}&y=${coords.y}`, { credentials: "same-origin" })
+      .then((response) => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`)
+        return response.json()
+      })
+      .then((data) => {
+        this.removeTileMarkers(key)
+        this.tileMarkers[key] = data.clusters.map((cluster) => this.createMarker(cluster).addTo(this._map))
+        done(null, tile)
+      })
+      .catch((error) => done(error, tile))
+
+    return tile
+  },
+
+  createMarker(cluster) {
+    if (cluster.count === 1) {
+      return L.circleMarker([cluster.lat, cluster.lon], { radius: 6, weight: 1, fillOpacity: 0.8 }).bindPopup(
+        `Réponse #${cluster.id}`,
+      )
+    }
+    // Taille de la pastille proportionnelle au logarithme du nombre de réponses
+    const size = Math.round(24 + 8 * Math.log10(cluster.count))
+    return L.marker([cluster.lat, cluster.lon], {
+      icon: L.divIcon({
+        html: `<div>${cluster.count}</div>`,
+        className: "response-cluster",
+        iconSize: [size, size],
+      }),
+    })
+  },
+
+  removeTileMarkers(key) {
+    ;(this.tileMarkers[key] || []).forEach((marker) => marker.remove())
+    delete this.tileMarkers[key]
+  },
+})
+
+document.addEventListener("DOMContentLoaded", () => {
+  const container = document.getElementById("responsesMap")
+  if (!container) return
+
+  const map = L.map(container, { maxZoom: 18 }).setView([46.6, 2.4], 5)
+  L.tileLayer("https://{s}.tile.openstreetmap.org/{z}/{x}/{y}.png", {
+    attribution: "&copy; <a href='https://www.openstreetmap.org/copyright'>OpenStreetMap</a> contributors",
+  }).addTo(map)
+
+  const url = container.dataset.clustersUrl
+
+  // Cadrer la carte sur les réponses à partir de la tuile mondiale (déjà regroupée)
+  fetch(`${url}?z=0&x=0&y=0`, { credentials: "same-origin" })
+    .then((response) => response.json())
+    .then((data) => {
+      if (data.clusters && data.clusters.length > 0) {
+        const bounds = L.latLngBounds(data.clusters.map((cluster) => [cluster.lat, cluster.lon]))
+        map.fitBounds(bounds.pad(0.2), { maxZoom: 14 })
+      }
+    })
+    .finally(() => new ClusterLayer(url, { tileSize: 256 }).addTo(map))
+})
@@ -11,6 +11,8 @@ class SignaturePad {
     this.isDrawing = false
     this.lastX = 0
     this.lastY = 0
+    this.strokes = [] // Traits enregistrés: listes de points [x, y] arrondis au pixel
+    this.currentStroke = null
     this.backgroundColor = options.backgroundColor || "#ffffff"
 
     this.setupCanvas()
@@ -51,6 +53,9 @@ class SignaturePad {
     const rect = this.canvas.getBoundingClientRect()
     this.lastX = e.clientX - rect.left
     this.lastY = e.clientY - rect.top
+
+    this.currentStroke = [[Math.round(this.lastX), Math.round(this.lastY)]]
+    this.strokes.push(this.currentStroke)
   }
 
   draw(e) {
@@ -67,10 +72,18 @@ class SignaturePad {
 
     this.lastX = currentX
     this.lastY = currentY
+
+    // Quantifier au pixel et ignorer les points identiques au précédent
+    const point = [Math.round(currentX), Math.round(currentY)]
+    const previous = this.currentStroke[this.currentStroke.length - 1]
+    if (point[0] !== previous[0] || point[1] !== previous[1]) {
+      this.currentStroke.push(point)
+    }
   }
 
   stopDrawing() {
     this.isDrawing = false
+    this.currentStroke = null
   }
 
   handleTouch(e) {
@@ -87,23 +100,66 @@ class SignaturePad {
   }
 
   clear() {
+    this.strokes = []
+    this.currentStroke = null
     this.ctx.clearRect(0, 0, this.canvas.width, this.canvas.height)
     this.ctx.fillStyle = this.backgroundColor
     this.ctx.fillRect(0, 0, this.canvas.width, this.canvas.height)
   }
 
   isEmpty() {
-    // Vérifier si le canvas est vide (seulement du blanc)
-    const imageData = this.ctx.getImageData(0, 0, this.canvas.width, this.canvas.height)
-    const data = imageData.data
-
-    for (let i = 0; i < data.length; i += 4) {
-      // Si un pixel n'est pas blanc (255,255,255), le canvas n'est pas vide
-      if (data[i] !== 255 || data[i + 1] !== 255 || data[i + 2] !== 255) {
-        return false
+    // Le canvas est vide tant qu'aucun trait n'a été enregistré
+    return this.strokes.length === 0
+  }
+
+  /**
+   * Sérialiser les traits pour l'envoi au serveur
+   * Format: strokes:{"w":W,"h":H,"s":[[x0,y0,dx1,dy1,...],...]}
+   * Chaque trait commence par un point absolu suivi de deltas entiers.
+   */
+  getStrokeData() {
+    const encoded = this.strokes.map((stroke) => {
+      const values = [stroke[0][0], stroke[0][1]]
+      for (let i = 1; i < stroke.length; i++) {
+        values.push(stroke[i][0] - stroke[i - 1][0], stroke[i][1] - stroke[i - 1][1])
       }
+      return values
+    })
+    const payload = {
+      w: Math.round(this.canvas.offsetWidth) || this.canvas.width,
+      h: Math.round(this.canvas.offsetHeight) || this.canvas.height,
+      s: encoded,
     }
-    return true
+    return `strokes:${JSON.stringify(payload)}`
+  }
+
+  /**
+   * Restaurer des traits sérialisés par getStrokeData (reprise d'un brouillon)
+   * Les points sont remis à l'échelle si la taille du canvas a changé.
+   */
+  setStrokeData(value) {
+    this.clear()
+    if (!value || !value.startsWith("strokes:")) return
+
+    const payload = JSON.parse(value.slice("strokes:".length))
+    const scaleX = (Math.round(this.canvas.offsetWidth) || this.canvas.width) / payload.w
+    const scaleY = (Math.round(this.canvas.offsetHeight) || this.canvas.height) / payload.h
+
+    this.strokes = payload.s.map((values) => {
+      const stroke = [[values[0], values[1]]]
+      for (let i = 2; i < values.length; i += 2) {
+        const previous = stroke[stroke.length - 1]
+        stroke.push([previous[0] + values[i], previous[1] + values[i + 1]])
+      }
+      return stroke.map(([x, y]) => [Math.round(x * scaleX), Math.round(y * scaleY)])
+    })
+
+    this.strokes.forEach((stroke) => {
+      this.ctx.beginPath()
+      this.ctx.moveTo(stroke[0][0], stroke[0][1])
+      stroke.slice(1).forEach(([x, y]) => this.ctx.lineTo(x, y))
+      this.ctx.stroke()
+    })
   }
 
   getDataURL() {
@@ -180,7 +236,7 @@ document.addEventListener("submit", (e) => {
       hiddenInput.type = "hidden"
       hiddenInput.name = canvas.dataset.fieldName || "signature"
       hiddenInput.id = `${canvasId}_data`
-      hiddenInput.value = signaturePad.isEmpty() ? "" : signaturePad.getDataURL()
+      hiddenInput.value = signaturePad.isEmpty() ? "" : signaturePad.getStrokeData()
 
       form.appendChild(hiddenInput)
     }
@@ -0,0 +1,52 @@
+/**
+ * Courbe des soumissions d'un formulaire
+ *
+ * Les points viennent de l'API des agrégats (par heure, jour ou mois): la
+ * courbe reste légère quelle que soit la période et le nombre de réponses.
+ */
+
+document.addEventListener("DOMContentLoaded", () => {
+  const canvas = document.getElementById("submissionTrends")
+  const period = document.getElementById("trendsPeriod")
+  const total = document.getElementById("trendsTotal")
+  if (!canvas || typeof Chart === "undefined") return
+
+  const formats = {
+    hour: { day: "2-digit", month: "2-digit", hour: "2-digit", minute: "2-digit" },
+    day: { day: "2-digit", month: "2-digit", year: "numeric" },
+    month: { month: "long", year: "numeric" },
+  }
+
+  const chart = new Chart(canvas, {
+    type: "line",
+    data: { labels: [], datasets: [{ label: "Réponses", data: [], fill: true, tension: 0.2, pointRadius: 0 }] },
+    options: {
+      interaction: { mode: "index", intersect: false },
+      plugins: { legend: { display: false } },
+      scales: { y: { beginAtZero: true, ticks: { precision: 0 } } },
+    },
+  })
+
+  function load() {
+    const granularity = period.value
+    fetch(`${canvas.dataset.statsUrl}?granularity=${granularity}`, { credentials: "same-origin" })
+      .then((response) => {
+        if (!response.ok) throw new Error(`HTTP ${response.status}`)
+        return response.json()
+      })
+      .then((data) => {
+        // Les intervalles sont en UTC
+        const format = new Intl.DateTimeFormat("fr-FR", { ...formats[granularity], timeZone: "UTC" })
+        chart.data.labels = data.series.map((point) => format.format(new Date(`${point.t}Z`)))
+        chart.data.datasets[0].data = data.series.map((point) => point.count)
+        chart.update()
+        total.textContent = `${data.total} réponse(s) sur la période`
+      })
+      .catch(() => {
+        total.textContent = "Impossible de charger la tendance des réponses."
+      })
+  }
+
+  period.addEventListener("change", load)
+  load()
+})
@@ -0,0 +1,269 @@
+"""
+Statistiques matérialisées du tableau de bord administrateur
+
+Plutôt que de compter utilisateurs, formulaires et réponses à chaque
+affichage, le tableau de bord lit la table admin_stats: un compteur par
+statistique (« users », « users.role.admin », « forms.active »...) et, pour
+l'activité récente, un compteur par jour (« responses.day.2026-10-19 »): les
+7 derniers jours sont la somme de 7 lignes.
+
+Les compteurs sont mis à jour dans la transaction de chaque écriture (après
+le flush) à partir des utilisateurs, formulaires et réponses ajoutés,
+supprimés ou modifiés (rôle, activation). La lecture passe par un cache en
+mémoire de ADMIN_STATS_CACHE_TTL secondes: plusieurs administrateurs en
+rafraîchissement automatique ne coûtent qu'une requête par intervalle.
+« flask rebuild-admin-stats » recalcule tout depuis les tables.
+
+Les compteurs des réponses d'un shard (app/utils/shards.py) sont tenus dans
+la table admin_stats du shard, dans la transaction de la soumission; la
+lecture additionne la base principale et chaque shard.
+"""
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import AdminStat, Form, FormResponse, ResponseArchive, User
+from app.utils.database import read_session, shard_connection, upsert_insert
+from app.utils.shard_routing import each_shard
+
+ROLES = ('admin', 'creator', 'user')
+RECENT_DAYS = 7
+# Présent une fois la table remplie par rebuild_admin_stats (avant, les variations seules ne suffisent pas)
+INITIALIZED = 'initialized'
+
+_cache = {}
+_cache_lock = Lock()
+
+
+def _day_key(prefix, moment):
+    return f'{prefix}.day.{moment.date().isoformat()}'
+
+
+def _user_keys(user):
+    keys = ['users', f'users.role.{user.role}']
+    if user.created_at is not None:
+        keys.append(_day_key('users', user.created_at))
+    return keys
+
+
+def _form_keys(form):
+    keys = ['forms']
+    if form.is_active is not False:
+        keys.append('forms.active')
+    if form.created_at is not None:
+        keys.append(_day_key('forms', form.created_at))
+    return keys
+
+
+def response_stat_keys(submitted_at):
+    """Compteurs touchés par une réponse soumise à cette date"""
+    keys = ['responses']
+    if submitted_at is not None:
+        keys.append(_day_key('responses', submitted_at))
+    return keys
+
+
+def _previous(obj, attribute):
+    """Valeur d'un attribut avant les modifications de ce flush (ou None s'il n'a pas changé)"""
+    history = inspect(obj).attrs[attribute].history
+    return history.deleted[0] if history.has_changes() and history.deleted else None
+
+
+# Charger l'ancienne valeur à l'affectation, même si l'attribut était expiré:
+# sans elle, l'historique ne permet pas de savoir quel compteur décrémenter
+@event.listens_for(User.role, 'set', active_history=True)
+@event.listens_for(Form.is_active, 'set', active_history=True)
+@event.listens_for(Form.deleted_at, 'set', active_history=True)
+def _keep_previous_value(target, value, oldvalue, initiator):
+    pass
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_stat_deltas(session, flush_context):
+    deltas = Counter()
+    responses = Counter()  # Compteurs des réponses: dans la base des réponses (shard courant)
+    for obj in session.new:
+        if isinstance(obj, User):
+            deltas.update(_user_keys(obj))
+        elif isinstance(obj, Form):
+            deltas.update(_form_keys(obj))
+        elif isinstance(obj, FormResponse):
+            responses.update(response_stat_keys(obj.submitted_at))
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            deltas.subtract(_user_keys(obj))
+        elif isinstance(obj, Form):
+            deltas.subtract(_form_keys(obj))
+        elif isinstance(obj, FormResponse):
+            responses.subtract(response_stat_keys(obj.submitted_at))
+    for obj in session.dirty:
+        if isinstance(obj, User):
+            old_role = _previous(obj, 'role')
+            if old_role is not None and old_role != obj.role:
+                deltas[f'users.role.{old_role}'] -= 1
+                deltas[f'users.role.{obj.role}'] += 1
+        elif isinstance(obj, Form):
+            deleted = inspect(obj).attrs['deleted_at'].history
+            if deleted.has_changes() and obj.deleted_at is not None and not any(deleted.deleted):
+                # Formulaire marqué supprimé (app/utils/deletion.py): il ne compte plus
+                deltas.subtract(_form_keys(obj))
+                continue
+            old_active = _previous(obj, 'is_active')
+            if old_active is not None and old_active != obj.is_active:
+                deltas['forms.active'] += 1 if obj.is_active else -1
+
+    responses = {name: value for name, value in responses.items() if value}
+    if responses:
+        apply_stat_deltas(shard_connection(session), responses)
+    deltas = {name: value for name, value in deltas.items() if value}
+    if deltas:
+        apply_stat_deltas(session.connection(), deltas)
+
+
+def apply_stat_deltas(connection, deltas):
+    """
+    Ajouter des variations aux compteurs (création des compteurs manquants pour les ajouts)
+
+    Args:
+        connection: Connexion SQLAlchemy (celle de la transaction en cours; voir shard_connection pour les réponses)
+        deltas (dict): Variation par nom de compteur
+    """
+    table = AdminStat.__table__
+    insert = upsert_insert(connection)
+    for name, delta in sorted(deltas.items()):
+        if delta < 0:
+            # Suppression: jamais de compteur négatif (compteur d'un jour ancien, non tenu)
+            connection.execute(table.update().where(table.c.name == name).values(value=table.c.value + delta))
+            continue
+        if insert is not None:
+            statement = insert(table).values(name=name, value=delta)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.name],
+                set_={'value': table.c.value + statement.excluded.value}
+            ))
+            continue
+        result = connection.execute(table.update().where(table.c.name == name).values(value=table.c.value + delta))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(name=name, value=delta))
+
+
+def forget_form_responses(form_id):
+    """
+    Retirer des compteurs les réponses d'un formulaire (actives et archivées) avant leur suppression en masse
+
+    Query.delete ne passe pas par le flush de l'ORM: à appeler dans la même
+    transaction, juste avant la suppression, avec le shard du formulaire.
+
+    Args:
+        form_id (int): Identifiant du formulaire
+    """
+    since = datetime.utcnow() - timedelta(days=RECENT_DAYS)
+    archived = db.session.query(func.sum(ResponseArchive.response_count)).filter(ResponseArchive.form_id == form_id).scalar() or 0
+    deltas = Counter({'responses': -FormResponse.query.filter_by(form_id=form_id).count() - archived})
+    for (moment,) in db.session.query(FormResponse.submitted_at).filter(
+        FormResponse.form_id == form_id, FormResponse.submitted_at >= since
+    ):
+        deltas[_day_key('responses', moment)] -= 1
+    deltas = {name: value for name, value in deltas.items() if value}
+    if deltas:
+        apply_stat_deltas(shard_connection(), deltas)
+
+
+def rebuild_admin_stats(days=RECENT_DAYS):
+    """
+    Recalculer tous les compteurs depuis les tables (base principale, puis réponses de chaque shard)
+
+    Args:
+        days (int): Nombre de jours d'activité récente recalculés
+
+    Returns:
+        dict: Compteurs recalculés, toutes bases confondues
+    """
+    since = datetime.combine((datetime.utcnow() - timedelta(days=days)).date(), datetime.min.time())
+    stats = {
+        INITIALIZED: 1,
+        'users': User.query.count(),
+        'forms': Form.query.count(),
+        'forms.active': Form.query.filter(Form.is_active.isnot(False)).count()
+    }
+    for role in ROLES:
+        stats[f'users.role.{role}'] = 0
+    for role, count in db.session.query(User.role, func.count(User.id)).group_by(User.role):
+        stats[f'users.role.{role}'] = count
+
+    for prefix, column in (('users', User.created_at), ('forms', Form.created_at)):
+        for (moment,) in db.session.query(column).filter(column >= since):
+            key = _day_key(prefix, moment)
+            stats[key] = stats.get(key, 0) + 1
+    # Réponses de chaque base, dans sa table admin_stats (les réponses archivées restent des réponses)
+    total = Counter()
+    for shard in each_shard():
+        base = stats if shard is None else {}
+        base['responses'] = FormResponse.query.count() + (db.session.query(func.sum(ResponseArchive.response_count)).scalar() or 0)
+        for (moment,) in db.session.query(FormResponse.submitted_at).filter(FormResponse.submitted_at >= since):
+            key = _day_key('responses', moment)
+            base[key] = base.get(key, 0) + 1
+        AdminStat.query.delete(synchronize_session=False)
+        db.session.bulk_insert_mappings(AdminStat, [{'name': name, 'value': value} for name, value in base.items()])
+        db.session.commit()
+        total.update(base)
+    invalidate_admin_stats()
+    return dict(total)
+
+
+def get_admin_stats():
+    """
+    Statistiques du tableau de bord, depuis le cache ou la table admin_stats
+
+    Returns:
+        dict: Totaux (users, users.role.*, forms, forms.active, responses) et
+        activité des RECENT_DAYS derniers jours (recent_users, recent_forms, recent_responses)
+    """
+    app = current_app._get_current_object()
+    now = time.monotonic()
+    with _cache_lock:
+        cached = _cache.get(id(app))
+        if cached is not None and cached[0] > now:
+            return cached[1]
+
+    today = datetime.utcnow()
+    day_names = {}
+    for prefix in ('users', 'forms', 'responses'):
+        for offset in range(RECENT_DAYS):
+            day_names[_day_key(prefix, today - timedelta(days=offset))] = prefix
+    names = ['users', 'forms', 'forms.active', 'responses'] + [f'users.role.{role}' for role in ROLES]
+
+    wanted = [INITIALIZED] + names + list(day_names)
+    rows = _read_stats(read_session, wanted)
+    if INITIALIZED not in rows:
+        # Première utilisation: tout recalculer une fois (sur la base principale, la réplique peut être en retard)
+        rebuild_admin_stats()
+        rows = _read_stats(lambda: db.session, wanted)
+
+    stats = {name: rows.get(name, 0) for name in names}
+    for prefix in ('users', 'forms', 'responses'):
+        stats[f'recent_{prefix}'] = sum(rows.get(name, 0) for name, p in day_names.items() if p == prefix)
+
+    with _cache_lock:
+        _cache[id(app)] = (now + app.config.get('ADMIN_STATS_CACHE_TTL', 15), stats)
+    return stats
+
+
+def _read_stats(session, names):
+    """Somme des compteurs demandés dans la base principale et dans chaque shard"""
+    rows = Counter()
+    for _ in each_shard():
+        rows.update(dict(session().query(AdminStat.name, AdminStat.value).filter(AdminStat.name.in_(names)).all()))
+    return rows
+
+
+def invalidate_admin_stats():
+    """Vider le cache des statistiques (ce processus)"""
+    with _cache_lock:
+        _cache.clear()
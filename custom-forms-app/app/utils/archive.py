@@ -0,0 +1,357 @@
+"""
+Archivage des réponses anciennes
+
+« flask archive-responses » déplace les réponses plus anciennes que
+ARCHIVE_AFTER_DAYS hors de form_responses: par formulaire, dans l'ordre
+(submitted_at, id), des blocs de ARCHIVE_BLOCK_SIZE réponses sont écrits en
+JSON compressé (zlib) dans response_archives avec leur période et leurs
+bornes d'identifiants, puis supprimés de la table active et de l'index des
+champs (response_field_values). La table active et ses index ne contiennent
+plus que les réponses récentes.
+
+Les lectures restent transparentes:
+
+- page des réponses: les blocs sont fusionnés dans la pagination par curseur,
+  et seulement quand la page (ou la période demandée) atteint leurs dates;
+- recherche plein texte: les documents des réponses archivées restent
+  indexés, les réponses trouvées sont relues dans leur bloc;
+- export Excel: réponses archivées puis réponses actives.
+
+Les blocs décompressés sont gardés en mémoire (ARCHIVE_BLOCK_CACHE_SIZE
+blocs, LRU). Compteurs, statistiques et séries temporelles comptent toujours
+les réponses archivées; la carte et les requêtes spatiales portent sur les
+réponses actives.
+"""
+import json
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+from flask import current_app
+
+from app import db
+from app.models import EmailLog, Form, FormFile, FormResponse, ResponseArchive, ResponseFieldValue, User
+from app.utils.clusters import invalidate_form_clusters
+from app.utils.field_index import field_values
+from app.utils.helpers import field_names
+from app.utils.shard_routing import each_shard
+
+# Colonnes de form_responses conservées dans les blocs
+ARCHIVED_COLUMNS = ('id', 'form_id', 'user_id', 'response_data', 'submitted_at', 'ip_address', 'ip_location',
+                    'geolocation', 'latitude', 'longitude', 'geohash', 'address', 'geofence_name',
+                    'outside_geofence', 'additional_emails')
+
+_blocks = OrderedDict()  # archive_id -> [((submitted_at, id), données)] du bloc, dans l'ordre
+_blocks_lock = Lock()
+
+
+class ArchivedResponse:
+    """Réponse lue dans un bloc d'archive (mêmes attributs que FormResponse, en lecture seule)"""
+
+    archived = True
+
+    def __init__(self, data):
+        for column in ARCHIVED_COLUMNS:
+            setattr(self, column, data.get(column))
+        self.submitted_at = datetime.fromisoformat(data['submitted_at'])
+        self.responder = None  # Renseigné par attach_responders
+
+    def get_response_value(self, field_id):
+        return (self.response_data or {}).get(field_id, '')
+
+    def has_location(self):
+        return self.geolocation is not None
+
+    def __repr__(self):
+        return f'<ArchivedResponse {self.id} for Form {self.form_id}>'
+
+
+def _serialize(response):
+    data = {column: getattr(response, column) for column in ARCHIVED_COLUMNS}
+    data['submitted_at'] = response.submitted_at.isoformat()
+    return data
+
+
+def _load_block(archive_id, session):
+    with _blocks_lock:
+        if archive_id in _blocks:
+            _blocks.move_to_end(archive_id)
+            return _blocks[archive_id]
+
+    payload = session.query(ResponseArchive.payload).filter(ResponseArchive.id == archive_id).scalar()
+    # Le cache garde les données brutes (partagées entre requêtes): chaque lecture crée ses ArchivedResponse
+    rows = [((datetime.fromisoformat(data['submitted_at']), data['id']), data) for data in json.loads(zlib.decompress(payload))]
+    rows.sort(key=lambda row: row[0])
+
+    with _blocks_lock:
+        _blocks[archive_id] = rows
+        while len(_blocks) > current_app.config.get('ARCHIVE_BLOCK_CACHE_SIZE', 64):
+            _blocks.popitem(last=False)
+    return rows
+
+
+def _new_block(form_id, records, period_start, period_end):
+    """Bloc des réponses sérialisées (dans l'ordre), ajouté à la session"""
+    raw = json.dumps(records, separators=(',', ':'), ensure_ascii=False).encode()
+    ids = [data['id'] for data in records]
+    db.session.add(ResponseArchive(
+        form_id=form_id,
+        period_start=period_start,
+        period_end=period_end,
+        min_response_id=min(ids),
+        max_response_id=max(ids),
+        response_count=len(records),
+        raw_bytes=len(raw),
+        payload=zlib.compress(raw, 9)
+    ))
+
+
+def _write_block(form_id, responses):
+    _new_block(form_id, [_serialize(r) for r in responses], responses[0].submitted_at, responses[-1].submitted_at)
+    ids = [r.id for r in responses]
+
+    # Les fichiers et courriels restent, sans lien vers la réponse de la table active
+    FormFile.query.filter(FormFile.response_id.in_(ids)).update({FormFile.response_id: None}, synchronize_session=False)
+    EmailLog.query.filter(EmailLog.response_id.in_(ids)).update({EmailLog.response_id: None}, synchronize_session=False)
+    ResponseFieldValue.query.filter(ResponseFieldValue.response_id.in_(ids)).delete(synchronize_session=False)
+    # Suppression en masse: les compteurs, statistiques et séries (qui comptent les réponses archivées) ne bougent pas
+    FormResponse.query.filter(FormResponse.id.in_(ids)).delete(synchronize_session=False)
+
+
+def archive_responses(before, form_id=None, block_size=1000):
+    """
+    Archiver les réponses soumises avant une date
+
+    Args:
+        before (datetime): Date limite (exclue)
+        form_id (int): Identifiant du formulaire, ou None pour tous
+        block_size (int): Nombre de réponses par bloc (un bloc par transaction)
+
+    Returns:
+        int: Nombre de réponses archivées
+    """
+    forms = db.session.query(FormResponse.form_id).filter(FormResponse.submitted_at < before).distinct()
+    if form_id is not None:
+        forms = forms.filter(FormResponse.form_id == form_id)
+
+    count = 0
+    # Base principale et shards: chaque bloc est écrit dans la base des réponses qu'il remplace
+    for _ in each_shard():
+        for (current_form_id,) in forms.all():
+            while True:
+                responses = FormResponse.query.filter(
+                    FormResponse.form_id == current_form_id,
+                    FormResponse.submitted_at < before
+                ).order_by(FormResponse.submitted_at, FormResponse.id).limit(block_size).all()
+                if not responses:
+                    break
+                _write_block(current_form_id, responses)
+                db.session.commit()
+                # Positions retirées de la table active (la carte n'affiche que celle-ci)
+                invalidate_form_clusters(current_form_id)
+                # Lignes supprimées en masse: à retirer de la session
+                for response in responses:
+                    db.session.expunge(response)
+                count += len(responses)
+    return count
+
+
+def _matches(key, data, start, end, filters, names=None):
+    if start is not None and key[0] < start:
+        return False
+    if end is not None and key[0] > end:
+        return False
+    if filters:
+        values = set(field_values([field_id for field_id, _ in filters], data.get('response_data'), names))
+        return all(f in values for f in filters)
+    return True
+
+
+def archived_page(form_id, limit, position=None, descending=True, bound=None, start=None, end=None,
+                  filters=(), session=None):
+    """
+    Réponses archivées suivant une position dans l'ordre (submitted_at, id)
+
+    Seuls les blocs dont la période recoupe l'intervalle utile sont décompressés.
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        limit (int): Nombre maximum de réponses
+        position (tuple): (submitted_at, id) exclu à partir duquel lire, ou None depuis le début
+        descending (bool): Ordre décroissant
+        bound (tuple): (submitted_at, id) au-delà duquel les réponses ne sont pas utiles, ou None
+        start, end (datetime): Période de soumission, ou None
+        filters (list): Tuples (field_id, valeur) sur des champs indexés, tous requis
+        session (Session): Session de lecture (db.session par défaut)
+
+    Returns:
+        list: ArchivedResponse, dans l'ordre demandé
+    """
+    session = session or db.session
+    blocks = session.query(ResponseArchive.id, ResponseArchive.period_start, ResponseArchive.period_end).filter(
+        ResponseArchive.form_id == form_id
+    )
+    # Blocs recoupant l'intervalle entre position et bound, et la période demandée
+    low = bound if descending else position
+    high = position if descending else bound
+    if low is not None:
+        blocks = blocks.filter(ResponseArchive.period_end >= low[0])
+    if high is not None:
+        blocks = blocks.filter(ResponseArchive.period_start <= high[0])
+    if start is not None:
+        blocks = blocks.filter(ResponseArchive.period_end >= start)
+    if end is not None:
+        blocks = blocks.filter(ResponseArchive.period_start <= end)
+    if descending:
+        blocks = blocks.order_by(ResponseArchive.period_end.desc(), ResponseArchive.id.desc())
+    else:
+        blocks = blocks.order_by(ResponseArchive.period_start.asc(), ResponseArchive.id.asc())
+
+    # Réponses de l'API: valeurs enregistrées par nom de champ
+    names = field_names(session.query(Form.form_data).filter(Form.id == form_id).scalar()) if filters else None
+    found = []
+    for archive_id, period_start, period_end in blocks.all():
+        if len(found) >= limit:
+            # Un bloc suivant ne peut plus devancer les réponses déjà retenues
+            threshold = found[limit - 1][0][0]
+            if (period_end < threshold) if descending else (period_start > threshold):
+                break
+        for key, data in _load_block(archive_id, session):
+            if low is not None and key <= low or high is not None and key >= high:
+                continue
+            if _matches(key, data, start, end, filters, names):
+                found.append((key, data))
+        found.sort(key=lambda row: row[0], reverse=descending)
+        del found[limit:]
+    return attach_responders([ArchivedResponse(data) for _, data in found], session)
+
+
+def archived_responses(form_id, start=None, end=None, session=None):
+    """
+    Toutes les réponses archivées d'un formulaire, des plus anciennes aux plus récentes
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        start, end (datetime): Période de soumission, ou None
+        session (Session): Session de lecture (db.session par défaut)
+
+    Returns:
+        list: ArchivedResponse
+    """
+    session = session or db.session
+    blocks = session.query(ResponseArchive.id).filter(ResponseArchive.form_id == form_id)
+    if start is not None:
+        blocks = blocks.filter(ResponseArchive.period_end >= start)
+    if end is not None:
+        blocks = blocks.filter(ResponseArchive.period_start <= end)
+    found = []
+    for (archive_id,) in blocks.order_by(ResponseArchive.period_start, ResponseArchive.id):
+        found.extend(row for row in _load_block(archive_id, session) if _matches(*row, start, end, ()))
+    found.sort(key=lambda row: row[0])
+    return attach_responders([ArchivedResponse(data) for _, data in found], session)
+
+
+def get_archived_responses(form_id, response_ids, session=None):
+    """
+    Réponses archivées par identifiant
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        response_ids (list): Identifiants recherchés
+        session (Session): Session de lecture (db.session par défaut)
+
+    Returns:
+        dict: ArchivedResponse par identifiant (absents si introuvables)
+    """
+    session = session or db.session
+    wanted = set(response_ids)
+    if not wanted:
+        return {}
+    blocks = session.query(ResponseArchive.id).filter(
+        ResponseArchive.form_id == form_id,
+        ResponseArchive.min_response_id <= max(wanted),
+        ResponseArchive.max_response_id >= min(wanted)
+    )
+    found = {}
+    for (archive_id,) in blocks:
+        found.update((key[1], ArchivedResponse(data)) for key, data in _load_block(archive_id, session) if key[1] in wanted)
+    attach_responders(list(found.values()), session)
+    return found
+
+
+def attach_responders(responses, session=None):
+    """
+    Renseigner le répondant des réponses archivées (une requête pour toutes)
+
+    Args:
+        responses (list): ArchivedResponse
+        session (Session): Session de lecture (db.session par défaut)
+
+    Returns:
+        list: Les mêmes réponses
+    """
+    user_ids = {r.user_id for r in responses if r.user_id}
+    if user_ids:
+        users = {u.id: u for u in (session or db.session).query(User).filter(User.id.in_(user_ids))}
+        for response in responses:
+            response.responder = users.get(response.user_id)
+    return responses
+
+
+def iter_archived_data(form_id=None, archive_id=None):
+    """
+    Données brutes de toutes les réponses archivées, bloc par bloc (recalculs des compteurs et agrégats)
+
+    Args:
+        form_id (int): Identifiant du formulaire, ou None pour tous
+        archive_id (int): Identifiant d'un bloc, ou None pour tous
+
+    Yields:
+        dict: Colonnes ARCHIVED_COLUMNS d'une réponse (submitted_at converti en datetime)
+    """
+    blocks = db.session.query(ResponseArchive.id)
+    if form_id is not None:
+        blocks = blocks.filter(ResponseArchive.form_id == form_id)
+    if archive_id is not None:
+        blocks = blocks.filter(ResponseArchive.id == archive_id)
+    for (block_id,) in blocks.order_by(ResponseArchive.id).all():
+        payload = db.session.query(ResponseArchive.payload).filter(ResponseArchive.id == block_id).scalar()
+        for data in json.loads(zlib.decompress(payload)):
+            data['submitted_at'] = datetime.fromisoformat(data['submitted_at'])
+            yield data
+
+
+def rewrite_archive_block(archive_id, rows):
+    """
+    Remplacer le contenu d'un bloc (anonymisation, purge), ou le supprimer s'il ne reste rien
+
+    Le contenu est écrit dans un nouveau bloc: les autres processus, dont le
+    cache est indexé par identifiant de bloc, ne relisent jamais l'ancien.
+
+    Args:
+        archive_id (int): Identifiant du bloc
+        rows (list): Données des réponses conservées (voir iter_archived_data)
+    """
+    form_id = db.session.query(ResponseArchive.form_id).filter(ResponseArchive.id == archive_id).scalar()
+    if form_id is None:
+        return
+    if rows:
+        rows = sorted(rows, key=lambda data: (data['submitted_at'], data['id']))
+        records = [dict(data, submitted_at=data['submitted_at'].isoformat()) for data in rows]
+        _new_block(form_id, records, rows[0]['submitted_at'], rows[-1]['submitted_at'])
+    ResponseArchive.query.filter(ResponseArchive.id == archive_id).delete(synchronize_session=False)
+    with _blocks_lock:
+        _blocks.pop(archive_id, None)
+
+
+def delete_form_archives(form_id):
+    """
+    Supprimer les blocs d'archive d'un formulaire (suppression du formulaire)
+
+    Args:
+        form_id (int): Identifiant du formulaire
+    """
+    ResponseArchive.query.filter_by(form_id=form_id).delete(synchronize_session=False)
+    with _blocks_lock:
+        _blocks.clear()
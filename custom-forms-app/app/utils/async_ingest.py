@@ -0,0 +1,109 @@
+"""
+Outils pour le chemin de soumission asynchrone (vues async de Flask)
+
+Les écritures de fichiers, le décodage des signatures et le commit en base
+sont des opérations bloquantes. Dans une vue async, elles sont déléguées à un
+pool de threads partagé afin de pouvoir être lancées en parallèle et attendues
+sans bloquer la boucle d'événements de la requête. Un limiteur de concurrence
+refuse immédiatement les soumissions excédentaires (503) plutôt que de les
+laisser s'accumuler.
+
+Les vues async de Flask nécessitent le paquet ``asgiref``.
+"""
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+
+from flask import current_app
+
+_executors = {}
+_limiters = {}
+_registry_lock = Lock()
+
+
+def _per_process(registry, app, factory):
+    """Obtenir l'objet de l'application pour le processus courant (indexé par PID pour survivre à un fork)"""
+    key = (id(app), os.getpid())
+    value = registry.get(key)
+    if value is None:
+        with _registry_lock:
+            value = registry.get(key)
+            if value is None:
+                value = factory()
+                registry[key] = value
+    return value
+
+
+def get_io_executor(app):
+    """
+    Obtenir le pool de threads d'E/S de l'application
+
+    Args:
+        app: Application Flask
+
+    Returns:
+        ThreadPoolExecutor: Pool partagé par les vues async
+    """
+    return _per_process(_executors, app, lambda: ThreadPoolExecutor(
+        max_workers=app.config.get('INGEST_ASYNC_WORKERS', 8),
+        thread_name_prefix='ingest-io'
+    ))
+
+
+class SubmissionLimiter:
+    """Limite non bloquante du nombre de soumissions traitées simultanément"""
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self._semaphore = BoundedSemaphore(max_concurrency)
+
+    def try_acquire(self):
+        """
+        Réserver une place sans attendre
+
+        Returns:
+            bool: True si la soumission peut être traitée
+        """
+        return self._semaphore.acquire(blocking=False)
+
+    def release(self):
+        self._semaphore.release()
+
+
+def get_submission_limiter(app):
+    """
+    Obtenir le limiteur de concurrence des soumissions async
+
+    Args:
+        app: Application Flask
+
+    Returns:
+        SubmissionLimiter: Limiteur partagé par les threads du processus
+    """
+    return _per_process(_limiters, app, lambda: SubmissionLimiter(
+        app.config.get('INGEST_ASYNC_MAX_CONCURRENCY', 32)
+    ))
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Exécuter une fonction bloquante dans le pool d'E/S, avec le contexte d'application
+
+    Args:
+        func (callable): Fonction à exécuter
+        *args, **kwargs: Arguments transmis à la fonction
+
+    Returns:
+        Valeur retournée par la fonction
+    """
+    app = current_app._get_current_object()
+
+    def call():
+        with app.app_context():
+            return func(*args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    # Copie du contexte: le shard courant de la requête suit la fonction dans le pool
+    return await loop.run_in_executor(get_io_executor(app), contextvars.copy_context().run, call)
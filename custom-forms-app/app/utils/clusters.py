@@ -0,0 +1,209 @@
+"""
+Regroupement (clustering) des réponses géolocalisées pour la carte
+
+La carte demande les tuiles qu'elle affiche (z, x, y du découpage Web
+Mercator de Leaflet/OpenStreetMap). Chaque tuile est découpée en une grille de
+CLUSTER_GRID × CLUSTER_GRID cellules; le regroupement (nombre, centre moyen)
+est calculé en SQL par un GROUP BY sur la cellule, après une sélection des
+réponses de la tuile par l'index geohash.
+
+Les tuiles calculées sont gardées en cache par (formulaire, z, x, y). Quand
+une réponse géolocalisée est enregistrée ou supprimée, seules les tuiles qui
+la contiennent (une par niveau de zoom) sont invalidées, après le commit.
+Les écritures en masse qui échappent à l'ORM (archivage, conservation,
+effacement d'un formulaire) invalident les tuiles du formulaire après
+chaque lot validé (invalidate_form_clusters).
+Le cache est propre à chaque processus: dans les autres workers, une tuile
+reste au plus CLUSTER_CACHE_TTL secondes en cache.
+"""
+import math
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from flask import current_app
+from sqlalchemy import case, event, func
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import FormResponse
+from app.utils.spatial import bbox_conditions
+
+# Latitude maximale de la projection Web Mercator
+MAX_MERCATOR_LAT = 85.0511287798
+MAX_ZOOM = 20
+
+_tiles = OrderedDict()
+_tiles_lock = Lock()
+
+
+def tile_bounds(z, x, y):
+    """
+    Rectangle couvert par une tuile Web Mercator
+
+    Args:
+        z, x, y (int): Coordonnées de la tuile
+
+    Returns:
+        tuple: (sud, ouest, nord, est) en degrés
+    """
+    n = 1 << z
+    return _tile_lat(y + 1, n), x / n * 360.0 - 180.0, _tile_lat(y, n), (x + 1) / n * 360.0 - 180.0
+
+
+def _tile_lat(y, n):
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+
+
+def tile_for(lat, lon, z):
+    """
+    Tuile contenant une position
+
+    Args:
+        lat, lon (float): Position en degrés
+        z (int): Niveau de zoom
+
+    Returns:
+        tuple: (x, y), ou None hors de la projection
+    """
+    if abs(lat) > MAX_MERCATOR_LAT:
+        return None
+    n = 1 << z
+    x = min(int((lon + 180.0) / 360.0 * n), n - 1)
+    phi = math.radians(lat)
+    # Sur un bord commun, la tuile au nord (voir compute_clusters): y croît vers le sud
+    y = min(max(math.ceil((1 - math.asinh(math.tan(phi)) / math.pi) / 2 * n) - 1, 0), n - 1)
+    return x, y
+
+
+def _cell_case(column, bounds):
+    """Expression SQL donnant l'indice de la cellule d'une valeur (bornes croissantes)"""
+    return case(
+        *[(column < bound, i) for i, bound in enumerate(bounds[1:-1])],
+        else_=len(bounds) - 2
+    )
+
+
+def compute_clusters(form_id, z, x, y, grid=8):
+    """
+    Calculer les regroupements d'une tuile
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        z, x, y (int): Coordonnées de la tuile
+        grid (int): Nombre de cellules par côté
+
+    Returns:
+        list: Regroupements (lat, lon, count, et id pour une réponse isolée)
+    """
+    south, west, north, east = tile_bounds(z, x, y)
+    n = 1 << z
+    # Bornes des cellules: linéaires en longitude, suivant la projection en latitude
+    lon_bounds = [west + (east - west) * i / grid for i in range(grid + 1)]
+    lat_bounds = [_tile_lat(y + 1 - i / grid, n) for i in range(grid + 1)]
+
+    col = _cell_case(FormResponse.longitude, lon_bounds).label('col')
+    row = _cell_case(FormResponse.latitude, lat_bounds).label('row')
+    rows = db.session.query(
+        col, row,
+        func.count(FormResponse.id),
+        func.avg(FormResponse.latitude),
+        func.avg(FormResponse.longitude),
+        func.min(FormResponse.id)
+    ).filter(
+        FormResponse.form_id == form_id,
+        # Tuiles semi-ouvertes (bords nord et est exclus, sauf ceux de la projection), comme tile_for
+        *bbox_conditions(south, west, north, east, exclude_max_lat=y > 0, exclude_max_lon=x < n - 1)
+    ).group_by(col, row).all()
+
+    clusters = []
+    for _, _, count, lat, lon, first_id in rows:
+        cluster = {'lat': round(lat, 6), 'lon': round(lon, 6), 'count': count}
+        if count == 1:
+            cluster['id'] = first_id
+        clusters.append(cluster)
+    return clusters
+
+
+def get_clusters(form_id, z, x, y):
+    """
+    Regroupements d'une tuile, avec cache
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        z, x, y (int): Coordonnées de la tuile
+
+    Returns:
+        list: Regroupements de la tuile (voir compute_clusters)
+    """
+    config = current_app.config
+    key = (form_id, z, x, y)
+    now = time.monotonic()
+    with _tiles_lock:
+        cached = _tiles.get(key)
+        if cached is not None and cached[0] > now:
+            _tiles.move_to_end(key)
+            return cached[1]
+
+    clusters = compute_clusters(form_id, z, x, y, grid=config.get('CLUSTER_GRID', 8))
+
+    with _tiles_lock:
+        _tiles[key] = (now + config.get('CLUSTER_CACHE_TTL', 300), clusters)
+        _tiles.move_to_end(key)
+        while len(_tiles) > config.get('CLUSTER_CACHE_SIZE', 10000):
+            _tiles.popitem(last=False)
+    return clusters
+
+
+def invalidate_point(form_id, lat, lon):
+    """
+    Oublier les tuiles en cache qui contiennent une position
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        lat, lon (float): Position ajoutée ou supprimée
+    """
+    with _tiles_lock:
+        for z in range(MAX_ZOOM + 1):
+            tile = tile_for(lat, lon, z)
+            if tile is None:
+                return
+            _tiles.pop((form_id, z) + tile, None)
+
+
+def invalidate_form_clusters(form_id=None):
+    """
+    Oublier toutes les tuiles en cache d'un formulaire (ou de tous les formulaires)
+
+    Args:
+        form_id (int): Identifiant du formulaire, ou None pour tout vider
+    """
+    with _tiles_lock:
+        if form_id is None:
+            _tiles.clear()
+            return
+        for key in [key for key in _tiles if key[0] == form_id]:
+            del _tiles[key]
+
+
+# Invalidation incrémentale: les positions modifiées sont relevées à chaque flush
+# et les tuiles ne sont invalidées qu'après le commit, pour qu'une tuile recalculée
+# entre-temps ne puisse pas être mise en cache sans la nouvelle réponse.
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_points(session, flush_context):
+    points = session.info.setdefault('cluster_points', set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, FormResponse) and obj.latitude is not None and obj.longitude is not None:
+            points.add((obj.form_id, obj.latitude, obj.longitude))
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_points(session):
+    for form_id, lat, lon in session.info.pop('cluster_points', ()):
+        invalidate_point(form_id, lat, lon)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_points(session):
+    session.info.pop('cluster_points', None)
@@ -0,0 +1,284 @@
+"""
+Compteurs dénormalisés des formulaires
+
+Form.response_count, Form.last_submitted_at et Form.file_bytes évitent de
+compter les réponses (jointure + GROUP BY) à chaque affichage d'une liste de
+formulaires ou d'un tableau de bord.
+
+Les octets comptent les fichiers enregistrés en FormFile (API) et ceux
+décrits dans response_data (formulaire HTML, brouillons: {"filename", "size"}).
+
+Ils sont tenus à jour dans la transaction de l'écriture: après chaque
+flush, les réponses et fichiers ajoutés ou supprimés par l'ORM sont agrégés
+par formulaire et appliqués en un UPDATE relatif par formulaire (un lot du
+group commit ne coûte donc qu'une mise à jour par formulaire). Les
+suppressions en masse (Query.delete) échappent à ce mécanisme: la commande
+« flask reconcile-form-counters » recalcule les compteurs depuis les tables.
+
+Les compteurs d'un formulaire placé dans un shard (app/utils/shards.py) sont
+tenus dans la base du shard (form_counters), avec ses réponses: une
+soumission n'écrit pas dans la base principale. Les pages qui les affichent
+les relisent avec attach_form_counters.
+"""
+from collections import defaultdict
+
+from sqlalchemy import case, event, func
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app import db
+from app.models import Form, FormCounter, FormFile, FormResponse, ResponseArchive
+from app.utils.archive import iter_archived_data
+from app.utils.database import read_session, shard_connection, upsert_insert
+from app.utils.shard_routing import current_shard, each_shard, use_shard
+
+COUNTER_COLUMNS = ('response_count', 'last_submitted_at', 'file_bytes')
+
+
+def response_file_bytes(response_data):
+    """
+    Taille des fichiers décrits dans les données d'une réponse
+
+    Args:
+        response_data (dict): Données de la réponse
+
+    Returns:
+        int: Somme des tailles (octets)
+    """
+    if not isinstance(response_data, dict):
+        return 0
+    return sum(value.get('size') or 0 for value in response_data.values()
+               if isinstance(value, dict) and isinstance(value.get('size'), int))
+
+
+def apply_counter_deltas(connection, deltas, recompute_last=None):
+    """
+    Appliquer des variations aux compteurs des formulaires (un UPDATE relatif par formulaire)
+
+    Dans un shard, les compteurs sont ceux de form_counters (voir _apply_shard_counter_deltas).
+
+    Args:
+        connection: Connexion SQLAlchemy vers la base des réponses (voir shard_connection)
+        deltas (dict): [réponses, octets, dernière soumission ou None] par form_id
+        recompute_last (dict): Dernière soumission restante des formulaires dont une réponse a été supprimée
+    """
+    recompute_last = recompute_last or {}
+    if current_shard() is not None:
+        _apply_shard_counter_deltas(connection, deltas, recompute_last)
+        return
+    forms = Form.__table__
+    for form_id, (count, size, last) in deltas.items():
+        values = {
+            'response_count': func.coalesce(forms.c.response_count, 0) + count,
+            'file_bytes': func.coalesce(forms.c.file_bytes, 0) + size,
+            # Date de modification du formulaire (et clé du validateur compilé): inchangée par les compteurs
+            'updated_at': forms.c.updated_at
+        }
+        if form_id in recompute_last:
+            values['last_submitted_at'] = recompute_last[form_id]
+        elif last is not None:
+            values['last_submitted_at'] = case(
+                (forms.c.last_submitted_at.is_(None), last),
+                (forms.c.last_submitted_at < last, last),
+                else_=forms.c.last_submitted_at
+            )
+        connection.execute(forms.update().where(forms.c.id == form_id).values(values))
+
+
+def _apply_shard_counter_deltas(connection, deltas, recompute_last):
+    """Variations des compteurs dans form_counters (base SQLite du shard: INSERT ... ON CONFLICT)"""
+    table = FormCounter.__table__
+    insert = upsert_insert(connection)
+    for form_id, (count, size, last) in sorted(deltas.items()):
+        last = recompute_last.get(form_id, last)
+        statement = insert(table).values(form_id=form_id, response_count=count, file_bytes=size, last_submitted_at=last)
+        values = {
+            'response_count': table.c.response_count + statement.excluded.response_count,
+            'file_bytes': table.c.file_bytes + statement.excluded.file_bytes
+        }
+        if form_id in recompute_last:
+            values['last_submitted_at'] = statement.excluded.last_submitted_at
+        elif last is not None:
+            values['last_submitted_at'] = case(
+                (table.c.last_submitted_at.is_(None), statement.excluded.last_submitted_at),
+                (table.c.last_submitted_at < statement.excluded.last_submitted_at, statement.excluded.last_submitted_at),
+                else_=table.c.last_submitted_at
+            )
+        connection.execute(statement.on_conflict_do_update(index_elements=[table.c.form_id], set_=values))
+
+
+def remaining_last_submission(session, form_id):
+    """
+    Dernière soumission restante d'un formulaire, réponses actives et archivées
+
+    Args:
+        session (Session): Session de la base des réponses du formulaire
+        form_id (int): Identifiant du formulaire
+
+    Returns:
+        datetime: Date de la soumission la plus récente, ou None
+    """
+    active = session.query(func.max(FormResponse.submitted_at)).filter(FormResponse.form_id == form_id).scalar()
+    archived = session.query(func.max(ResponseArchive.period_end)).filter(ResponseArchive.form_id == form_id).scalar()
+    return max(filter(None, (active, archived)), default=None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_form_counters(session, flush_context):
+    deltas = defaultdict(lambda: [0, 0, None])  # form_id -> [réponses, octets, dernière soumission]
+    recompute_last = set()
+
+    for obj in session.new:
+        if isinstance(obj, FormResponse):
+            delta = deltas[obj.form_id]
+            delta[0] += 1
+            delta[1] += response_file_bytes(obj.response_data)
+            if obj.submitted_at is not None and (delta[2] is None or obj.submitted_at > delta[2]):
+                delta[2] = obj.submitted_at
+        elif isinstance(obj, FormFile) and obj.file_size:
+            deltas[obj.form_id][1] += obj.file_size
+    for obj in session.deleted:
+        if isinstance(obj, FormResponse):
+            deltas[obj.form_id][0] -= 1
+            deltas[obj.form_id][1] -= response_file_bytes(obj.response_data)
+            recompute_last.add(obj.form_id)
+        elif isinstance(obj, FormFile) and obj.file_size:
+            deltas[obj.form_id][1] -= obj.file_size
+
+    deltas = {form_id: delta for form_id, delta in deltas.items() if delta != [0, 0, None] or form_id in recompute_last}
+    if deltas:
+        # Une réponse a été supprimée: la plus récente restante (index form_id, submitted_at), lue par la
+        # session dans la base des réponses (éventuellement un shard, distinct de celle des formulaires)
+        last = {form_id: remaining_last_submission(session, form_id) for form_id in recompute_last}
+        apply_counter_deltas(shard_connection(session), deltas, last)
+
+
+def reconcile_form_counters(form_id=None, batch_size=1000):
+    """
+    Recalculer les compteurs des formulaires depuis les réponses (actives et archivées) et fichiers
+
+    Args:
+        form_id (int): Identifiant du formulaire, ou None pour tous
+        batch_size (int): Nombre de réponses lues par requête (tailles des fichiers de response_data)
+
+    Returns:
+        int: Nombre de formulaires dont les compteurs ont été corrigés
+    """
+    responses, sizes = {}, defaultdict(int)
+
+    def add(current_form_id, count, last):
+        previous_count, previous_last = responses.get(current_form_id, (0, None))
+        responses[current_form_id] = (previous_count + count, max(filter(None, (previous_last, last)), default=None))
+
+    # Réponses de la base principale et de chaque shard
+    for _ in each_shard():
+        for row in db.session.query(
+            FormResponse.form_id,
+            func.count(FormResponse.id).label('count'),
+            func.max(FormResponse.submitted_at).label('last')
+        ).filter(*([FormResponse.form_id == form_id] if form_id is not None else [])).group_by(FormResponse.form_id):
+            add(row.form_id, row.count, row.last)
+        for current_form_id, size in db.session.query(FormFile.form_id, func.coalesce(func.sum(FormFile.file_size), 0)).filter(
+            *([FormFile.form_id == form_id] if form_id is not None else [])
+        ).group_by(FormFile.form_id):
+            sizes[current_form_id] += size
+
+        query = db.session.query(FormResponse.id, FormResponse.form_id, FormResponse.response_data)
+        if form_id is not None:
+            query = query.filter(FormResponse.form_id == form_id)
+        last_id = 0
+        while True:
+            rows = query.filter(FormResponse.id > last_id).order_by(FormResponse.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                sizes[row.form_id] += response_file_bytes(row.response_data)
+        # Réponses archivées: comptées comme les réponses actives
+        for data in iter_archived_data(form_id):
+            add(data['form_id'], 1, data['submitted_at'])
+            sizes[data['form_id']] += response_file_bytes(data['response_data'])
+
+    forms = Form.__table__
+    query = db.session.query(Form)
+    if form_id is not None:
+        query = query.filter(Form.id == form_id)
+    forms_list = query.all()
+    attach_form_counters(forms_list, session=db.session)
+    fixed = 0
+    for form in forms_list:
+        count, last = responses.get(form.id, (0, None))
+        size = sizes.get(form.id, 0)
+        if (form.response_count, form.last_submitted_at, form.file_bytes) == (count, last, size):
+            continue
+        fixed += 1
+        if form.shard:
+            # Compteurs tenus dans le shard du formulaire (écrits avant la base principale)
+            with use_shard(form.shard):
+                counters = FormCounter.__table__
+                connection = shard_connection()
+                connection.execute(counters.delete().where(counters.c.form_id == form.id))
+                connection.execute(counters.insert().values(form_id=form.id, response_count=count,
+                                                            last_submitted_at=last, file_bytes=size))
+            continue
+        # UPDATE explicite: la date de modification du formulaire (onupdate) ne suit pas les compteurs
+        db.session.execute(forms.update().where(forms.c.id == form.id).values(
+            response_count=count, last_submitted_at=last, file_bytes=size, updated_at=forms.c.updated_at
+        ))
+    db.session.commit()
+    return fixed
+
+
+def attach_form_counters(forms, session=None):
+    """
+    Relire dans leur shard les compteurs des formulaires qui y sont placés
+
+    Les valeurs sont chargées comme si elles venaient de la base (sans
+    modification à enregistrer): les pages affichent form.response_count,
+    form.last_submitted_at et form.file_bytes sans distinguer les bases.
+
+    Args:
+        forms (list): Formulaires (Form)
+        session (Session): Session de lecture (read_session() par défaut)
+
+    Returns:
+        list: Les mêmes formulaires
+    """
+    by_shard = defaultdict(list)
+    for form in forms:
+        if form.shard:
+            by_shard[form.shard].append(form)
+    for shard, group in by_shard.items():
+        with use_shard(shard):
+            rows = {row.form_id: row for row in (session or read_session()).query(
+                FormCounter.form_id, *(getattr(FormCounter, name) for name in COUNTER_COLUMNS)
+            ).filter(FormCounter.form_id.in_([form.id for form in group]))}
+        for form in group:
+            row = rows.get(form.id)
+            set_committed_value(form, 'response_count', row.response_count if row else 0)
+            set_committed_value(form, 'last_submitted_at', row.last_submitted_at if row else None)
+            set_committed_value(form, 'file_bytes', row.file_bytes if row else 0)
+    return forms
+
+
+def popular_forms(limit=5):
+    """
+    Formulaires ayant le plus de réponses, toutes bases confondues
+
+    Args:
+        limit (int): Nombre de formulaires
+
+    Returns:
+        list: Formulaires (Form), compteurs à jour, par nombre de réponses décroissant
+    """
+    forms = Form.query.filter(Form.shard.is_(None)).order_by(Form.response_count.desc()).limit(limit).all()
+    for shard in each_shard():
+        if shard is None:
+            continue
+        # Candidats du shard: les plus gros compteurs de form_counters (formulaires supprimés exclus ensuite)
+        ids = [form_id for (form_id,) in read_session().query(FormCounter.form_id).order_by(
+            FormCounter.response_count.desc()
+        ).limit(limit)]
+        if ids:
+            forms.extend(attach_form_counters(Form.query.filter(Form.id.in_(ids), Form.shard == shard).all()))
+    return sorted(forms, key=lambda form: form.response_count or 0, reverse=True)[:limit]
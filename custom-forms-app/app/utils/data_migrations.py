@@ -0,0 +1,300 @@
+"""
+Migrations de données en ligne, par lots et avec reprise
+
+Les migrations Alembic changent le schéma; changer la forme des données
+(le JSON de form_data ou de response_data, une colonne dérivée à remplir)
+demanderait sinon un UPDATE géant qui verrouille la table. Une migration de
+données est une fonction enregistrée par @data_migration qui reçoit une
+ligne et rend les valeurs à écrire (ou None pour la laisser telle quelle).
+
+run_data_migration parcourt la table par identifiant croissant (pagination
+par clé: chaque lot est une requête indexée), un lot de
+DATA_MIGRATION_BATCH_SIZE lignes par transaction, avec une pause de
+DATA_MIGRATION_PAUSE secondes entre deux lots pour laisser passer les
+écritures de l'application. Après chaque lot, la table
+data_migration_checkpoints enregistre le dernier identifiant traité et la
+progression, dans la même transaction que les données:
+
+- une migration interrompue (arrêt, erreur, pause_data_migration) reprend
+  au lot suivant, avec les mêmes options;
+- une seule exécution à la fois par migration et par base (UPDATE
+  conditionnel, comme les tâches de fond); une exécution « running » dont le
+  dernier lot date de plus de JOB_STALE_SECONDS est reprise;
+- relancée une fois terminée, une migration ne traite que les lignes
+  ajoutées depuis; restart=True repart du début.
+
+Les tables des réponses sont parcourues dans la base principale puis dans
+chaque shard (app/utils/shards.py), avec un point de reprise par base.
+
+Les lignes sont écrites par UPDATE en masse: les écouteurs de l'ORM
+(compteurs, index des champs et de recherche) ne sont pas appelés. Une
+migration qui modifie des données indexées doit être suivie de
+« flask reindex-response-fields » ou « flask rebuild-search-index ». Une
+migration doit rester idempotente: un lot interrompu avant son commit est
+traité à nouveau.
+"""
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models import DataMigrationCheckpoint, Form, FormResponse
+from app.utils.shard_routing import SHARDED_TABLES, shard_names, use_shard
+
+DATA_MIGRATIONS = {}
+
+
+class DataMigrationBusyError(Exception):
+    """Migration déjà en cours d'exécution sur cette base"""
+
+
+class DataMigration:
+    """Migration de données enregistrée (voir data_migration)"""
+
+    def __init__(self, name, model, columns, transform, where=None, description=None):
+        self.name = name
+        self.model = model
+        self.columns = columns
+        self.transform = transform
+        self.where = where
+        self.description = description
+
+    def bases(self):
+        """Bases parcourues: principale, puis chaque shard pour les tables des réponses"""
+        if self.model.__table__.name in SHARDED_TABLES:
+            return [None] + shard_names()
+        return [None]
+
+    def query(self, context):
+        """Lignes à traiter (identifiant et colonnes lues), avant pagination"""
+        query = db.session.query(self.model.id, *(getattr(self.model, column) for column in self.columns))
+        if self.where is not None:
+            query = query.filter(*self.where(context))
+        # Formulaires supprimés compris: leurs données restent lisibles jusqu'à leur effacement
+        return query.execution_options(include_deleted=True)
+
+
+def data_migration(name, model, columns, where=None, description=None):
+    """
+    Enregistrer une migration de données
+
+    La fonction décorée reçoit une ligne (identifiant et colonnes lues) et le
+    contexte de l'exécution (les options, et un dictionnaire où garder des
+    valeurs d'un lot à l'autre); elle rend un dictionnaire des colonnes à
+    écrire, ou None.
+
+    Args:
+        name (str): Nom de la migration (« flask run-data-migration NAME »)
+        model: Modèle parcouru (clé primaire id)
+        columns (list): Colonnes lues
+        where (callable): Fonction (contexte) -> liste de conditions limitant les lignes lues
+        description (str): Description affichée par « flask data-migrations »
+    """
+    def decorator(f):
+        DATA_MIGRATIONS[name] = DataMigration(name, model, columns, f, where=where,
+                                              description=description or (f.__doc__ or '').strip())
+        return f
+    return decorator
+
+
+def _claim(migration, shard, options, restart):
+    """Réclamer le point de reprise d'une base (créé au besoin) et le passer à « running »"""
+    key = shard or ''
+    if DataMigrationCheckpoint.query.filter_by(name=migration.name, shard=key).first() is None:
+        db.session.add(DataMigrationCheckpoint(name=migration.name, shard=key, status='pending', options=options or {}))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Créé au même moment par une autre exécution
+
+    stale = datetime.utcnow() - timedelta(seconds=current_app.config.get('JOB_STALE_SECONDS', 300))
+    now = datetime.utcnow()
+    values = {'status': 'running', 'message': None, 'started_at': now, 'updated_at': now, 'finished_at': None}
+    if restart:
+        values.update(last_id=0, processed=0, changed=0)
+        if options is not None:
+            values['options'] = options
+    claimed = DataMigrationCheckpoint.query.filter(
+        DataMigrationCheckpoint.name == migration.name,
+        DataMigrationCheckpoint.shard == key,
+        or_(DataMigrationCheckpoint.status != 'running', DataMigrationCheckpoint.updated_at < stale)
+    ).update(values, synchronize_session=False)
+    db.session.commit()
+    if not claimed:
+        raise DataMigrationBusyError(f"La migration {migration.name} est déjà en cours sur {shard or 'la base principale'}.")
+    return DataMigrationCheckpoint.query.filter_by(name=migration.name, shard=key).first()
+
+
+def _migrate_base(migration, checkpoint, batch_size, pause, max_batches, progress):
+    """Traiter les lots d'une base (shard courant); rend le nombre de lots traités"""
+    context = dict(checkpoint.options or {})
+    query = migration.query(context)
+    checkpoint.total = checkpoint.processed + query.filter(migration.model.id > checkpoint.last_id).order_by(None).count()
+    db.session.commit()
+
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = query.filter(migration.model.id > checkpoint.last_id).order_by(migration.model.id).limit(batch_size).all()
+        if not rows:
+            checkpoint.status = 'done'
+            checkpoint.finished_at = checkpoint.updated_at = datetime.utcnow()
+            db.session.commit()
+            return batches
+
+        changes = []
+        for row in rows:
+            values = migration.transform(row, context)
+            if values:
+                changes.append(dict(values, id=row.id))
+        if changes:
+            db.session.execute(update(migration.model), changes)
+        # Données (shard) puis point de reprise (base principale): le même ordre qu'une soumission
+        checkpoint.last_id = rows[-1].id
+        checkpoint.processed += len(rows)
+        checkpoint.changed += len(changes)
+        checkpoint.total = max(checkpoint.total, checkpoint.processed)
+        checkpoint.updated_at = datetime.utcnow()
+        db.session.commit()
+        batches += 1
+        if progress is not None:
+            progress(checkpoint)
+
+        if checkpoint.status == 'paused':  # Relu après le commit: pause_data_migration depuis un autre processus
+            return batches
+        if pause:
+            time.sleep(pause)
+
+    # Nombre de lots atteint: la prochaine exécution reprend ici
+    checkpoint.status = 'paused'
+    db.session.commit()
+    return batches
+
+
+def run_data_migration(name, options=None, restart=False, batch_size=None, pause=None, max_batches=None, progress=None):
+    """
+    Exécuter (ou reprendre) une migration de données sur chacune de ses bases
+
+    Args:
+        name (str): Nom de la migration (voir DATA_MIGRATIONS)
+        options (dict): Options d'une nouvelle exécution (une reprise garde celles de l'exécution interrompue)
+        restart (bool): Repartir du début, même si la migration est terminée (avec options, ou les précédentes)
+        batch_size (int): Lignes par transaction (DATA_MIGRATION_BATCH_SIZE par défaut)
+        pause (float): Pause entre deux lots, en secondes (DATA_MIGRATION_PAUSE par défaut)
+        max_batches (int): Nombre maximum de lots de cette exécution (la suivante reprend là où elle s'arrête)
+        progress (callable): Fonction appelée avec le point de reprise après chaque lot
+
+    Returns:
+        list: Points de reprise (DataMigrationCheckpoint), un par base
+
+    Raises:
+        ValueError: Migration inconnue
+        DataMigrationBusyError: Migration déjà en cours sur une base
+    """
+    migration = DATA_MIGRATIONS.get(name)
+    if migration is None:
+        raise ValueError(f"Migration de données inconnue: {name}")
+    batch_size = batch_size or current_app.config.get('DATA_MIGRATION_BATCH_SIZE', 500)
+    pause = current_app.config.get('DATA_MIGRATION_PAUSE', 0.05) if pause is None else pause
+
+    checkpoints = []
+    for shard in migration.bases():
+        checkpoint = _claim(migration, shard, options, restart)
+        checkpoints.append(checkpoint)
+        try:
+            with use_shard(shard):
+                batches = _migrate_base(migration, checkpoint, batch_size, pause, max_batches, progress)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Échec de la migration de données {name} ({shard or 'base principale'}): {e}")
+            checkpoint.status = 'failed'
+            checkpoint.message = str(e)[:255]
+            checkpoint.updated_at = datetime.utcnow()
+            db.session.commit()
+            raise
+        if checkpoint.status == 'paused':
+            break
+        if max_batches is not None:
+            max_batches -= batches
+    return checkpoints
+
+
+def pause_data_migration(name):
+    """
+    Demander l'arrêt d'une migration en cours (effectif à la fin du lot en cours)
+
+    Args:
+        name (str): Nom de la migration
+
+    Returns:
+        int: Nombre de bases sur lesquelles la migration était en cours
+    """
+    count = DataMigrationCheckpoint.query.filter(
+        DataMigrationCheckpoint.name == name, DataMigrationCheckpoint.status == 'running'
+    ).update({'status': 'paused'}, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def data_migration_status():
+    """
+    État des migrations enregistrées
+
+    Returns:
+        list: Par migration, son nom, sa description et ses points de reprise (to_dict)
+    """
+    checkpoints = {}
+    for checkpoint in DataMigrationCheckpoint.query.order_by(DataMigrationCheckpoint.name, DataMigrationCheckpoint.shard):
+        checkpoints.setdefault(checkpoint.name, []).append(checkpoint.to_dict())
+    return [
+        {'name': name, 'description': migration.description, 'checkpoints': checkpoints.get(name, [])}
+        for name, migration in sorted(DATA_MIGRATIONS.items())
+    ]
+
+
+# Migrations enregistrées
+
+def _ip_location_where(context):
+    conditions = [FormResponse.ip_address.isnot(None)]
+    if not context.get('force'):
+        conditions.append(FormResponse.ip_location.is_(None))
+    return conditions
+
+
+@data_migration('backfill-ip-locations', FormResponse, ['ip_address'], where=_ip_location_where)
+def backfill_ip_locations(row, context):
+    """Lieu déduit de l'adresse IP des réponses (IPGEO_DATABASE)"""
+    from app.utils.ipgeo import get_ip_locator
+    if 'locator' not in context:
+        context['locator'] = get_ip_locator(current_app)
+        if context['locator'] is None:
+            raise ValueError("IPGEO_DATABASE n'est pas configuré.")
+    place = context['locator'].locate(row.ip_address)
+    return {'ip_location': place['label']} if place is not None else None
+
+
+def _geo_columns_where(context):
+    return [] if context.get('force') else [FormResponse.geohash.is_(None)]
+
+
+@data_migration('backfill-geo-columns', FormResponse, ['form_id', 'geolocation', 'response_data'], where=_geo_columns_where)
+def backfill_geo_columns(row, context):
+    """Latitude, longitude et geohash des réponses géolocalisées"""
+    from app.utils.geo import geo_columns
+    geolocation = row.geolocation
+    if not geolocation:
+        # Anciennes réponses: position seulement dans les données du formulaire
+        fields = context.setdefault('geolocation_fields', {})  # Champs géolocalisation par formulaire
+        if row.form_id not in fields:
+            form_data = db.session.query(Form.form_data).filter(Form.id == row.form_id).execution_options(
+                include_deleted=True
+            ).scalar() or []
+            fields[row.form_id] = [f.get('id') for f in form_data if isinstance(f, dict) and f.get('type') == 'geolocation']
+        data = row.response_data or {}
+        geolocation = next((data.get(field_id) for field_id in fields[row.form_id] if data.get(field_id)), None)
+    columns = geo_columns(geolocation)
+    if columns['geohash'] is None:
+        return None
+    return dict(columns, geolocation=geolocation)
@@ -0,0 +1,196 @@
+"""
+Profils de moteur de base de données et session de lecture
+
+DATABASE_PROFILE choisit un profil nommé (ENGINE_PROFILES); par défaut il est
+déduit de SQLALCHEMY_DATABASE_URI:
+
+- « sqlite-wal »: journal WAL (les lectures ne bloquent plus l'écriture),
+  synchronous=NORMAL (durable au checkpoint, sûr en WAL), busy_timeout (les
+  écritures concurrentes attendent au lieu d'échouer avec « database is
+  locked ») et lecture par mmap;
+- « sqlite-durable »: idem avec synchronous=FULL (fsync à chaque commit);
+- « postgresql »: taille du pool de connexions, débordement, recyclage et
+  vérification des connexions avant usage;
+- « default »: réglages de SQLAlchemy.
+
+DATABASE_READONLY_URL déclare une base en lecture seule (réplique): les
+lectures lourdes (exports, page des réponses, statistiques) passent par
+read_session() et ne concurrencent plus l'ingestion sur la base principale.
+Sans réplique, read_session() est la session habituelle.
+"""
+from flask import current_app, g
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from app import db
+from app.utils.shard_routing import SHARDED_TABLES, current_shard, shard_bind_key
+
+READONLY_BIND = 'readonly'
+
+ENGINE_PROFILES = {
+    'default': {},
+    'sqlite-wal': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'busy_timeout': 5000,
+            'mmap_size': 256 * 1024 * 1024,
+            'temp_store': 'MEMORY'
+        }
+    },
+    'sqlite-durable': {
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000
+        }
+    },
+    'postgresql': {
+        'engine': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 30,
+            'pool_recycle': 1800,
+            'pool_pre_ping': True
+        }
+    }
+}
+
+
+def _profile_name(app):
+    name = app.config.get('DATABASE_PROFILE')
+    if name:
+        if name not in ENGINE_PROFILES:
+            raise ValueError(f"Profil de base de données inconnu: {name} ({', '.join(ENGINE_PROFILES)})")
+        return name
+    backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    return {'sqlite': 'sqlite-wal', 'postgresql': 'postgresql'}.get(backend, 'default')
+
+
+def _engine_options(app, profile):
+    options = dict(profile.get('engine', {}))
+    # Surcharges ponctuelles du profil
+    if options and app.config.get('DATABASE_POOL_SIZE') is not None:
+        options['pool_size'] = app.config['DATABASE_POOL_SIZE']
+    if options and app.config.get('DATABASE_MAX_OVERFLOW') is not None:
+        options['max_overflow'] = app.config['DATABASE_MAX_OVERFLOW']
+    return options
+
+
+def _pragmas(app, profile):
+    pragmas = dict(profile.get('pragmas', {}))
+    if pragmas and app.config.get('SQLITE_BUSY_TIMEOUT_MS') is not None:
+        pragmas['busy_timeout'] = app.config['SQLITE_BUSY_TIMEOUT_MS']
+    return pragmas
+
+
+def configure_engines(app):
+    """
+    Options des moteurs selon le profil (à appeler avant db.init_app)
+
+    Args:
+        app (Flask): Application
+    """
+    profile = ENGINE_PROFILES[_profile_name(app)]
+    options = _engine_options(app, profile)
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = dict(options, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+
+    readonly_url = app.config.get('DATABASE_READONLY_URL')
+    if readonly_url:
+        readonly = dict(options, url=readonly_url)
+        if make_url(readonly_url).get_backend_name() == 'postgresql':
+            # Transactions déclarées READ ONLY: une écriture égarée échoue au lieu d'atteindre la réplique
+            readonly['execution_options'] = {'postgresql_readonly': True}
+        app.config.setdefault('SQLALCHEMY_BINDS', {})[READONLY_BIND] = readonly
+
+
+def _listen_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def init_engines(app):
+    """
+    Réglages par connexion (PRAGMA SQLite) et session de lecture (à appeler après db.init_app)
+
+    Args:
+        app (Flask): Application
+    """
+    pragmas = _pragmas(app, ENGINE_PROFILES[_profile_name(app)])
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            engine_pragmas = dict(pragmas)
+            if key == READONLY_BIND:
+                engine_pragmas['query_only'] = 'ON'
+            if engine_pragmas:
+                _listen_pragmas(engine, engine_pragmas)
+
+    @app.teardown_appcontext
+    def _close_read_session(exception=None):
+        for session in g.pop('read_sessions', {}).values():
+            session.close()
+
+
+def read_session():
+    """
+    Session des lectures lourdes: réplique en lecture seule si elle est configurée
+
+    Les données peuvent y être légèrement en retard sur la base principale
+    (réplication asynchrone): à ne pas utiliser pour relire une écriture.
+
+    Returns:
+        Session: Session liée à la réplique, ou db.session sans réplique
+    """
+    engines = db.engines
+    if READONLY_BIND not in engines:
+        return db.session
+    shard = current_shard()
+    sessions = g.setdefault('read_sessions', {})
+    if shard not in sessions:
+        # Formulaire placé dans un shard (app/utils/shards.py): ses réponses sont lues dans le shard, sans réplique
+        binds = {db.metadata.tables[name]: engines[shard_bind_key(shard)] for name in SHARDED_TABLES} if shard else {}
+        sessions[shard] = Session(bind=engines[READONLY_BIND], binds=binds, autoflush=False)
+    return sessions[shard]
+
+
+def shard_connection(session=None):
+    """
+    Connexion de la transaction en cours vers la base des réponses: celle du shard courant, ou la base principale
+
+    Les agrégats des réponses (compteurs, statistiques, séries, index de
+    recherche) s'écrivent dans la même base et la même transaction que les
+    réponses: une soumission dans un shard ne touche pas la base principale.
+
+    Args:
+        session (Session): Session (db.session par défaut)
+
+    Returns:
+        Connection: Connexion SQLAlchemy
+    """
+    from app.models import FormResponse
+    return (session or db.session).connection(bind_arguments={'mapper': FormResponse})
+
+
+def upsert_insert(connection):
+    """
+    INSERT avec ON CONFLICT du dialecte de la connexion
+
+    Args:
+        connection: Connexion SQLAlchemy
+
+    Returns:
+        function: insert de PostgreSQL ou de SQLite, ou None (UPDATE puis INSERT à faire à la main)
+    """
+    if connection.dialect.name == 'postgresql':
+        return postgresql.insert
+    if connection.dialect.name == 'sqlite':
+        return sqlite.insert
+    return None
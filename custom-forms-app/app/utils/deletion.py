@@ -0,0 +1,211 @@
+"""
+Suppression des formulaires en tâche de fond
+
+Supprimer un formulaire volumineux en une requête (un DELETE de toutes ses
+réponses) verrouille la base pendant des secondes et laisse derrière lui
+fichiers, journaux et index. La suppression se fait donc en deux temps:
+
+1. dans la requête, le formulaire est marqué supprimé (Form.deleted_at) et
+   une tâche « delete_form » est créée: le formulaire disparaît aussitôt de
+   toutes les requêtes ORM (critère global ci-dessous) et des statistiques;
+2. la tâche efface ensuite, par lots de JOB_BATCH_SIZE (une transaction par
+   lot), les fichiers (disque et FormFile), les réponses et leurs données
+   liées (courriels, index des champs et de recherche), les archives, les
+   brouillons, puis les partages, zones, agrégats, et enfin le formulaire.
+
+Les lots sont idempotents: une tâche interrompue reprend là où elle en était.
+Les requêtes qui doivent voir les formulaires supprimés passent l'option
+d'exécution include_deleted=True.
+"""
+import os
+from datetime import datetime
+
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.orm import Session, with_loader_criteria
+
+from app import db
+from app.models import (EmailLog, Form, FormCounter, FormDraft, FormFile, FormResponse, FormShare, Geofence,
+                        ResponseArchive, ResponseFieldValue, SubmissionRollup)
+from app.utils.admin_stats import forget_form_responses
+from app.utils.archive import iter_archived_data, delete_form_archives
+from app.utils.clusters import invalidate_form_clusters
+from app.utils.drafts import delete_draft_files
+from app.utils.helpers import delete_file
+from app.utils.jobs import enqueue_job, job_handler
+from app.utils.search import remove_documents, remove_form_documents, search_connection
+from app.utils.shard_routing import use_shard
+from app.utils.signatures import RENDER_SIZES, SIGNATURE_EXTENSION, SIGNATURE_FOLDER, get_render_path
+
+DELETE_FORM_JOB = 'delete_form'
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _hide_deleted_forms(execute_state):
+    if (execute_state.is_select and not execute_state.is_column_load and not execute_state.is_relationship_load
+            and not execute_state.execution_options.get('include_deleted', False)):
+        execute_state.statement = execute_state.statement.options(
+            with_loader_criteria(Form, lambda cls: cls.deleted_at.is_(None), include_aliases=True)
+        )
+
+
+# Sous-dossiers d'upload: l'API enregistre fichiers et signatures comme de simples chemins ("files/<uuid>.pdf")
+UPLOAD_SUBFOLDERS = ('files', SIGNATURE_FOLDER)
+
+
+def is_upload_path(value):
+    """Valeur de réponse désignant un fichier d'un sous-dossier d'upload ("files/<uuid>.pdf")"""
+    if not isinstance(value, str) or len(value) > 255:
+        return False
+    parts = value.replace('\\', '/').split('/')
+    return len(parts) == 2 and parts[0] in UPLOAD_SUBFOLDERS and bool(parts[1]) and ' ' not in value
+
+
+def response_file_names(response_data):
+    """
+    Fichiers référencés par les données d'une réponse ou d'un brouillon
+
+    Args:
+        response_data (dict): Données de la réponse ({"filename": ...} ou chemin dans un sous-dossier d'upload)
+
+    Returns:
+        list: Chemins relatifs au dossier d'upload
+    """
+    if not isinstance(response_data, dict):
+        return []
+    names = []
+    for value in response_data.values():
+        if isinstance(value, dict):
+            if value.get('filename'):
+                names.append(value['filename'])
+        elif is_upload_path(value):
+            names.append(value)
+    return names
+
+
+def delete_upload(upload_folder, filename):
+    """
+    Supprimer un fichier reçu (et les rendus en cache d'une signature)
+
+    Args:
+        upload_folder (str): Dossier d'upload
+        filename (str): Chemin relatif au dossier d'upload
+    """
+    delete_file(os.path.join(upload_folder, filename))
+    if filename.endswith('.' + SIGNATURE_EXTENSION):
+        for size in RENDER_SIZES:
+            delete_file(get_render_path(upload_folder, filename, size))
+
+
+def schedule_form_deletion(form, user_id=None):
+    """
+    Masquer un formulaire et planifier l'effacement de ses données (validé avec la transaction de l'appelant)
+
+    Args:
+        form (Form): Formulaire
+        user_id (int): Utilisateur à l'origine de la suppression
+
+    Returns:
+        BackgroundJob: Tâche de suppression
+    """
+    # Statistiques du tableau de bord: les réponses disparaissent tout de suite (le formulaire, via l'écouteur)
+    with use_shard(form.shard):
+        forget_form_responses(form.id)
+    form.deleted_at = datetime.utcnow()
+    return enqueue_job(DELETE_FORM_JOB, form.id, user_id)
+
+
+def _count(query):
+    return query.order_by(None).count()
+
+
+@job_handler(DELETE_FORM_JOB)
+def delete_form_job(job, report):
+    """Effacer par lots un formulaire marqué supprimé et tout ce qui en dépend"""
+    form_id = job.target_id
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    batch_size = current_app.config.get('JOB_BATCH_SIZE', 500)
+    form = db.session.query(Form).filter(Form.id == form_id).execution_options(include_deleted=True).first()
+    if form is None:
+        report(0, total=0, message='Formulaire déjà supprimé.')
+        return
+    if form.deleted_at is None:
+        raise ValueError(f"Le formulaire {form_id} n'est pas marqué supprimé.")
+    # Réponses, fichiers, courriels, index et archives: dans la base du formulaire (app/utils/shards.py)
+    with use_shard(form.shard):
+        _erase_form(form_id, upload_folder, batch_size, report)
+
+
+def _erase_form(form_id, upload_folder, batch_size, report):
+    """Effacer les données d'un formulaire par lots (le shard courant est celui du formulaire)"""
+    files = FormFile.query.filter(FormFile.form_id == form_id)
+    responses = FormResponse.query.filter(FormResponse.form_id == form_id)
+    archives = ResponseArchive.query.filter(ResponseArchive.form_id == form_id)
+    drafts = FormDraft.query.filter(FormDraft.form_id == form_id)
+    total = _count(files) + _count(responses) + _count(archives) + _count(drafts)
+    done = 0
+    report(done, total=total, message='Suppression des fichiers')
+
+    while True:
+        rows = db.session.query(FormFile.id, FormFile.filename).filter(FormFile.form_id == form_id).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            delete_upload(upload_folder, row.filename)
+        FormFile.query.filter(FormFile.id.in_([row.id for row in rows])).delete(synchronize_session=False)
+        done += len(rows)
+        report(done)
+
+    report(done, message='Suppression des réponses')
+    while True:
+        rows = db.session.query(FormResponse.id, FormResponse.response_data).filter(
+            FormResponse.form_id == form_id
+        ).limit(batch_size).all()
+        if not rows:
+            break
+        ids = [row.id for row in rows]
+        for row in rows:
+            for filename in response_file_names(row.response_data):
+                delete_upload(upload_folder, filename)
+        EmailLog.query.filter(EmailLog.response_id.in_(ids)).delete(synchronize_session=False)
+        ResponseFieldValue.query.filter(ResponseFieldValue.response_id.in_(ids)).delete(synchronize_session=False)
+        remove_documents(search_connection(), ids)
+        # Suppression en masse: les statistiques ont été ajustées à la planification
+        FormResponse.query.filter(FormResponse.id.in_(ids)).delete(synchronize_session=False)
+        done += len(rows)
+        report(done)
+        # Positions supprimées sans passer par l'ORM: tuiles de la carte à recalculer (lot validé)
+        invalidate_form_clusters(form_id)
+
+    report(done, message='Suppression des archives')
+    for (archive_id,) in db.session.query(ResponseArchive.id).filter(ResponseArchive.form_id == form_id).all():
+        for data in iter_archived_data(archive_id=archive_id):
+            for filename in response_file_names(data.get('response_data')):
+                delete_upload(upload_folder, filename)
+        ResponseArchive.query.filter(ResponseArchive.id == archive_id).delete(synchronize_session=False)
+        done += 1
+        report(done)
+    delete_form_archives(form_id)
+
+    report(done, message='Suppression des brouillons')
+    while True:
+        batch = drafts.limit(batch_size).all()
+        if not batch:
+            break
+        for draft in batch:
+            delete_draft_files(draft, upload_folder)
+        FormDraft.query.filter(FormDraft.id.in_([d.id for d in batch])).delete(synchronize_session=False)
+        for draft in batch:
+            db.session.expunge(draft)
+        done += len(batch)
+        report(done)
+
+    report(done, message='Suppression du formulaire')
+    # Base des réponses d'abord (données et agrégats), puis base principale
+    for model in (EmailLog, ResponseFieldValue, SubmissionRollup, FormCounter):
+        model.query.filter(model.form_id == form_id).delete(synchronize_session=False)
+    remove_form_documents(search_connection(), form_id)
+    for model in (FormShare, Geofence):
+        model.query.filter(model.form_id == form_id).delete(synchronize_session=False)
+    Form.query.filter(Form.id == form_id).execution_options(include_deleted=True).delete(synchronize_session=False)
+    report(done)
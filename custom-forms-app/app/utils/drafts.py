@@ -0,0 +1,238 @@
+"""
+Brouillons de réponses et sauvegarde automatique différentielle
+
+Le navigateur n'envoie que les champs modifiés depuis la dernière sauvegarde
+(patch JSON de type "merge": une valeur null supprime le champ). Les pièces
+jointes sont envoyées une seule fois, dès leur sélection, et restent
+référencées par le brouillon. À la finalisation, le brouillon est promu en
+FormResponse sans renvoyer ni recopier les fichiers déjà stockés; la
+réponse passe par persist_response (app/utils/ingest.py), qui supprime le
+brouillon dans la même transaction.
+"""
+import os
+from datetime import datetime
+
+from app import db
+from app.models import FormDraft
+from app.utils.helpers import save_file, delete_file, get_file_size, get_file_extension
+from app.utils.signatures import is_stroke_data, save_signature_strokes
+
+# Taille maximale d'une valeur de brouillon (les signatures vectorielles sont les plus grosses)
+MAX_DRAFT_VALUE_LENGTH = 200000
+
+# Types dont la valeur est une pièce jointe envoyée séparément
+ATTACHMENT_TYPES = {'file'}
+
+
+class DraftConflictError(Exception):
+    """Le brouillon a été modifié depuis la version connue du client"""
+
+
+def _form_fields(form_obj):
+    return [f for f in (form_obj.form_data or []) if isinstance(f, dict)]
+
+
+def _fields_by_id(form_obj):
+    return {f.get('id'): f for f in _form_fields(form_obj)}
+
+
+def _is_attachment(value):
+    return isinstance(value, dict) and 'filename' in value
+
+
+def _store(draft, data, expected_version):
+    """
+    Enregistrer les nouvelles données si la version n'a pas changé
+
+    La mise à jour est conditionnelle (WHERE version = ...): deux onglets qui
+    sauvegardent en même temps ne peuvent pas s'écraser silencieusement.
+    """
+    updated = FormDraft.query.filter_by(id=draft.id, version=expected_version).update({
+        'draft_data': data,
+        'version': expected_version + 1,
+        'updated_at': datetime.utcnow()
+    }, synchronize_session=False)
+    if not updated:
+        db.session.rollback()
+        raise DraftConflictError("Le brouillon a été modifié entre-temps.")
+    db.session.commit()
+    db.session.refresh(draft)
+
+
+def apply_draft_patch(draft, changes, expected_version, upload_folder):
+    """
+    Appliquer un patch partiel au brouillon
+
+    Args:
+        draft (FormDraft): Brouillon à modifier
+        changes (dict): Valeurs modifiées par identifiant de champ (None pour effacer)
+        expected_version (int): Version du brouillon connue du client
+        upload_folder (str): Dossier d'upload (suppression des pièces jointes effacées)
+
+    Returns:
+        int: Nouvelle version du brouillon
+    """
+    if not isinstance(changes, dict):
+        raise ValueError("Le patch doit être un objet JSON.")
+    if not isinstance(expected_version, int):
+        raise ValueError("Version du brouillon manquante.")
+
+    fields = _fields_by_id(draft.form)
+    data = dict(draft.draft_data or {})
+    removed_files = []
+
+    for field_id, value in changes.items():
+        field = fields.get(field_id)
+        if field is None:
+            raise ValueError(f"Champ inconnu: {field_id}")
+        if field.get('type') in ATTACHMENT_TYPES:
+            # Les pièces jointes passent par l'endpoint d'upload; le patch peut seulement les retirer
+            if value is not None:
+                raise ValueError(f"Le champ {field_id} attend un fichier.")
+        elif value is not None and not isinstance(value, (str, bool, int, float)):
+            raise ValueError(f"Valeur invalide pour le champ {field_id}.")
+        elif isinstance(value, str) and len(value) > MAX_DRAFT_VALUE_LENGTH:
+            raise ValueError(f"Valeur trop longue pour le champ {field_id}.")
+
+        if value is None:
+            previous = data.pop(field_id, None)
+            if _is_attachment(previous):
+                removed_files.append(previous['filename'])
+        else:
+            data[field_id] = value
+
+    if draft.version != expected_version:
+        raise DraftConflictError("Le brouillon a été modifié entre-temps.")
+    _store(draft, data, expected_version)
+
+    for filename in removed_files:
+        delete_file(os.path.join(upload_folder, filename))
+    return draft.version
+
+
+def attach_draft_file(draft, field_id, file_storage, upload_folder):
+    """
+    Stocker une pièce jointe pour un champ du brouillon
+
+    Args:
+        draft (FormDraft): Brouillon concerné
+        field_id (str): Identifiant du champ fichier
+        file_storage (FileStorage): Fichier envoyé
+        upload_folder (str): Dossier d'upload
+
+    Returns:
+        dict: Métadonnées de la pièce jointe (format de response_data)
+    """
+    field = _fields_by_id(draft.form).get(field_id)
+    if field is None or field.get('type') not in ATTACHMENT_TYPES:
+        raise ValueError(f"Le champ {field_id} n'accepte pas de fichier.")
+
+    filename = save_file(file_storage, upload_folder)
+    attachment = {
+        'filename': filename,
+        'original_name': file_storage.filename,
+        'size': get_file_size(os.path.join(upload_folder, filename)),
+        'extension': get_file_extension(filename)
+    }
+
+    # Le fichier est déjà écrit: réessayer si une sauvegarde concurrente est passée entre-temps
+    for _ in range(3):
+        data = dict(draft.draft_data or {})
+        previous = data.get(field_id)
+        data[field_id] = attachment
+        try:
+            _store(draft, data, draft.version)
+        except DraftConflictError:
+            db.session.refresh(draft)
+            continue
+        if _is_attachment(previous):
+            delete_file(os.path.join(upload_folder, previous['filename']))
+        return attachment
+
+    delete_file(os.path.join(upload_folder, filename))
+    raise DraftConflictError("Le brouillon est modifié trop fréquemment, veuillez réessayer.")
+
+
+def draft_validation_values(draft):
+    """
+    Valeurs du brouillon au format attendu par FormValidator.validate(key='id')
+
+    Args:
+        draft (FormDraft): Brouillon
+
+    Returns:
+        dict: Valeurs par identifiant de champ
+    """
+    values = {}
+    for field_id, value in (draft.draft_data or {}).items():
+        values[field_id] = (value.get('original_name') or value['filename']) if _is_attachment(value) else value
+    return values
+
+
+def build_draft_response_data(draft, upload_folder):
+    """
+    Construire le response_data d'une réponse à partir d'un brouillon
+
+    Les pièces jointes sont reprises telles quelles; les signatures vectorielles
+    sont encodées dans leur format de stockage définitif.
+
+    Args:
+        draft (FormDraft): Brouillon validé
+        upload_folder (str): Dossier d'upload
+
+    Returns:
+        tuple: (response_data, emails additionnels)
+    """
+    data = draft.draft_data or {}
+    response_data = {}
+    additional_emails = []
+
+    for field in _form_fields(draft.form):
+        field_id = field.get('id')
+        field_type = field.get('type')
+        value = data.get(field_id)
+
+        if field_type == 'signature':
+            response_data[field_id] = save_signature_strokes(value, upload_folder) if is_stroke_data(value) else None
+        elif field_type == 'checkbox':
+            response_data[field_id] = value is True or value in ('on', 'true', '1')
+        elif field_type == 'email':
+            response_data[field_id] = value
+            if value and field.get('is_recipient_email'):
+                additional_emails.append(value)
+        else:
+            response_data[field_id] = value
+
+    return response_data, additional_emails
+
+
+def new_response_files(draft, response_data):
+    """
+    Fichiers écrits pour la réponse d'un brouillon (signatures encodées à la soumission)
+
+    Les pièces jointes, déjà enregistrées avec le brouillon, n'en font pas
+    partie: si la réponse n'est pas enregistrée, elles restent au brouillon.
+
+    Args:
+        draft (FormDraft): Brouillon promu
+        response_data (dict): Données construites par build_draft_response_data
+
+    Returns:
+        list: Chemins relatifs au dossier d'upload
+    """
+    attached = {value['filename'] for value in (draft.draft_data or {}).values() if _is_attachment(value)}
+    return [value['filename'] for value in response_data.values()
+            if _is_attachment(value) and value['filename'] not in attached]
+
+
+def delete_draft_files(draft, upload_folder):
+    """
+    Supprimer les pièces jointes d'un brouillon abandonné
+
+    Args:
+        draft (FormDraft): Brouillon
+        upload_folder (str): Dossier d'upload
+    """
+    for value in (draft.draft_data or {}).values():
+        if _is_attachment(value):
+            delete_file(os.path.join(upload_folder, value['filename']))
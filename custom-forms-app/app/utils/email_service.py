@@ -9,12 +9,13 @@ from email.mime.base import MIMEBase
 from email import encoders
 from flask import current_app, render_template, url_for
 from threading import Thread
+from contextvars import copy_context
 from datetime import datetime
-import json
 import tempfile
 
 from app import db
 from app.models import EmailLog
+from app.utils.signatures import is_vector_signature
 
 def send_email_async(app, msg, email_log_entry):
     """Fonction asynchrone pour envoyer un email"""
@@ -76,7 +77,7 @@ def send_email(recipient, subject, html_body, **kwargs):
     db.session.commit()
     
     # Envoyer l'email de manière asynchrone
-    Thread(target=send_email_async, args=(app, msg, email_log_entry)).start()
+    Thread(target=copy_context().run, args=(send_email_async, app, msg, email_log_entry)).start()
 
 
 def send_form_submission_email(form_obj, form_response, recipients):
@@ -94,7 +95,7 @@ def send_form_submission_email(form_obj, form_response, recipients):
     
     # Préparer les données de la réponse pour l'email
     response_details = []
-    response_data = json.loads(form_response.response_data) if isinstance(form_response.response_data, str) else form_response.response_data
+    response_data = form_response.response_data or {}
     
     for field in form_obj.form_data:
         field_id = field.get('id')
@@ -106,7 +107,10 @@ def send_form_submission_email(form_obj, form_response, recipients):
             file_url = url_for('static', filename=os.path.join('uploads', value['filename']), _external=True)
             response_details.append(f"<li><strong>{field_label}:</strong> <a href='{file_url}'>{value.get('original_name', value['filename'])}</a> ({value.get('size', 'N/A')} bytes)</li>")
         elif field_type == 'signature' and value and isinstance(value, dict) and 'filename' in value:
-            signature_url = url_for('static', filename=os.path.join('uploads', value['filename']), _external=True)
+            if is_vector_signature(value):
+                signature_url = url_for('api.serve_signature', filename=value['filename'], size='email', _external=True)
+            else:
+                signature_url = url_for('static', filename=os.path.join('uploads', value['filename']), _external=True)
             response_details.append(f"<li><strong>{field_label}:</strong> <img src='{signature_url}' alt='Signature' style='max-width:200px;border:1px solid #ccc;'/></li>")
         elif field_type == 'geolocation' and value:
             response_details.append(f"<li><strong>{field_label}:</strong> <a href='https://www.google.com/maps/search/?api=1&query={value}' target='_blank'>{value}</a></li>")
@@ -217,7 +221,7 @@ def send_form_submission_email(form_obj, form_response, recipients):
             db.session.commit()
             
             # Envoyer l'email de manière asynchrone
-            Thread(target=send_email_async, args=(app, msg, email_log_entry)).start()
+            Thread(target=copy_context().run, args=(send_email_async, app, msg, email_log_entry)).start()
             
         except Exception as e:
             current_app.logger.error(f"Erreur lors de l'envoi de l'email à {recipient_email}: {e}")
@@ -2,7 +2,6 @@ import openpyxl
 from openpyxl.drawing.image import Image as ExcelImage
 from openpyxl.styles import Font, PatternFill, Alignment
 from openpyxl.utils import get_column_letter
-import json
 import os
 from PIL import Image as PILImage
 import io
@@ -15,6 +14,8 @@ from reportlab.lib.units import inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image as RLImage
 from reportlab.lib.enums import TA_CENTER, TA_LEFT
 from datetime import datetime
+from app.utils.helpers import submitted_value
+from app.utils.signatures import is_vector_signature, render_signature, signature_drawing
 
 def export_to_excel(form_obj, responses, output_path):
     """
@@ -66,16 +67,16 @@ def export_to_excel(form_obj, responses, output_path):
             response.ip_address or 'N/A'
         ]
         
-        response_content = json.loads(response.response_data) if isinstance(response.response_data, str) else response.response_data
+        response_content = response.response_data or {}
         
         for field_id in field_ids:
-            field_value = response_content.get(field_id)
-            
             # Trouver le type de champ pour un traitement spécifique
             field_type = None
+            field_value = response_content.get(field_id)
             for field_def in form_obj.form_data:
                 if field_def.get('id') == field_id:
                     field_type = field_def.get('type')
+                    field_value = submitted_value(response_content, field_def)
                     break
 
             if field_type == 'file' and field_value and isinstance(field_value, dict) and 'filename' in field_value:
@@ -111,16 +112,20 @@ def export_to_excel(form_obj, responses, output_path):
                 if os.path.exists(signature_path):
                     row_data.append("Signature")
                     try:
-                        img = PILImage.open(signature_path)
                         max_width = 150
                         max_height = 100
-                        img.thumbnail((max_width, max_height), PILImage.Resampling.LANCZOS)
-                        
-                        img_byte_arr = io.BytesIO()
-                        img.save(img_byte_arr, format='PNG')
-                        img_byte_arr.seek(0)
-                        
-                        excel_img = ExcelImage(img_byte_arr)
+                        if is_vector_signature(field_value):
+                            # Rendu mis en cache à la taille de la cellule
+                            excel_img = ExcelImage(render_signature(current_app.config['UPLOAD_FOLDER'], field_value['filename'], 'excel'))
+                        else:
+                            img = PILImage.open(signature_path)
+                            img.thumbnail((max_width, max_height), PILImage.Resampling.LANCZOS)
+                            
+                            img_byte_arr = io.BytesIO()
+                            img.save(img_byte_arr, format='PNG')
+                            img_byte_arr.seek(0)
+                            
+                            excel_img = ExcelImage(img_byte_arr)
                         col_letter = get_column_letter(len(headers) - len(field_ids) + field_ids.index(field_id) + 1)
                         ws.add_image(excel_img, f'{col_letter}{row_idx}')
                         ws.row_dimensions[row_idx].height = max_height * 0.75
@@ -237,7 +242,7 @@ def export_to_pdf(form_obj, responses):
         elements.append(Spacer(1, 12))
         
         # Tableau des réponses
-        response_content = json.loads(response.response_data) if isinstance(response.response_data, str) else response.response_data
+        response_content = response.response_data or {}
         
         table_data = [['Champ', 'Réponse']]
         
@@ -245,7 +250,7 @@ def export_to_pdf(form_obj, responses):
             field_id = field.get('id')
             field_label = field.get('label', field.get('name', field_id))
             field_type = field.get('type')
-            field_value = response_content.get(field_id)
+            field_value = submitted_value(response_content, field)
             
             # Traitement selon le type de champ
             if field_type == 'file' and field_value and isinstance(field_value, dict) and 'filename' in field_value:
@@ -256,7 +261,11 @@ def export_to_pdf(form_obj, responses):
                 signature_path = os.path.join(current_app.config['UPLOAD_FOLDER'], field_value['filename'])
                 if os.path.exists(signature_path):
                     try:
-                        img = RLImage(signature_path, width=2*inch, height=1*inch)
+                        if is_vector_signature(field_value):
+                            # Dessin vectoriel: la signature reste nette à toute échelle
+                            img = signature_drawing(current_app.config['UPLOAD_FOLDER'], field_value['filename'], 2*inch, 1*inch)
+                        else:
+                            img = RLImage(signature_path, width=2*inch, height=1*inch)
                         table_data.append([field_label, img])
                         continue
                     except:
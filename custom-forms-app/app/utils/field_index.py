@@ -0,0 +1,217 @@
+"""
+Champs indexés des réponses
+
+Le créateur peut marquer un champ comme « indexé » dans le constructeur
+(propriété ``indexed`` du champ dans form_data). Chaque valeur de ces champs
+est alors recopiée dans la table response_field_values, indexée sur
+(form_id, field_id, value): filtrer les réponses sur une valeur ("code du
+site = X") devient un parcours d'index au lieu d'un chargement de toutes les
+réponses pour tester response_data en Python.
+
+La table est tenue à jour à l'enregistrement de chaque réponse (avant le
+flush, quel que soit le chemin d'écriture) et quand la liste des champs
+indexés d'un formulaire change (sync_field_index).
+"""
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import Form, FormResponse, ResponseFieldValue
+from app.utils.helpers import field_names, response_value
+
+# Types dont la valeur n'est pas un texte comparable (fichier, image de signature)
+NON_INDEXABLE_TYPES = ('file', 'signature')
+MAX_VALUE_LENGTH = 255
+FILTER_PREFIX = 'field.'
+
+
+def indexed_field_ids(form_data):
+    """
+    Identifiants des champs indexés d'un formulaire
+
+    Args:
+        form_data (list): Structure des champs du formulaire
+
+    Returns:
+        list: Identifiants des champs marqués « indexé »
+    """
+    return [f['id'] for f in (form_data or [])
+            if isinstance(f, dict) and f.get('indexed') and f.get('id') and f.get('type') not in NON_INDEXABLE_TYPES]
+
+
+def _normalize(value):
+    """Valeurs indexées d'une réponse à un champ (une par élément pour une liste)"""
+    if value is None or isinstance(value, dict):
+        return []
+    values = value if isinstance(value, list) else [value]
+    normalized = []
+    for item in values:
+        if item is None or isinstance(item, (dict, list)):
+            continue
+        if isinstance(item, bool):
+            item = 'true' if item else 'false'
+        item = str(item).strip()
+        if item:
+            normalized.append(item[:MAX_VALUE_LENGTH])
+    return normalized
+
+
+def field_values(field_ids, response_data, names=None):
+    """
+    Valeurs à indexer d'une réponse
+
+    Args:
+        field_ids (list): Identifiants des champs indexés
+        response_data (dict): Données de la réponse
+        names (dict): Nom par identifiant (voir field_names): valeurs des réponses de l'API, enregistrées par nom
+
+    Returns:
+        list: Tuples (field_id, valeur)
+    """
+    if not isinstance(response_data, dict):
+        return []
+    names = names or {}
+    return [(field_id, value) for field_id in field_ids
+            for value in _normalize(response_value(response_data, field_id, names))]
+
+
+@event.listens_for(Session, 'before_flush')
+def _index_new_responses(session, flush_context, instances):
+    fields = {}  # Champs indexés et noms des champs par formulaire, pour ce flush
+    for obj in list(session.new):
+        if not isinstance(obj, FormResponse) or obj.form_id is None:
+            continue
+        if obj.form_id not in fields:
+            form_data = session.execute(select(Form.form_data).where(Form.id == obj.form_id)).scalar()
+            fields[obj.form_id] = (indexed_field_ids(form_data), field_names(form_data))
+        field_ids, names = fields[obj.form_id]
+        for field_id, value in field_values(field_ids, obj.response_data, names):
+            session.add(ResponseFieldValue(response=obj, form_id=obj.form_id, field_id=field_id, value=value))
+
+
+def sync_field_index(form_obj, previous_ids, batch_size=1000):
+    """
+    Mettre la table d'index à jour après un changement des champs indexés
+
+    Les valeurs des champs qui ne sont plus indexés sont supprimées; celles des
+    champs nouvellement indexés sont calculées pour les réponses existantes,
+    par lots (une transaction par lot).
+
+    Args:
+        form_obj (Form): Formulaire dont form_data vient d'être enregistré
+        previous_ids (list): Champs indexés avant la modification
+        batch_size (int): Nombre de réponses traitées par transaction
+
+    Returns:
+        int: Nombre de valeurs ajoutées
+    """
+    current_ids = indexed_field_ids(form_obj.form_data)
+    removed = [field_id for field_id in previous_ids if field_id not in current_ids]
+    added = [field_id for field_id in current_ids if field_id not in previous_ids]
+
+    if removed:
+        ResponseFieldValue.query.filter(
+            ResponseFieldValue.form_id == form_obj.id,
+            ResponseFieldValue.field_id.in_(removed)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    if not added:
+        return 0
+    return reindex_responses(form_obj.id, added, batch_size=batch_size)
+
+
+def reindex_responses(form_id, field_ids, batch_size=1000):
+    """
+    Recalculer les valeurs indexées de champs pour les réponses d'un formulaire
+
+    Les valeurs sont remplacées lot par lot (suppression et insertion des
+    mêmes réponses dans une transaction): pendant le recalcul, chaque réponse
+    garde ses valeurs jusqu'au lot qui les remplace, les filtres sur champs
+    ne perdent aucun résultat.
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        field_ids (list): Champs à recalculer
+        batch_size (int): Nombre de réponses traitées par transaction
+
+    Returns:
+        int: Nombre de valeurs ajoutées
+    """
+    names = field_names(db.session.query(Form.form_data).filter(Form.id == form_id).execution_options(
+        include_deleted=True
+    ).scalar())
+    query = db.session.query(FormResponse.id, FormResponse.response_data).filter(FormResponse.form_id == form_id)
+    last_id, count = 0, 0
+    while True:
+        # Pagination par identifiant: chaque lot est une requête indexée
+        rows = query.filter(FormResponse.id > last_id).order_by(FormResponse.id).limit(batch_size).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        ResponseFieldValue.query.filter(
+            ResponseFieldValue.response_id.in_([row.id for row in rows]),
+            ResponseFieldValue.field_id.in_(field_ids)
+        ).delete(synchronize_session=False)
+        mappings = [dict(response_id=row.id, form_id=form_id, field_id=field_id, value=value)
+                    for row in rows for field_id, value in field_values(field_ids, row.response_data, names)]
+        if mappings:
+            db.session.bulk_insert_mappings(ResponseFieldValue, mappings)
+        db.session.commit()
+        count += len(mappings)
+    db.session.commit()
+    return count
+
+
+def parse_field_filters(form_obj, args):
+    """
+    Extraire les filtres sur champs indexés des paramètres d'une requête
+
+    Un filtre s'écrit ``field.<identifiant ou nom du champ>=<valeur>``.
+
+    Args:
+        form_obj (Form): Formulaire concerné
+        args (MultiDict): Paramètres de la requête
+
+    Returns:
+        list: Tuples (field_id, valeur)
+
+    Raises:
+        ValueError: Champ inconnu ou non indexé
+    """
+    indexed = indexed_field_ids(form_obj.form_data)
+    by_name = {f.get('name'): f['id'] for f in (form_obj.form_data or [])
+               if isinstance(f, dict) and f.get('id') in indexed and f.get('name')}
+
+    filters = []
+    for key, value in args.items(multi=True):
+        if not key.startswith(FILTER_PREFIX) or value == '':
+            continue
+        name = key[len(FILTER_PREFIX):]
+        field_id = name if name in indexed else by_name.get(name)
+        if field_id is None:
+            raise ValueError(f"Le champ « {name} » n'existe pas ou n'est pas indexé.")
+        filters.append((field_id, value.strip()[:MAX_VALUE_LENGTH]))
+    return filters
+
+
+def field_filter_conditions(form_id, filters):
+    """
+    Conditions SQL sélectionnant les réponses qui ont les valeurs demandées
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        filters (list): Tuples (field_id, valeur), tous requis
+
+    Returns:
+        list: Conditions à passer à Query.filter
+    """
+    return [
+        FormResponse.id.in_(
+            select(ResponseFieldValue.response_id).where(
+                ResponseFieldValue.form_id == form_id,
+                ResponseFieldValue.field_id == field_id,
+                ResponseFieldValue.value == value
+            )
+        )
+        for field_id, value in filters
+    ]
@@ -0,0 +1,228 @@
+"""
+Fonctions géographiques de base (coordonnées, distances)
+"""
+import math
+
+# Rayon moyen de la Terre en mètres
+EARTH_RADIUS_M = 6371008.8
+
+
+def parse_latlon(value):
+    """
+    Décoder une valeur de champ géolocalisation
+
+    Args:
+        value (str): Coordonnées au format "lat,lon"
+
+    Returns:
+        tuple: (latitude, longitude) en degrés, ou None si la valeur est absente ou invalide
+    """
+    if not value or not isinstance(value, str) or ',' not in value:
+        return None
+    try:
+        lat, lon = (float(part) for part in value.split(',', 1))
+    except ValueError:
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return lat, lon
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Distance orthodromique entre deux points
+
+    Args:
+        lat1, lon1 (float): Premier point en degrés
+        lat2, lon2 (float): Second point en degrés
+
+    Returns:
+        float: Distance en mètres
+    """
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+# Alphabet base 32 des geohash (sans a, i, l, o)
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+_GEOHASH_INDEX = {c: i for i, c in enumerate(GEOHASH_ALPHABET)}
+GEOHASH_PRECISION = 12
+
+
+def geohash_encode(lat, lon, precision=GEOHASH_PRECISION):
+    """
+    Encoder une position en geohash
+
+    Deux positions proches partagent en général un long préfixe commun, ce
+    qui permet de les retrouver par des requêtes d'intervalle sur un index.
+
+    Args:
+        lat (float): Latitude en degrés
+        lon (float): Longitude en degrés
+        precision (int): Nombre de caractères (12 ≈ 4 cm)
+
+    Returns:
+        str: Geohash
+    """
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    chars = []
+    bits, value, even = 0, 0, True
+    while len(chars) < precision:
+        # Les bits alternent longitude / latitude, en commençant par la longitude
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                value = (value << 1) | 1
+                lon_lo = mid
+            else:
+                value <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                value = (value << 1) | 1
+                lat_lo = mid
+            else:
+                value <<= 1
+                lat_hi = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits, value = 0, 0
+    return ''.join(chars)
+
+
+def geohash_cell_size(precision):
+    """
+    Dimensions d'une cellule geohash
+
+    Args:
+        precision (int): Nombre de caractères
+
+    Returns:
+        tuple: (hauteur en degrés de latitude, largeur en degrés de longitude)
+    """
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def _geohash_successor(prefix):
+    """Plus petit geohash de même longueur qui suit ``prefix`` (None après "zzz...")"""
+    chars = list(prefix)
+    for i in range(len(chars) - 1, -1, -1):
+        index = _GEOHASH_INDEX[chars[i]]
+        if index < len(GEOHASH_ALPHABET) - 1:
+            chars[i] = GEOHASH_ALPHABET[index + 1]
+            return ''.join(chars[:i + 1]) + GEOHASH_ALPHABET[0] * (len(chars) - i - 1)
+    return None
+
+
+def geohash_ranges(min_lat, min_lon, max_lat, max_lon, max_cells=32):
+    """
+    Intervalles de geohash couvrant un rectangle
+
+    La précision est la plus fine pour laquelle le rectangle tient dans au
+    plus ``max_cells`` cellules; les cellules consécutives dans l'ordre des
+    geohash sont fusionnées en un seul intervalle.
+
+    Args:
+        min_lat, min_lon, max_lat, max_lon (float): Rectangle en degrés (min_lon <= max_lon)
+        max_cells (int): Nombre maximal de cellules
+
+    Returns:
+        list: Intervalles (début inclus, fin exclue ou None pour "jusqu'à la fin")
+    """
+    precision = 1
+    for candidate in range(GEOHASH_PRECISION, 0, -1):
+        height, width = geohash_cell_size(candidate)
+        rows = math.floor((max_lat + 90.0) / height) - math.floor((min_lat + 90.0) / height) + 1
+        cols = math.floor((max_lon + 180.0) / width) - math.floor((min_lon + 180.0) / width) + 1
+        if rows * cols <= max_cells:
+            precision = candidate
+            break
+
+    height, width = geohash_cell_size(precision)
+    first_row = math.floor((min_lat + 90.0) / height)
+    last_row = min(math.floor((max_lat + 90.0) / height), round(180.0 / height) - 1)
+    first_col = math.floor((min_lon + 180.0) / width)
+    last_col = min(math.floor((max_lon + 180.0) / width), round(360.0 / width) - 1)
+
+    cells = sorted({
+        geohash_encode((row + 0.5) * height - 90.0, (col + 0.5) * width - 180.0, precision)
+        for row in range(first_row, last_row + 1)
+        for col in range(first_col, last_col + 1)
+    })
+
+    ranges = []
+    for cell in cells:
+        end = _geohash_successor(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1][1] = end
+        else:
+            ranges.append([cell, end])
+    return [tuple(r) for r in ranges]
+
+
+def bbox_around(lat, lon, radius_m):
+    """
+    Rectangle englobant un cercle
+
+    Args:
+        lat, lon (float): Centre en degrés
+        radius_m (float): Rayon en mètres
+
+    Returns:
+        list: Rectangles (min_lat, min_lon, max_lat, max_lon); deux si le cercle traverse l'antiméridien
+    """
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    min_lat, max_lat = lat - dlat, lat + dlat
+    if min_lat <= -90.0 or max_lat >= 90.0:
+        # Le cercle contient un pôle: toutes les longitudes
+        return [(max(min_lat, -90.0), -180.0, min(max_lat, 90.0), 180.0)]
+    dlon = math.degrees(math.asin(min(1.0, math.sin(radius_m / EARTH_RADIUS_M) / math.cos(math.radians(lat)))))
+    return split_bbox(min_lat, lon - dlon, max_lat, lon + dlon)
+
+
+def split_bbox(min_lat, min_lon, max_lat, max_lon):
+    """
+    Normaliser un rectangle qui peut traverser l'antiméridien
+
+    Args:
+        min_lat, min_lon, max_lat, max_lon (float): Rectangle en degrés; min_lon > max_lon
+            (ou des longitudes hors de [-180, 180]) indique un passage par l'antiméridien
+
+    Returns:
+        list: Un ou deux rectangles (min_lat, min_lon, max_lat, max_lon) avec min_lon <= max_lon
+    """
+    if max_lon - min_lon >= 360.0:
+        return [(min_lat, -180.0, max_lat, 180.0)]
+    if min_lon < -180.0:
+        min_lon += 360.0
+    if max_lon > 180.0:
+        max_lon -= 360.0
+    if min_lon <= max_lon:
+        return [(min_lat, min_lon, max_lat, max_lon)]
+    return [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+
+
+def geo_columns(geolocation):
+    """
+    Colonnes typées d'une réponse à partir de sa géolocalisation
+
+    Args:
+        geolocation (str): Coordonnées au format "lat,lon"
+
+    Returns:
+        dict: latitude, longitude et geohash (None si la valeur est invalide)
+    """
+    coords = parse_latlon(geolocation)
+    if coords is None:
+        return {'latitude': None, 'longitude': None, 'geohash': None}
+    return {'latitude': coords[0], 'longitude': coords[1], 'geohash': geohash_encode(*coords)}
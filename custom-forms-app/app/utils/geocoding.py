@@ -0,0 +1,294 @@
+"""
+Géocodage inverse hors ligne à partir d'un fichier de référence local
+
+Le fichier (GEOCODER_GAZETTEER) est chargé une fois par processus dans un
+k-d tree. Une recherche descend l'arbre jusqu'au point le plus proche (dans
+la limite de GEOCODER_MAX_DISTANCE_M), puis le résultat est gardé dans un
+cache LRU (positions arrondies à ~1 m).
+
+Formats reconnus (éventuellement compressés en .gz):
+- GeoNames (``FR.txt``, ``cities500.txt``...): TSV sans en-tête;
+- BAN (``adresses-XX.csv``): CSV séparé par des ';' avec en-tête.
+
+Aucun appel réseau n'est effectué.
+"""
+import os
+import csv
+import gzip
+import math
+import time
+from array import array
+from functools import lru_cache
+from threading import Lock
+
+from flask import current_app
+
+from app.utils.geo import EARTH_RADIUS_M, haversine_m, parse_latlon
+
+# Colonnes du format GeoNames (http://download.geonames.org/export/dump/readme.txt)
+_GEONAMES_NAME, _GEONAMES_LAT, _GEONAMES_LON = 1, 4, 5
+_GEONAMES_FEATURE_CLASS, _GEONAMES_COUNTRY = 6, 8
+# Classe GeoNames retenue: lieux habités (villes, villages, lieux-dits)
+_GEONAMES_CLASSES = {'P'}
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _read_geonames(path):
+    with _open_text(path) as f:
+        for row in csv.reader(f, delimiter='\t', quoting=csv.QUOTE_NONE):
+            if len(row) <= _GEONAMES_COUNTRY or row[_GEONAMES_FEATURE_CLASS] not in _GEONAMES_CLASSES:
+                continue
+            yield float(row[_GEONAMES_LAT]), float(row[_GEONAMES_LON]), {
+                'label': f"{row[_GEONAMES_NAME]}, {row[_GEONAMES_COUNTRY]}",
+                'city': row[_GEONAMES_NAME],
+                'postcode': None,
+                'country': row[_GEONAMES_COUNTRY]
+            }
+
+
+def _read_ban(path):
+    with _open_text(path) as f:
+        for row in csv.DictReader(f, delimiter=';'):
+            try:
+                lat, lon = float(row['lat']), float(row['lon'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            street = ' '.join(p for p in (row.get('numero'), row.get('rep'), row.get('nom_voie')) if p)
+            city = row.get('nom_commune') or ''
+            postcode = row.get('code_postal') or None
+            yield lat, lon, {
+                'label': ', '.join(p for p in (street, ' '.join(q for q in (postcode, city) if q)) if p),
+                'city': city,
+                'postcode': postcode,
+                'country': 'FR'
+            }
+
+
+def _detect_reader(path):
+    """Choisir le lecteur selon l'en-tête du fichier"""
+    with _open_text(path) as f:
+        first_line = f.readline()
+    if ';' in first_line and 'lat' in first_line.split(';'):
+        return _read_ban
+    return _read_geonames
+
+
+class ReverseGeocoder:
+    """
+    Index k-d tree des points d'un fichier de référence
+
+    Les points sont projetés sur la sphère unité (x, y, z): la distance
+    euclidienne (corde) y croît avec la distance orthodromique, ce qui donne
+    le plus proche voisin exact, sans déformation près des pôles ni de
+    l'antiméridien. L'arbre est implicite: les tableaux sont réordonnés de
+    sorte que chaque nœud soit le milieu de son intervalle.
+    """
+
+    def __init__(self, max_distance_m=5000, cache_size=65536):
+        self.max_distance_m = max_distance_m
+        self.lats = array('d')
+        self.lons = array('d')
+        self.places = []
+        self._coords = (array('d'), array('d'), array('d'))
+        self._axes = array('b')
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    @staticmethod
+    def _unit_vector(lat, lon):
+        phi = math.radians(lat)
+        lam = math.radians(lon)
+        cos_phi = math.cos(phi)
+        return cos_phi * math.cos(lam), cos_phi * math.sin(lam), math.sin(phi)
+
+    def load(self, path):
+        """
+        Charger un fichier de référence et construire l'index
+
+        Args:
+            path (str): Chemin du fichier GeoNames ou BAN
+
+        Returns:
+            int: Nombre de points chargés
+        """
+        lats, lons, places = array('d'), array('d'), []
+        for lat, lon, place in _detect_reader(path)(path):
+            lats.append(lat)
+            lons.append(lon)
+            places.append(place)
+        self._build(lats, lons, places)
+        self.lookup.cache_clear()
+        return len(places)
+
+    def _build(self, lats, lons, places):
+        n = len(places)
+        coords = (array('d'), array('d'), array('d'))
+        for lat, lon in zip(lats, lons):
+            for axis, value in enumerate(self._unit_vector(lat, lon)):
+                coords[axis].append(value)
+
+        # Découpage sur l'axe de plus grande étendue, milieu de l'intervalle comme nœud
+        order = list(range(n))
+        axes = array('b', bytes(n))
+        stack = [(0, n)]
+        while stack:
+            lo, hi = stack.pop()
+            if hi - lo <= 1:
+                continue
+            segment = order[lo:hi]
+            # Étendue estimée sur un échantillon: suffisant pour choisir l'axe
+            sample = segment[::max(1, len(segment) // 256)]
+            spreads = []
+            for values in coords:
+                picked = [values[i] for i in sample]
+                spreads.append(max(picked) - min(picked))
+            axis = spreads.index(max(spreads))
+            segment.sort(key=coords[axis].__getitem__)
+            order[lo:hi] = segment
+            mid = (lo + hi) // 2
+            axes[mid] = axis
+            stack.append((lo, mid))
+            stack.append((mid + 1, hi))
+
+        self.lats = array('d', (lats[i] for i in order))
+        self.lons = array('d', (lons[i] for i in order))
+        self.places = [places[i] for i in order]
+        self._coords = tuple(array('d', (values[i] for i in order)) for values in coords)
+        self._axes = axes
+
+    def _lookup(self, lat, lon):
+        n = len(self.places)
+        if not n:
+            return None
+
+        query = self._unit_vector(lat, lon)
+        qx, qy, qz = query
+        coords = self._coords
+        xs, ys, zs = coords
+        axes = self._axes
+
+        # Borne initiale: corde correspondant à la distance maximale acceptée
+        chord = 2 * math.sin(min(self.max_distance_m / (2 * EARTH_RADIUS_M), math.pi / 2))
+        best_d2 = chord * chord
+        best = -1
+
+        # Pile de sous-arbres (début, fin, distance minimale² au plan de coupe)
+        stack = [(0, n, 0.0)]
+        while stack:
+            lo, hi, bound = stack.pop()
+            if bound >= best_d2:
+                continue
+            mid = (lo + hi) // 2
+            dx = xs[mid] - qx
+            dy = ys[mid] - qy
+            dz = zs[mid] - qz
+            d2 = dx * dx + dy * dy + dz * dz
+            if d2 < best_d2:
+                best_d2, best = d2, mid
+
+            axis = axes[mid]
+            diff = query[axis] - coords[axis][mid]
+            if diff < 0:
+                near_lo, near_hi, far_lo, far_hi = lo, mid, mid + 1, hi
+            else:
+                near_lo, near_hi, far_lo, far_hi = mid + 1, hi, lo, mid
+            # Le sous-arbre lointain n'est parcouru que s'il peut contenir un point plus proche
+            if far_lo < far_hi:
+                stack.append((far_lo, far_hi, diff * diff))
+            if near_lo < near_hi:
+                stack.append((near_lo, near_hi, 0.0))
+
+        if best < 0:
+            return None
+        distance = haversine_m(lat, lon, self.lats[best], self.lons[best])
+        return dict(self.places[best], distance_m=round(distance, 1))
+
+    def reverse(self, lat, lon):
+        """
+        Trouver le lieu connu le plus proche d'une position
+
+        Args:
+            lat (float): Latitude en degrés
+            lon (float): Longitude en degrés
+
+        Returns:
+            dict: Lieu (label, city, postcode, country, distance_m), ou None si rien à proximité
+        """
+        # Arrondi à 5 décimales (~1 m) pour que le cache serve les positions voisines
+        return self.lookup(round(lat, 5), round(lon, 5))
+
+
+_geocoders = {}
+_geocoders_lock = Lock()
+
+
+def get_reverse_geocoder(app=None):
+    """
+    Obtenir le géocodeur de l'application (chargé au premier appel)
+
+    Args:
+        app: Application Flask (par défaut l'application courante)
+
+    Returns:
+        ReverseGeocoder: Géocodeur, ou None si aucun fichier de référence n'est configuré
+    """
+    app = app or current_app._get_current_object()
+    path = app.config.get('GEOCODER_GAZETTEER')
+    if not path:
+        return None
+
+    key = id(app)
+    if key not in _geocoders:
+        with _geocoders_lock:
+            if key not in _geocoders:
+                geocoder = None
+                if os.path.exists(path):
+                    geocoder = ReverseGeocoder(
+                        max_distance_m=app.config.get('GEOCODER_MAX_DISTANCE_M', 5000),
+                        cache_size=app.config.get('GEOCODER_CACHE_SIZE', 65536)
+                    )
+                    start = time.perf_counter()
+                    count = geocoder.load(path)
+                    app.logger.info(f"Géocodeur: {count} points chargés depuis {path} en {time.perf_counter() - start:.1f}s")
+                else:
+                    app.logger.warning(f"Fichier de référence du géocodeur introuvable: {path}")
+                _geocoders[key] = geocoder
+    return _geocoders[key]
+
+
+def reverse_geocode(lat, lon):
+    """
+    Géocodage inverse d'une position avec le géocodeur de l'application
+
+    Args:
+        lat (float): Latitude en degrés
+        lon (float): Longitude en degrés
+
+    Returns:
+        dict: Lieu le plus proche, ou None
+    """
+    geocoder = get_reverse_geocoder()
+    if geocoder is None:
+        return None
+    return geocoder.reverse(lat, lon)
+
+
+def address_for(geolocation):
+    """
+    Adresse correspondant à une valeur de champ géolocalisation
+
+    Args:
+        geolocation (str): Coordonnées au format "lat,lon"
+
+    Returns:
+        str: Adresse lisible, ou None si inconnue
+    """
+    coords = parse_latlon(geolocation)
+    if coords is None:
+        return None
+    place = reverse_geocode(*coords)
+    return place['label'] if place else None
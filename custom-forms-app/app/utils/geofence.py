@@ -0,0 +1,272 @@
+"""
+Zones autorisées (geofences) des formulaires
+
+Chaque formulaire peut porter un ensemble de polygones (sites
+d'intervention) importés depuis un fichier GeoJSON. Selon
+Form.geofence_mode, une soumission dont la position n'est dans aucun
+polygone est signalée ('flag') ou refusée ('reject').
+
+Pour rester rapide avec des milliers de sites, les polygones d'un formulaire
+sont chargés une fois par processus dans un index en grille: chaque cellule
+liste les polygones dont le rectangle englobant la recoupe. Une recherche ne
+teste donc que quelques rectangles, puis le point dans le polygone (avec
+trous) pour les seuls candidats. L'index est reconstruit quand
+Form.geofences_updated_at change.
+"""
+import math
+from datetime import datetime
+from statistics import median
+from threading import Lock
+
+from app import db
+from app.models import Geofence
+from app.utils.geo import parse_latlon
+
+GEOFENCE_MODES = ('off', 'flag', 'reject')
+GEOFENCE_REJECT_MESSAGE = "La position de la soumission n'est dans aucune zone autorisée pour ce formulaire."
+
+# Au-delà, un polygone est rangé dans la liste des « grands » polygones plutôt que dans chaque cellule
+_MAX_CELLS_PER_POLYGON = 1024
+
+
+def _validate_ring(ring):
+    if not isinstance(ring, list) or len(ring) < 4:
+        raise ValueError("Un anneau de polygone doit contenir au moins 4 positions.")
+    points = []
+    for position in ring:
+        if not isinstance(position, (list, tuple)) or len(position) < 2:
+            raise ValueError("Position GeoJSON invalide.")
+        lon, lat = float(position[0]), float(position[1])
+        if not (-180.0 <= lon <= 180.0 and -90.0 <= lat <= 90.0):
+            raise ValueError(f"Position hors limites: {lon}, {lat}")
+        points.append([lon, lat])
+    return points
+
+
+def _polygons_of(geometry):
+    """Polygones (listes d'anneaux [lon, lat]) d'une géométrie GeoJSON"""
+    if not isinstance(geometry, dict):
+        raise ValueError("Géométrie GeoJSON invalide.")
+    kind = geometry.get('type')
+    if kind == 'Polygon':
+        polygons = [geometry.get('coordinates')]
+    elif kind == 'MultiPolygon':
+        polygons = geometry.get('coordinates')
+    elif kind == 'GeometryCollection':
+        return [p for g in geometry.get('geometries') or [] for p in _polygons_of(g)]
+    else:
+        raise ValueError(f"Type de géométrie non pris en charge: {kind}")
+    if not isinstance(polygons, list):
+        raise ValueError("Coordonnées GeoJSON invalides.")
+    return [[_validate_ring(ring) for ring in polygon] for polygon in polygons if polygon]
+
+
+def parse_geojson(data):
+    """
+    Extraire les zones d'un document GeoJSON
+
+    Args:
+        data (dict): FeatureCollection, Feature ou géométrie (Polygon, MultiPolygon)
+
+    Returns:
+        list: Tuples (nom, polygones); le nom vient de la propriété "name" ou "nom"
+    """
+    if not isinstance(data, dict):
+        raise ValueError("Le fichier n'est pas un document GeoJSON.")
+    if data.get('type') == 'FeatureCollection':
+        features = data.get('features') or []
+    elif data.get('type') == 'Feature':
+        features = [data]
+    else:
+        features = [{'type': 'Feature', 'geometry': data, 'properties': {}}]
+
+    zones = []
+    for index, feature in enumerate(features, start=1):
+        if not isinstance(feature, dict):
+            raise ValueError("Entité GeoJSON invalide.")
+        properties = feature.get('properties') or {}
+        name = properties.get('name') or properties.get('nom') or f"Zone {index}"
+        polygons = _polygons_of(feature.get('geometry'))
+        if polygons:
+            zones.append((str(name)[:255], polygons))
+    return zones
+
+
+def _bounds(polygons):
+    lons = [p[0] for polygon in polygons for p in polygon[0]]
+    lats = [p[1] for polygon in polygons for p in polygon[0]]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def import_geofences(form, data, replace=False):
+    """
+    Importer les zones d'un document GeoJSON pour un formulaire
+
+    Args:
+        form (Form): Formulaire concerné
+        data (dict): Document GeoJSON
+        replace (bool): Supprimer d'abord les zones existantes
+
+    Returns:
+        int: Nombre de zones importées
+    """
+    zones = parse_geojson(data)
+    if replace:
+        Geofence.query.filter_by(form_id=form.id).delete(synchronize_session=False)
+    for name, polygons in zones:
+        min_lat, min_lon, max_lat, max_lon = _bounds(polygons)
+        db.session.add(Geofence(form_id=form.id, name=name, geometry=polygons,
+                                min_lat=min_lat, min_lon=min_lon, max_lat=max_lat, max_lon=max_lon))
+    form.geofences_updated_at = datetime.utcnow()
+    db.session.commit()
+    return len(zones)
+
+
+def clear_geofences(form):
+    """
+    Supprimer toutes les zones d'un formulaire
+
+    Args:
+        form (Form): Formulaire concerné
+    """
+    Geofence.query.filter_by(form_id=form.id).delete(synchronize_session=False)
+    form.geofences_updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _in_ring(lon, lat, ring):
+    """Test pair-impair (lancer de rayon) d'un point dans un anneau"""
+    inside = False
+    j = len(ring) - 1
+    for i in range(len(ring)):
+        xi, yi = ring[i]
+        xj, yj = ring[j]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def point_in_polygons(lon, lat, polygons):
+    """
+    Tester si un point est dans l'un des polygones (trous exclus)
+
+    Args:
+        lon, lat (float): Position en degrés
+        polygons (list): Polygones GeoJSON (anneau extérieur puis trous)
+
+    Returns:
+        bool: True si le point est à l'intérieur
+    """
+    for polygon in polygons:
+        if _in_ring(lon, lat, polygon[0]) and not any(_in_ring(lon, lat, hole) for hole in polygon[1:]):
+            return True
+    return False
+
+
+class GeofenceIndex:
+    """Index en grille des zones d'un formulaire"""
+
+    def __init__(self, zones, cell_deg=None):
+        # zones: tuples (nom, polygones, (min_lat, min_lon, max_lat, max_lon))
+        self.zones = zones
+        if cell_deg is None:
+            # Cellule de la taille d'un site typique: peu de candidats par cellule
+            sizes = [max(b[2] - b[0], b[3] - b[1]) for _, _, b in zones]
+            cell_deg = max(median(sizes), 1e-4) if sizes else 1.0
+        self.cell_deg = cell_deg
+        self.cells = {}
+        self.large = []
+
+        for index, (_, _, (min_lat, min_lon, max_lat, max_lon)) in enumerate(zones):
+            rows = range(self._cell(min_lat), self._cell(max_lat) + 1)
+            cols = range(self._cell(min_lon), self._cell(max_lon) + 1)
+            if len(rows) * len(cols) > _MAX_CELLS_PER_POLYGON:
+                self.large.append(index)
+                continue
+            for row in rows:
+                for col in cols:
+                    self.cells.setdefault((row, col), []).append(index)
+
+    def _cell(self, value):
+        return math.floor(value / self.cell_deg)
+
+    def locate(self, lat, lon):
+        """
+        Trouver la zone qui contient une position
+
+        Args:
+            lat, lon (float): Position en degrés
+
+        Returns:
+            str: Nom de la zone, ou None si la position n'est dans aucune zone
+        """
+        candidates = self.cells.get((self._cell(lat), self._cell(lon)), [])
+        for index in (self.large + candidates) if self.large else candidates:
+            name, polygons, (min_lat, min_lon, max_lat, max_lon) = self.zones[index]
+            if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon and point_in_polygons(lon, lat, polygons):
+                return name
+        return None
+
+
+_indexes = {}
+_indexes_lock = Lock()
+
+
+def get_geofence_index(form):
+    """
+    Obtenir l'index des zones d'un formulaire (reconstruit si les zones ont changé)
+
+    Args:
+        form (Form): Formulaire concerné
+
+    Returns:
+        GeofenceIndex: Index des zones
+    """
+    stamp = form.geofences_updated_at
+    cached = _indexes.get(form.id)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    rows = db.session.query(
+        Geofence.name, Geofence.geometry, Geofence.min_lat, Geofence.min_lon, Geofence.max_lat, Geofence.max_lon
+    ).filter(Geofence.form_id == form.id).all()
+    index = GeofenceIndex([(row[0], row[1], tuple(row[2:])) for row in rows])
+    with _indexes_lock:
+        _indexes[form.id] = (stamp, index)
+    return index
+
+
+def check_geofence(form, geolocation):
+    """
+    Situer une soumission par rapport aux zones du formulaire
+
+    Une position absente ou invalide est considérée hors zone.
+
+    Args:
+        form (Form): Formulaire concerné
+        geolocation (str): Position de la soumission ("lat,lon")
+
+    Returns:
+        dict: Colonnes geofence_name et outside_geofence de la réponse (vide si le contrôle est désactivé)
+    """
+    if (form.geofence_mode or 'off') == 'off':
+        return {}
+    coords = parse_latlon(geolocation)
+    name = get_geofence_index(form).locate(*coords) if coords is not None else None
+    return {'geofence_name': name, 'outside_geofence': name is None}
+
+
+def geofence_rejects(form, check):
+    """
+    Indiquer si une soumission doit être refusée
+
+    Args:
+        form (Form): Formulaire concerné
+        check (dict): Résultat de check_geofence
+
+    Returns:
+        bool: True si le formulaire refuse les soumissions hors zone et que celle-ci l'est
+    """
+    return form.geofence_mode == 'reject' and bool(check.get('outside_geofence'))
+
@@ -11,6 +11,7 @@ from werkzeug.utils import secure_filename
 from flask import current_app
 import base64
 import imghdr # Pour vérifier le type d'image
+from app.utils.ipgeo import locate_ip
 
 # Extensions de fichiers autorisées
 ALLOWED_EXTENSIONS = {
@@ -24,6 +25,9 @@ ALLOWED_EXTENSIONS = {
 # Extensions d'images
 IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'bmp', 'tiff'}
 
+# Clé de la signature dans les réponses soumises par l'API (paramètre signature_data)
+API_SIGNATURE_KEY = 'signature'
+
 def allowed_file(filename):
     """
     Vérifier si le fichier a une extension autorisée
@@ -141,8 +145,8 @@ def save_file(file_storage_or_base64_data, upload_folder, is_base64=False):
     Sauvegarder un fichier uploadé ou une chaîne base64 dans le dossier d'upload.
     Retourne le nom de fichier généré.
     """
-    if not os.path.exists(upload_folder):
-        os.makedirs(upload_folder)
+    # Les fichiers sont rangés dans le sous-dossier 'files' du dossier d'upload
+    os.makedirs(os.path.join(upload_folder, 'files'), exist_ok=True)
 
     if is_base64:
         # Extraire le type MIME et les données base64
@@ -213,27 +217,20 @@ def get_file_size(filepath):
 
 def get_geolocation_data(ip_address):
     """
-    Simule la récupération des données de géolocalisation à partir d'une adresse IP.
-    Dans une application réelle, vous utiliseriez un service tiers (ex: ipinfo.io, ip-api.com).
-    """
-    # Ceci est un placeholder. Dans une vraie application, vous feriez une requête API.
-    # Exemple:
-    # import requests
-    # try:
-    #     response = requests.get(f"http://ip-api.com/json/{ip_address}")
-    #     data = response.json()
-    #     if data['status'] == 'success':
-    #         return {
-    #             'latitude': data['lat'],
-    #             'longitude': data['lon'],
-    #             'address': f"{data['city']}, {data['regionName']}, {data['country']}"
-    #         }
-    # except Exception as e:
-    #     current_app.logger.error(f"Erreur de géolocalisation pour {ip_address}: {e}")
+    Récupère les données de géolocalisation d'une adresse IP.
+    La recherche se fait dans la table de plages locale (IPGEO_DATABASE), sans service externe.
+    """
+    place = locate_ip(ip_address)
+    if place is None:
+        return {
+            'latitude': None,
+            'longitude': None,
+            'address': None
+        }
     return {
-        'latitude': None,
-        'longitude': None,
-        'address': 'Géolocalisation non disponible (simulée)'
+        'latitude': place['latitude'],
+        'longitude': place['longitude'],
+        'address': place['label']
     }
 
 def format_file_size(size_bytes):
@@ -262,6 +259,9 @@ def validate_field_value(field_type, value, field_config=None):
     """
     Valider la valeur d'un champ selon son type
     
+    Pour valider une soumission complète, préférer get_form_validator()
+    (app.utils.validation) qui compile et met en cache les vérifications.
+    
     Args:
         field_type (str): Type du champ
         value: Valeur à valider
@@ -270,74 +270,63 @@ def validate_field_value(field_type, value, field_config=None):
     Returns:
         tuple: (is_valid, error_message)
     """
-    if field_config is None:
-        field_config = {}
-    
-    # Champs obligatoires
-    if field_config.get('required', False) and not value:
-        return False, "Ce champ est obligatoire"
-    
-    # Si la valeur est vide et le champ n'est pas obligatoire
-    if not value:
-        return True, None
-    
-    # Validation par type
-    if field_type == 'email':
-        email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        if not re.match(email_pattern, value):
-            return False, "Format d'email invalide"
-    
-    elif field_type == 'number':
-        try:
-            num_value = float(value)
-            min_val = field_config.get('min')
-            max_val = field_config.get('max')
-            
-            if min_val is not None and num_value < min_val:
-                return False, f"La valeur doit être supérieure ou égale à {min_val}"
-            
-            if max_val is not None and num_value > max_val:
-                return False, f"La valeur doit être inférieure ou égale à {max_val}"
-                
-        except ValueError:
-            return False, "Doit être un nombre valide"
+    from app.utils.validation import get_compiled_field
     
-    elif field_type == 'tel':
-        # Validation basique pour les numéros de téléphone
-        phone_pattern = r'^[\d\s\-\+$$$$\.]{8,}$'
-        if not re.match(phone_pattern, value):
-            return False, "Format de téléphone invalide"
-    
-    elif field_type == 'url':
-        url_pattern = r'^https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)$'
-        if not re.match(url_pattern, value):
-            return False, "Format d'URL invalide"
-    
-    elif field_type == 'date':
-        try:
-            from datetime import datetime
-            datetime.strptime(value, '%Y-%m-%d')
-        except ValueError:
-            return False, "Format de date invalide (YYYY-MM-DD)"
-    
-    elif field_type == 'time':
-        try:
-            from datetime import datetime
-            datetime.strptime(value, '%H:%M')
-        except ValueError:
-            return False, "Format d'heure invalide (HH:MM)"
-    
-    # Validation de longueur
-    min_length = field_config.get('min_length')
-    max_length = field_config.get('max_length')
-    
-    if min_length and len(str(value)) < min_length:
-        return False, f"Minimum {min_length} caractères requis"
-    
-    if max_length and len(str(value)) > max_length:
-        return False, f"Maximum {max_length} caractères autorisés"
-    
-    return True, None
+    field = dict(field_config or {})
+    field['type'] = field_type
+    error = get_compiled_field(field).validate(value)
+    return error is None, error
+
+def field_names(form_data):
+    """
+    Nom de chaque champ d'un formulaire
+
+    Le formulaire HTML enregistre les réponses par identifiant de champ,
+    l'API par nom: une valeur se cherche sous l'un puis l'autre (response_value).
+
+    Args:
+        form_data (list): Structure des champs du formulaire
+
+    Returns:
+        dict: Nom par identifiant de champ
+    """
+    return {f['id']: f.get('name') for f in (form_data or []) if isinstance(f, dict) and f.get('id')}
+
+def response_value(response_data, field_id, names):
+    """
+    Valeur d'un champ dans les données d'une réponse, par identifiant puis par nom
+
+    Args:
+        response_data (dict): Données de la réponse
+        field_id (str): Identifiant du champ
+        names (dict): Nom par identifiant (voir field_names)
+
+    Returns:
+        Valeur du champ, ou None
+    """
+    value = response_data.get(field_id)
+    if value is None and names.get(field_id):
+        value = response_data.get(names[field_id])
+    return value
+
+def submitted_value(response_data, field):
+    """
+    Valeur d'un champ dans les données d'une réponse, quel que soit le chemin de soumission
+
+    Par identifiant (formulaire HTML), puis par nom (API); la signature envoyée
+    à l'API (signature_data) est stockée sous API_SIGNATURE_KEY.
+
+    Args:
+        response_data (dict): Données de la réponse
+        field (dict): Définition du champ
+
+    Returns:
+        Valeur du champ, ou None
+    """
+    value = response_value(response_data, field.get('id'), {field.get('id'): field.get('name')})
+    if value is None and field.get('type') == 'signature':
+        value = response_data.get(API_SIGNATURE_KEY)
+    return value
 
 def clean_filename(filename):
     """
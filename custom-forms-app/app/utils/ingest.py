@@ -0,0 +1,275 @@
+"""
+Enregistrement des réponses en base, avec mode optionnel de "group commit"
+
+Par défaut chaque soumission est enregistrée dans sa propre transaction. Avec
+SQLite, chaque commit paie un fsync complet et les écritures se sérialisent
+sur le verrou de la base: lors des pics de soumissions, le débit s'effondre.
+
+Quand INGEST_GROUP_COMMIT est activé, les soumissions sont placées dans une
+file en mémoire. Un unique thread d'écriture les regroupe toutes les quelques
+millisecondes et les enregistre dans une seule transaction. Chaque requête
+attend le commit de son lot avant de répondre: l'accusé de réception reste
+durable, mais le coût du fsync est partagé entre toutes les réponses du lot.
+Le lot est flushé en une fois: les écouteurs des agrégats (compteurs,
+statistiques, séries, index de recherche) font une écriture par formulaire
+et par clé pour tout le lot, au lieu d'une par réponse; c'est l'essentiel du
+gain quand le fsync est bon marché (synchronous=NORMAL).
+
+Une soumission dont le lot n'a pas été pris en charge dans le délai
+INGEST_ACK_TIMEOUT est annulée (IngestTimeoutError): elle ne sera jamais
+écrite, le client peut la renvoyer sans créer de doublon. Une soumission
+déjà prise en charge attend l'issue de son commit.
+Chaque shard (app/utils/shards.py) a son propre thread d'écriture: les lots
+de bases différentes ne s'attendent pas.
+"""
+import os
+import time
+import queue
+from threading import Thread, Event, Lock
+
+from flask import current_app
+
+from app import db
+from app.models import FormDraft, FormResponse, FormFile
+from app.utils.shard_routing import current_shard, use_shard
+
+
+class IngestTimeoutError(Exception):
+    """La soumission n'a pas été prise en charge dans le délai imparti (et ne sera pas écrite)"""
+
+
+class DraftAlreadySubmittedError(Exception):
+    """Le brouillon promu en réponse a déjà été soumis (ou supprimé) par une autre requête"""
+
+
+class PendingSubmission:
+    """Soumission en attente d'écriture par le thread de group commit"""
+
+    __slots__ = ('values', 'files', 'draft_id', 'done', 'response_id', 'error', 'claimed', 'cancelled', '_lock')
+
+    def __init__(self, values, files, draft_id=None):
+        self.values = values
+        self.files = files
+        self.draft_id = draft_id
+        self.done = Event()
+        self.response_id = None
+        self.error = None
+        self.claimed = False
+        self.cancelled = False
+        self._lock = Lock()
+
+    def claim(self):
+        """Prendre en charge la soumission pour l'écrire (False si elle a été annulée)"""
+        with self._lock:
+            if not self.cancelled:
+                self.claimed = True
+            return self.claimed
+
+    def cancel(self):
+        """Annuler la soumission si son écriture n'a pas commencé (False sinon)"""
+        with self._lock:
+            if not self.claimed:
+                self.cancelled = True
+            return self.cancelled
+
+
+def _add_submissions(submissions):
+    """
+    Ajouter des réponses et leurs fichiers à la session courante (sans commit)
+
+    Les réponses sont flushées ensemble: les écouteurs after_flush agrègent
+    les écritures des compteurs et statistiques de tout le lot.
+
+    Args:
+        submissions (list): Triplets (colonnes du FormResponse, dictionnaires de colonnes FormFile sans
+            response_id, identifiant du brouillon promu ou None)
+
+    Returns:
+        list: Réponses ajoutées et flushées (id attribué), dans l'ordre des soumissions
+
+    Raises:
+        DraftAlreadySubmittedError: Brouillon promu déjà supprimé
+    """
+    for _, _, draft_id in submissions:
+        # Brouillon supprimé dans la transaction de sa réponse: une seule promotion par brouillon
+        if draft_id is not None and not FormDraft.query.filter(FormDraft.id == draft_id).delete(synchronize_session=False):
+            raise DraftAlreadySubmittedError("Ce brouillon a déjà été soumis.")
+    responses = [FormResponse(**values) for values, _, _ in submissions]
+    db.session.add_all(responses)
+    db.session.flush()
+    for response, (_, files, _) in zip(responses, submissions):
+        for file_values in files or ():
+            db.session.add(FormFile(form_id=response.form_id, response_id=response.id, **file_values))
+    return responses
+
+
+def _add_submission(values, files, draft_id=None):
+    """
+    Ajouter une réponse et ses fichiers à la session courante (sans commit)
+
+    Args:
+        values (dict): Colonnes du FormResponse
+        files (list): Dictionnaires de colonnes FormFile (sans response_id)
+        draft_id (int): Brouillon promu en réponse, supprimé dans la même transaction
+
+    Returns:
+        FormResponse: Réponse ajoutée et flushée (id attribué)
+    """
+    return _add_submissions([(values, files, draft_id)])[0]
+
+
+class GroupCommitWriter:
+    """Thread d'écriture unique (par base) regroupant les soumissions en transactions communes"""
+
+    def __init__(self, app, interval=0.005, max_batch=200, ack_timeout=10.0, shard=None):
+        self.app = app
+        self.shard = shard
+        self.interval = interval
+        self.max_batch = max_batch
+        self.ack_timeout = ack_timeout
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                name = f'ingest-group-commit-{self.shard}' if self.shard else 'ingest-group-commit'
+                self._thread = Thread(target=self._run, name=name, daemon=True)
+                self._thread.start()
+
+    def submit(self, values, files=None, draft_id=None):
+        """
+        Mettre une soumission en file et attendre son commit
+
+        Args:
+            values (dict): Colonnes du FormResponse
+            files (list): Dictionnaires de colonnes FormFile
+            draft_id (int): Brouillon promu en réponse, supprimé dans la même transaction
+
+        Returns:
+            int: Identifiant de la réponse enregistrée
+
+        Raises:
+            IngestTimeoutError: Soumission annulée avant son écriture
+        """
+        self._ensure_started()
+        pending = PendingSubmission(values, files, draft_id)
+        self.queue.put(pending)
+        if not pending.done.wait(self.ack_timeout):
+            if pending.cancel():
+                raise IngestTimeoutError("La soumission n'a pas pu être enregistrée à temps.")
+            # Lot déjà en cours d'écriture: la réponse est peut-être enregistrée, attendre l'issue du commit
+            pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.response_id
+
+    def _run(self):
+        with use_shard(self.shard):
+            self._run_batches()
+
+    def _run_batches(self):
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._commit_batch(batch)
+
+    def _commit_batch(self, batch):
+        # Soumissions annulées par leur requête (délai dépassé): jamais écrites
+        batch = [pending for pending in batch if pending.claim()]
+        if not batch:
+            return
+        with self.app.app_context():
+            try:
+                responses = _add_submissions([(p.values, p.files, p.draft_id) for p in batch])
+                ids = [r.id for r in responses]
+                db.session.commit()
+                for pending, response_id in zip(batch, ids):
+                    pending.response_id = response_id
+                    pending.done.set()
+            except Exception as e:
+                db.session.rollback()
+                self.app.logger.warning(f"Échec du commit groupé ({len(batch)} réponses), reprise unitaire: {e}")
+                # Isoler la soumission fautive: réessayer chaque élément seul
+                for pending in batch:
+                    try:
+                        pending.response_id = _add_submission(pending.values, pending.files, pending.draft_id).id
+                        db.session.commit()
+                    except Exception as item_error:
+                        db.session.rollback()
+                        pending.error = item_error
+                    pending.done.set()
+
+
+_writers = {}
+_writers_lock = Lock()
+
+
+def get_group_commit_writer(app, shard=None):
+    """
+    Obtenir le thread d'écriture de l'application (et d'un shard) pour le processus courant
+
+    Le writer est indexé par PID pour rester correct après un fork
+    (serveurs multi-processus type gunicorn).
+    """
+    key = (id(app), os.getpid(), shard)
+    writer = _writers.get(key)
+    if writer is None:
+        with _writers_lock:
+            writer = _writers.get(key)
+            if writer is None:
+                writer = GroupCommitWriter(
+                    app,
+                    interval=app.config.get('INGEST_BATCH_INTERVAL_MS', 5) / 1000.0,
+                    max_batch=app.config.get('INGEST_BATCH_MAX_SIZE', 200),
+                    ack_timeout=app.config.get('INGEST_ACK_TIMEOUT', 10.0),
+                    shard=shard
+                )
+                _writers[key] = writer
+    return writer
+
+
+def persist_response(values, files=None, draft_id=None):
+    """
+    Enregistrer une réponse (et ses fichiers) de manière durable
+
+    Utilise le group commit si INGEST_GROUP_COMMIT est activé, sinon une
+    transaction dédiée dans la session de la requête.
+
+    Args:
+        values (dict): Colonnes du FormResponse (form_id, response_data, ...)
+        files (list): Dictionnaires de colonnes FormFile (field_id, filename, ...)
+        draft_id (int): Brouillon promu en réponse, supprimé dans la même transaction
+
+    Returns:
+        int: Identifiant de la réponse enregistrée
+
+    Raises:
+        IngestTimeoutError: Soumission annulée avant son écriture (group commit)
+        DraftAlreadySubmittedError: Brouillon promu déjà supprimé
+    """
+    app = current_app._get_current_object()
+    if app.config.get('INGEST_GROUP_COMMIT'):
+        # Libérer la connexion de la requête avant d'attendre: une transaction
+        # de lecture ouverte bloquerait le verrou d'écriture SQLite et le pool
+        db.session.commit()
+        return get_group_commit_writer(app, current_shard()).submit(values, files, draft_id)
+
+    try:
+        response_id = _add_submission(values, files, draft_id).id
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return response_id
@@ -0,0 +1,307 @@
+"""
+Géolocalisation des adresses IP à partir d'une table de plages locale
+
+Le fichier (IPGEO_DATABASE) liste des plages d'adresses et leur position.
+Deux mises en page CSV sans en-tête sont reconnues, éventuellement
+compressées en .gz:
+- DB-IP « IP to City Lite »: ip_début, ip_fin, continent, pays, région, ville, lat, lon;
+- IP2Location LITE DB5: entier_début, entier_fin, code_pays, nom_pays, région, ville, lat, lon.
+
+Les plages IPv4 et IPv6 sont rangées dans des tableaux triés par adresse de
+début; une recherche est une recherche dichotomique (bisect), mise en cache
+(LRU). Le fichier est rechargé automatiquement lorsqu'il est remplacé, sans
+redémarrer l'application.
+
+Aucun appel réseau n'est effectué.
+"""
+import os
+import csv
+import gzip
+import time
+import ipaddress
+from array import array
+from bisect import bisect_right
+from functools import lru_cache
+from threading import Lock
+
+from flask import current_app
+
+# Colonnes communes aux deux formats
+_REGION, _CITY, _LAT, _LON = 4, 5, 6, 7
+
+# Plage IPv4 intégrée dans l'espace IPv6 (::ffff:0:0/96), pour IP2Location
+_IPV4_MAPPED_START = 0xFFFF00000000
+_IPV4_MAPPED_END = 0xFFFFFFFFFFFF
+
+
+def _open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, 'r', encoding='utf-8', newline='')
+
+
+def _parse_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_ranges(path):
+    """Lire les plages du fichier: (version, début, fin, lieu)"""
+    with _open_text(path) as f:
+        for row in csv.reader(f):
+            if len(row) <= _LON:
+                continue
+
+            if row[0].isdigit():
+                # IP2Location: bornes entières, IPv4 éventuellement représenté en IPv6 mappé
+                start, end, country = int(row[0]), int(row[1]), row[2]
+                if _IPV4_MAPPED_START <= start and end <= _IPV4_MAPPED_END:
+                    start -= _IPV4_MAPPED_START
+                    end -= _IPV4_MAPPED_START
+                    version = 4
+                else:
+                    version = 4 if end <= 0xFFFFFFFF else 6
+            else:
+                try:
+                    first, last = ipaddress.ip_address(row[0]), ipaddress.ip_address(row[1])
+                except ValueError:
+                    continue  # Ligne d'en-tête ou invalide
+                start, end, country = int(first), int(last), row[3]
+                version = first.version
+
+            if not country or country == '-':
+                continue
+            yield version, start, end, (
+                country,
+                row[_REGION] if row[_REGION] != '-' else None,
+                row[_CITY] if row[_CITY] != '-' else None,
+                _parse_float(row[_LAT]),
+                _parse_float(row[_LON])
+            )
+
+
+class IPRangeTable:
+    """
+    Plages d'adresses triées, interrogées par recherche dichotomique
+
+    Les lieux identiques (une même ville sur de nombreuses plages) ne sont
+    stockés qu'une fois; chaque plage référence son lieu par un indice.
+    """
+
+    def __init__(self, cache_size=65536):
+        # IPv4: entiers 32 bits en tableaux compacts; IPv6: listes d'entiers 128 bits
+        self._starts = {4: array('I'), 6: []}
+        self._ends = {4: array('I'), 6: []}
+        self._place_ids = {4: array('I'), 6: array('I')}
+        self.places = []
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def __len__(self):
+        return len(self._starts[4]) + len(self._starts[6])
+
+    def load(self, path):
+        """
+        Charger un fichier de plages
+
+        Args:
+            path (str): Chemin du fichier CSV (DB-IP ou IP2Location)
+
+        Returns:
+            int: Nombre de plages chargées
+        """
+        place_index = {}
+        ranges = {4: [], 6: []}
+        for version, start, end, place in _read_ranges(path):
+            place_id = place_index.get(place)
+            if place_id is None:
+                place_id = place_index[place] = len(self.places)
+                self.places.append(place)
+            ranges[version].append((start, end, place_id))
+
+        for version, rows in ranges.items():
+            # Les fichiers sont normalement déjà triés: le tri ne coûte alors presque rien
+            rows.sort()
+            starts, ends, place_ids = self._starts[version], self._ends[version], self._place_ids[version]
+            for start, end, place_id in rows:
+                starts.append(start)
+                ends.append(end)
+                place_ids.append(place_id)
+
+        self.lookup.cache_clear()
+        return len(self)
+
+    def _lookup(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        if address.version == 6 and address.ipv4_mapped is not None:
+            address = address.ipv4_mapped
+        if not address.is_global:
+            return None  # Adresses privées, locales, réservées: aucune position
+
+        value = int(address)
+        starts = self._starts[address.version]
+        i = bisect_right(starts, value) - 1
+        if i < 0 or value > self._ends[address.version][i]:
+            return None
+
+        country, region, city, lat, lon = self.places[self._place_ids[address.version][i]]
+        return {
+            'country': country,
+            'region': region,
+            'city': city,
+            'latitude': lat,
+            'longitude': lon,
+            'label': ', '.join(part for part in (city, region, country) if part)
+        }
+
+    def locate(self, ip):
+        """
+        Trouver la position associée à une adresse IP
+
+        Args:
+            ip (str): Adresse IPv4 ou IPv6
+
+        Returns:
+            dict: Lieu (country, region, city, latitude, longitude, label), ou None si inconnue
+        """
+        if not ip:
+            return None
+        return self.lookup(ip)
+
+
+class IPLocator:
+    """
+    Table de plages avec rechargement à chaud
+
+    La date de modification du fichier est vérifiée au plus toutes les
+    ``check_interval`` secondes; une nouvelle table est construite à côté de
+    l'ancienne, qui continue à servir les recherches jusqu'à l'échange.
+    """
+
+    def __init__(self, path, cache_size=65536, check_interval=60, logger=None):
+        self.path = path
+        self.cache_size = cache_size
+        self.check_interval = check_interval
+        self.logger = logger
+        self.table = None
+        self._mtime = None
+        self._next_check = 0.0
+        self._lock = Lock()
+
+    def _refresh(self):
+        now = time.monotonic()
+        if now < self._next_check:
+            return
+        # Un seul thread recharge; les autres continuent avec la table courante
+        if not self._lock.acquire(blocking=self.table is None):
+            return
+        try:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError:
+                if self.logger and self.table is None:
+                    self.logger.warning(f"Table de géolocalisation IP introuvable: {self.path}")
+                return
+            if mtime == self._mtime:
+                return
+
+            start = time.perf_counter()
+            table = IPRangeTable(cache_size=self.cache_size)
+            try:
+                count = table.load(self.path)
+            except (OSError, csv.Error, UnicodeDecodeError) as e:
+                # Fichier en cours d'écriture ou corrompu: garder l'ancienne table
+                if self.logger:
+                    self.logger.error(f"Erreur lors du chargement de {self.path}: {e}")
+                return
+            self.table, self._mtime = table, mtime
+            if self.logger:
+                self.logger.info(f"Géolocalisation IP: {count} plages chargées depuis {self.path} en {time.perf_counter() - start:.1f}s")
+        finally:
+            self._lock.release()
+
+    def locate(self, ip):
+        """
+        Trouver la position associée à une adresse IP (voir IPRangeTable.locate)
+
+        Args:
+            ip (str): Adresse IPv4 ou IPv6
+
+        Returns:
+            dict: Lieu, ou None si inconnue ou si aucune table n'est disponible
+        """
+        self._refresh()
+        table = self.table
+        return table.locate(ip) if table is not None else None
+
+
+_locators = {}
+_locators_lock = Lock()
+
+
+def get_ip_locator(app=None):
+    """
+    Obtenir le localisateur IP de l'application
+
+    Args:
+        app: Application Flask (par défaut l'application courante)
+
+    Returns:
+        IPLocator: Localisateur, ou None si IPGEO_DATABASE n'est pas configuré
+    """
+    app = app or current_app._get_current_object()
+    path = app.config.get('IPGEO_DATABASE')
+    if not path:
+        return None
+
+    key = id(app)
+    locator = _locators.get(key)
+    if locator is None:
+        with _locators_lock:
+            locator = _locators.get(key)
+            if locator is None:
+                locator = IPLocator(
+                    path,
+                    cache_size=app.config.get('IPGEO_CACHE_SIZE', 65536),
+                    check_interval=app.config.get('IPGEO_RELOAD_INTERVAL', 60),
+                    logger=app.logger
+                )
+                _locators[key] = locator
+    return locator
+
+
+def locate_ip(ip):
+    """
+    Position associée à une adresse IP, avec la table de l'application
+
+    Args:
+        ip (str): Adresse IPv4 ou IPv6
+
+    Returns:
+        dict: Lieu, ou None
+    """
+    locator = get_ip_locator()
+    if locator is None:
+        return None
+    return locator.locate(ip)
+
+
+def ip_location_for(ip):
+    """
+    Libellé du lieu associé à une adresse IP ("Ville, Région, Pays")
+
+    Args:
+        ip (str): Adresse IPv4 ou IPv6
+
+    Returns:
+        str: Libellé, ou None si inconnu
+    """
+    place = locate_ip(ip)
+    return place['label'] if place else None
@@ -0,0 +1,198 @@
+"""
+Tâches de fond persistées
+
+Les opérations longues (suppression d'un formulaire et de ses données...)
+ne s'exécutent pas dans la requête: la requête enregistre une
+BackgroundJob et rend la main. Un thread par processus (JOB_WORKER =
+'thread') réclame les tâches en attente une à une (UPDATE conditionnel:
+un seul processus gagne) et appelle le traitement enregistré pour leur
+type. Le traitement travaille par lots, chacun dans sa propre transaction,
+et rapporte sa progression après chaque lot.
+
+Une tâche « running » dont le dernier lot date de plus de JOB_STALE_SECONDS
+(processus arrêté en cours de route) est reprise: les traitements doivent
+donc pouvoir reprendre là où ils en étaient.
+
+JOB_WORKER = 'inline' exécute la tâche dans la requête, après son commit
+(tests); 'none' laisse les tâches à « flask run-jobs » (cron).
+"""
+import os
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+
+from flask import current_app
+from sqlalchemy import or_
+
+from app import db
+from app.models import BackgroundJob
+
+JOB_HANDLERS = {}
+
+
+def job_handler(kind):
+    """
+    Enregistrer le traitement d'un type de tâche
+
+    Le traitement reçoit la tâche et une fonction report(progress, total=None, message=None)
+    qui enregistre la progression (et valide la transaction en cours).
+
+    Args:
+        kind (str): Type de tâche
+    """
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+
+def enqueue_job(kind, target_id=None, user_id=None):
+    """
+    Créer une tâche en attente (validée avec la transaction de l'appelant)
+
+    Args:
+        kind (str): Type de tâche (voir JOB_HANDLERS)
+        target_id (int): Objet concerné
+        user_id (int): Utilisateur à l'origine de la tâche
+
+    Returns:
+        BackgroundJob: Tâche ajoutée à la session
+    """
+    job = BackgroundJob(kind=kind, target_id=target_id, created_by=user_id, status='pending')
+    db.session.add(job)
+    return job
+
+
+def _claim_next_job():
+    """Réclamer la plus ancienne tâche en attente (ou abandonnée); None s'il n'y en a pas"""
+    stale = datetime.utcnow() - timedelta(seconds=current_app.config.get('JOB_STALE_SECONDS', 300))
+    claimable = or_(
+        BackgroundJob.status == 'pending',
+        (BackgroundJob.status == 'running') & (BackgroundJob.updated_at < stale)
+    )
+    for (job_id,) in db.session.query(BackgroundJob.id).filter(claimable).order_by(BackgroundJob.id).limit(5).all():
+        now = datetime.utcnow()
+        claimed = BackgroundJob.query.filter(BackgroundJob.id == job_id, claimable).update(
+            {'status': 'running', 'started_at': now, 'updated_at': now}, synchronize_session=False
+        )
+        db.session.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def run_job(job_id):
+    """
+    Exécuter une tâche réclamée
+
+    Args:
+        job_id (int): Identifiant de la tâche (statut 'running')
+    """
+    job = db.session.get(BackgroundJob, job_id)
+    handler = JOB_HANDLERS.get(job.kind)
+
+    def report(progress, total=None, message=None):
+        job.progress = progress
+        if total is not None:
+            job.total = total
+        if message is not None:
+            job.message = message[:255]
+        job.updated_at = datetime.utcnow()
+        db.session.commit()
+
+    try:
+        if handler is None:
+            raise ValueError(f"Type de tâche inconnu: {job.kind}")
+        handler(job, report)
+        job.status = 'done'
+        job.message = None
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Échec de la tâche {job_id} ({job.kind}): {e}")
+        job.status = 'failed'
+        job.message = str(e)[:255]
+    job.finished_at = job.updated_at = datetime.utcnow()
+    db.session.commit()
+
+
+def run_pending_jobs(limit=None):
+    """
+    Exécuter les tâches en attente, l'une après l'autre
+
+    Args:
+        limit (int): Nombre maximum de tâches, ou None pour toutes
+
+    Returns:
+        int: Nombre de tâches exécutées
+    """
+    count = 0
+    while limit is None or count < limit:
+        job_id = _claim_next_job()
+        if job_id is None:
+            break
+        run_job(job_id)
+        count += 1
+    return count
+
+
+class JobWorker:
+    """Thread d'exécution des tâches de fond d'un processus"""
+
+    def __init__(self, app, poll_interval=5.0):
+        self.app = app
+        self.poll_interval = poll_interval
+        self._wake = Event()
+        self._thread = None
+        self._lock = Lock()
+
+    def wake(self):
+        """Signaler une nouvelle tâche (démarre le thread au besoin)"""
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = Thread(target=self._run, name='background-jobs', daemon=True)
+                    self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            self._wake.clear()
+            with self.app.app_context():
+                try:
+                    run_pending_jobs()
+                except Exception as e:
+                    db.session.rollback()
+                    self.app.logger.error(f"Erreur du thread des tâches de fond: {e}")
+                finally:
+                    db.session.remove()
+            self._wake.wait(self.poll_interval)
+
+
+_workers = {}
+_workers_lock = Lock()
+
+
+def get_job_worker(app):
+    """
+    Obtenir le thread des tâches de l'application pour le processus courant
+
+    Indexé par PID pour rester correct après un fork (gunicorn).
+    """
+    key = (id(app), os.getpid())
+    worker = _workers.get(key)
+    if worker is None:
+        with _workers_lock:
+            worker = _workers.get(key)
+            if worker is None:
+                worker = JobWorker(app, poll_interval=app.config.get('JOB_POLL_INTERVAL', 5))
+                _workers[key] = worker
+    return worker
+
+
+def start_jobs():
+    """Lancer l'exécution des tâches en attente selon JOB_WORKER (après le commit de la requête)"""
+    app = current_app._get_current_object()
+    mode = app.config.get('JOB_WORKER', 'thread')
+    if mode == 'inline':
+        run_pending_jobs()
+    elif mode == 'thread':
+        get_job_worker(app).wake()
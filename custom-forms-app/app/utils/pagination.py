@@ -0,0 +1,134 @@
+"""
+Pagination par curseur (keyset) des réponses
+
+Avec OFFSET, la base parcourt puis jette toutes les lignes des pages
+précédentes: la page 1000 coûte mille pages. Ici une page commence
+« après » (ou « avant ») la dernière réponse affichée, repérée par le couple
+(submitted_at, id): avec l'index (form_id, submitted_at, id), chaque page est
+un parcours d'index de per_page lignes, quelle que soit sa position.
+
+Le curseur transmis dans l'URL est opaque (base64 du couple).
+"""
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import tuple_
+
+from app.models import FormResponse
+
+# Tris proposés: ordre de (submitted_at, id)
+SORT_ORDERS = {'recent': True, 'oldest': False}
+DEFAULT_SORT = 'recent'
+
+
+def encode_cursor(response):
+    """
+    Curseur repérant une réponse dans l'ordre (submitted_at, id)
+
+    Args:
+        response (FormResponse): Réponse
+
+    Returns:
+        str: Curseur opaque, utilisable dans une URL
+    """
+    raw = json.dumps([response.submitted_at.isoformat(), response.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Décoder un curseur
+
+    Args:
+        cursor (str): Curseur produit par encode_cursor
+
+    Returns:
+        tuple: (submitted_at, id)
+
+    Raises:
+        ValueError: Curseur invalide
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        submitted_at, response_id = json.loads(raw)
+        return datetime.fromisoformat(submitted_at), int(response_id)
+    except (TypeError, ValueError, UnicodeDecodeError) as e:
+        raise ValueError('Curseur de pagination invalide.') from e
+
+
+class KeysetPage:
+    """Page de réponses avec les curseurs des pages voisines"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+
+def keyset_paginate(query, per_page, after=None, before=None, descending=True, extra=None):
+    """
+    Paginer une requête de réponses sur (submitted_at, id)
+
+    Args:
+        query (Query): Requête sur FormResponse (filtres déjà appliqués)
+        per_page (int): Réponses par page
+        after (str): Curseur: page suivant cette réponse
+        before (str): Curseur: page précédant cette réponse
+        descending (bool): Plus récentes d'abord
+        extra (callable): Autre source de réponses fusionnée dans la page (archives):
+            extra(position, descending, limit, bound) -> réponses suivant position, dans l'ordre
+
+    Returns:
+        KeysetPage: Réponses de la page et curseurs
+
+    Raises:
+        ValueError: Curseur invalide
+    """
+    key = tuple_(FormResponse.submitted_at, FormResponse.id)
+    backwards = before is not None and after is None
+    # En remontant, on lit dans l'ordre inverse puis on retourne la page
+    order_desc = descending != backwards
+
+    position = None
+    if after is not None:
+        position = decode_cursor(after)
+        query = query.filter(key < tuple_(*position) if descending else key > tuple_(*position))
+    elif before is not None:
+        position = decode_cursor(before)
+        query = query.filter(key > tuple_(*position) if descending else key < tuple_(*position))
+
+    if order_desc:
+        query = query.order_by(FormResponse.submitted_at.desc(), FormResponse.id.desc())
+    else:
+        query = query.order_by(FormResponse.submitted_at.asc(), FormResponse.id.asc())
+
+    items = query.limit(per_page + 1).all()
+    if extra is not None:
+        # Page pleine: l'autre source n'est utile qu'en deçà de la dernière ligne lue
+        bound = (items[-1].submitted_at, items[-1].id) if len(items) > per_page else None
+        items = sorted(items + extra(position, order_desc, per_page + 1, bound),
+                       key=lambda r: (r.submitted_at, r.id), reverse=order_desc)[:per_page + 1]
+    more = len(items) > per_page
+    items = items[:per_page]
+    if backwards:
+        items.reverse()
+    if not items:
+        return KeysetPage([])
+
+    # Page suivante: s'il reste des lignes après, ou si l'on vient de remonter
+    has_next = more if not backwards else True
+    has_prev = more if backwards else (after is not None)
+    return KeysetPage(
+        items,
+        next_cursor=encode_cursor(items[-1]) if has_next else None,
+        prev_cursor=encode_cursor(items[0]) if has_prev else None
+    )
@@ -0,0 +1,348 @@
+"""
+Limitation de débit des soumissions par seau à jetons (token bucket)
+
+Chaque seau se remplit à un débit constant jusqu'à sa capacité; une
+soumission consomme un jeton. Deux seaux sont vérifiés pour chaque
+soumission anonyme: un par couple (formulaire, IP) et un global au
+formulaire. Une soumission n'est acceptée que si chacun de ses seaux a un
+jeton, et ne consomme rien sinon. Les pièces jointes des brouillons ont
+leur propre seau par IP (RATELIMIT_DRAFT_UPLOADS): un long formulaire en
+envoie une par champ fichier. Les limites se configurent dans l'application
+(RATELIMIT_*) et peuvent être surchargées par formulaire.
+
+Deux backends sont disponibles:
+- 'memory': dictionnaire en mémoire, propre à chaque processus;
+- 'shared': table de hachage dans un fichier mappé en mémoire (/dev/shm),
+  partagée par tous les processus de la machine (workers gunicorn) et
+  protégée par un verrou fcntl.
+
+Le refus est décidé avant toute lecture du corps de la requête, écriture de
+fichier ou accès en base: les limites par formulaire sont mises en cache.
+"""
+import os
+import re
+import mmap
+import asyncio
+import time
+import struct
+import hashlib
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache, wraps
+from threading import Lock
+
+from flask import current_app, request, jsonify
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+try:
+    import fcntl
+except ImportError:  # Windows: seul le backend mémoire est disponible
+    fcntl = None
+
+# Durées reconnues dans les limites ("10/minute", "200/hour"...)
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LIMIT_RE = re.compile(r'^\s*(\d+)\s*/\s*(\d+\s*)?(second|minute|hour|day)s?\s*$')
+
+
+@lru_cache(maxsize=256)
+def parse_limit(limit):
+    """
+    Convertir une limite textuelle en paramètres de seau
+
+    Args:
+        limit (str): Limite au format "N/période" (ex: "10/minute", "500/2hours")
+
+    Returns:
+        tuple: (débit en jetons/seconde, capacité), ou None si la limite est vide ou "0"
+    """
+    if not limit or limit.strip() in ('0', 'off', 'none'):
+        return None
+    match = _LIMIT_RE.match(limit.lower())
+    if not match:
+        raise ValueError(f"Limite de débit invalide: {limit}")
+    count = int(match.group(1))
+    multiplier = int(match.group(2)) if match.group(2) else 1
+    if count <= 0:
+        return None
+    return count / (PERIODS[match.group(3)] * multiplier), float(count)
+
+
+def _refill(tokens, updated, rate, burst, now):
+    """Niveau du seau après remplissage"""
+    return min(burst, tokens + (now - updated) * rate)
+
+
+def _retry_after(levels, buckets):
+    """Délai avant que tous les seaux aient un jeton (0 si c'est déjà le cas)"""
+    return max(((1.0 - tokens) / rate for tokens, (_, rate, _) in zip(levels, buckets) if tokens < 1.0), default=0.0)
+
+
+class MemoryBackend:
+    """Seaux en mémoire du processus, avec éviction LRU"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = Lock()
+
+    def consume(self, buckets, now=None):
+        """
+        Consommer un jeton de chaque seau, ou d'aucun si l'un d'eux est vide
+
+        Args:
+            buckets (list): Tuples (clé, débit, capacité)
+
+        Returns:
+            float: 0 si accepté, sinon délai en secondes avant le prochain jeton
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            levels = [_refill(*self._buckets.pop(key, (burst, now)), rate, burst, now) for key, rate, burst in buckets]
+            retry_after = _retry_after(levels, buckets)
+            for (key, _, _), tokens in zip(buckets, levels):
+                self._buckets[key] = (tokens if retry_after else tokens - 1.0, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+
+class SharedMemoryBackend:
+    """
+    Seaux partagés entre processus dans un fichier mappé en mémoire
+
+    Chaque case contient (empreinte de clé, jetons, horodatage). Les
+    collisions sont résolues par sondage linéaire sur quelques cases; si
+    aucune n'est libre, la case la plus ancienne est réutilisée (un seau
+    oublié repart plein, ce qui ne fait que relâcher la limite).
+    """
+
+    _SLOT = struct.Struct('<Qdd')
+    _PROBES = 8
+
+    def __init__(self, path, slots=65536):
+        if fcntl is None:
+            raise RuntimeError("Le backend 'shared' nécessite fcntl (Unix).")
+        self.path = path
+        self.slots = slots
+        size = slots * self._SLOT.size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size != size:
+                # Nouveau fichier (ou taille modifiée): table vide
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+        self._lock = Lock()
+
+    @staticmethod
+    def _fingerprint(key):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little') | 1  # 0 est réservé aux cases vides
+
+    def _slot(self, fingerprint, rate, burst, now):
+        """Case du seau (trouvée, libre ou la plus ancienne) et son niveau avant remplissage"""
+        slot_size = self._SLOT.size
+        start = fingerprint % self.slots
+        oldest = None
+        for probe in range(self._PROBES):
+            offset = ((start + probe) % self.slots) * slot_size
+            slot_key, tokens, updated = self._SLOT.unpack_from(self._map, offset)
+            if slot_key == fingerprint:
+                return offset, tokens, updated
+            if slot_key == 0 or now - updated > burst / rate:
+                # Case vide, ou seau expiré (de nouveau plein): réutilisable
+                return offset, burst, now
+            if oldest is None or updated < oldest[2]:
+                oldest = (offset, tokens, updated)
+        return oldest[0], burst, now
+
+    def consume(self, buckets, now=None):
+        """
+        Consommer un jeton de chaque seau, ou d'aucun si l'un d'eux est vide
+
+        Args:
+            buckets (list): Tuples (clé, débit, capacité)
+
+        Returns:
+            float: 0 si accepté, sinon délai en secondes avant le prochain jeton
+        """
+        # time.time() et non monotonic(): l'horloge doit être commune aux processus
+        now = time.time() if now is None else now
+
+        with self._lock:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                # Niveau de chaque seau, écrit aussitôt: la case d'un seau n'est pas reprise par le suivant
+                slots, levels = [], []
+                for key, rate, burst in buckets:
+                    fingerprint = self._fingerprint(key)
+                    offset, tokens, updated = self._slot(fingerprint, rate, burst, now)
+                    tokens = _refill(tokens, updated, rate, burst, now)
+                    self._SLOT.pack_into(self._map, offset, fingerprint, tokens, now)
+                    slots.append((offset, fingerprint))
+                    levels.append(tokens)
+                retry_after = _retry_after(levels, buckets)
+                if not retry_after:
+                    for (offset, fingerprint), tokens in zip(slots, levels):
+                        self._SLOT.pack_into(self._map, offset, fingerprint, tokens - 1.0, now)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+        return retry_after
+
+
+_backends = {}
+_backends_lock = Lock()
+
+
+def get_backend(app):
+    """
+    Obtenir le backend de limitation configuré pour le processus courant
+
+    Args:
+        app: Application Flask
+
+    Returns:
+        MemoryBackend | SharedMemoryBackend: Backend de stockage des seaux
+    """
+    key = (id(app), os.getpid())
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock:
+            backend = _backends.get(key)
+            if backend is None:
+                if app.config.get('RATELIMIT_BACKEND') == 'shared':
+                    shm_dir = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+                    backend = SharedMemoryBackend(
+                        app.config.get('RATELIMIT_SHM_PATH') or os.path.join(shm_dir, 'custom-forms-ratelimit'),
+                        slots=app.config.get('RATELIMIT_SHM_SLOTS', 65536)
+                    )
+                else:
+                    backend = MemoryBackend()
+                _backends[key] = backend
+    return backend
+
+
+_form_limits = {}
+_form_limits_lock = Lock()
+
+
+def get_form_limits(form_id):
+    """
+    Limites (par IP, globale) d'un formulaire, avec cache en mémoire
+
+    Les surcharges du formulaire sont relues au plus toutes les
+    RATELIMIT_FORM_CACHE_TTL secondes, sans charger l'objet Form complet.
+
+    Args:
+        form_id (int): Identifiant du formulaire
+
+    Returns:
+        tuple: (limite par IP, limite globale) au format textuel
+    """
+    from app import db
+    from app.models import Form
+
+    config = current_app.config
+    now = time.monotonic()
+    cached = _form_limits.get(form_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
+    row = db.session.query(Form.rate_limit_per_ip, Form.rate_limit_per_form).filter(Form.id == form_id).first()
+    per_ip, per_form = row if row is not None else (None, None)
+    limits = (per_ip or config.get('RATELIMIT_PER_IP'), per_form or config.get('RATELIMIT_PER_FORM'))
+
+    with _form_limits_lock:
+        _form_limits[form_id] = (now + config.get('RATELIMIT_FORM_CACHE_TTL', 60), limits)
+    return limits
+
+
+def invalidate_form_limits(form_id):
+    """Oublier les limites en cache d'un formulaire (après modification de ses paramètres)"""
+    with _form_limits_lock:
+        _form_limits.pop(form_id, None)
+
+
+def check_submission_rate(form_id=None, draft_upload=False):
+    """
+    Vérifier les seaux de la requête courante
+
+    Args:
+        form_id (int): Formulaire visé, ou None pour une limite par IP seule
+        draft_upload (bool): Pièce jointe d'un brouillon (seau par IP distinct, RATELIMIT_DRAFT_UPLOADS)
+
+    Returns:
+        float: 0 si la soumission est acceptée, sinon délai (secondes) avant nouvel essai
+    """
+    config = current_app.config
+    if not config.get('RATELIMIT_ENABLED', True):
+        return 0.0
+    if current_user.is_authenticated and not config.get('RATELIMIT_AUTHENTICATED', False):
+        return 0.0
+
+    backend = get_backend(current_app._get_current_object())
+    ip = request.remote_addr or 'unknown'
+
+    if draft_upload:
+        limits = [(f'draft-upload:ip:{ip}', config.get('RATELIMIT_DRAFT_UPLOADS'))]
+    elif form_id is None:
+        limits = [(f'ip:{ip}', config.get('RATELIMIT_PER_IP'))]
+    else:
+        per_ip, per_form = get_form_limits(form_id)
+        limits = [(f'form:{form_id}:ip:{ip}', per_ip), (f'form:{form_id}', per_form)]
+
+    buckets = []
+    for key, limit in limits:
+        params = parse_limit(limit)
+        if params is not None:
+            buckets.append((key, *params))
+    if not buckets:
+        return 0.0
+    # Tous les seaux vérifiés avant d'en consommer un: un refus ne coûte aucun jeton
+    return backend.consume(buckets)
+
+
+def _rate_limited(f, draft_upload=False):
+    def rejection(kwargs):
+        if request.method != 'POST':
+            return None
+        retry_after = check_submission_rate(kwargs.get('form_id'), draft_upload=draft_upload)
+        if not retry_after:
+            return None
+        retry_after = max(1, int(retry_after + 0.999))
+        message = 'Trop de soumissions, veuillez réessayer plus tard.'
+        if request.blueprint == 'api':
+            response = jsonify({'success': False, 'message': message})
+            response.headers['Retry-After'] = str(retry_after)
+            return response, 429
+        raise TooManyRequests(description=message, retry_after=retry_after)
+
+    if asyncio.iscoroutinefunction(f):
+        @wraps(f)
+        async def decorated_async(*args, **kwargs):
+            return rejection(kwargs) or await f(*args, **kwargs)
+        return decorated_async
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        return rejection(kwargs) or f(*args, **kwargs)
+    return decorated_function
+
+
+def submission_rate_limited(f):
+    """
+    Décorateur: refuser (429) les soumissions au-delà des limites configurées
+
+    Seules les requêtes POST sont comptées. Le formulaire est identifié par
+    l'argument ``form_id`` de la route s'il existe.
+    """
+    return _rate_limited(f)
+
+
+def draft_upload_rate_limited(f):
+    """Décorateur: refuser (429) les pièces jointes de brouillon au-delà de RATELIMIT_DRAFT_UPLOADS (par IP)"""
+    return _rate_limited(f, draft_upload=True)
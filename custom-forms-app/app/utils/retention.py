@@ -0,0 +1,278 @@
+"""
+Durée de conservation des données personnelles des réponses
+
+Un formulaire peut fixer une durée de conservation (Form.retention_days).
+Au-delà, « flask apply-retention » (à planifier, par exemple chaque nuit)
+applique l'action choisie aux réponses, actives et archivées:
+
+- « anonymize »: adresse IP et lieu déduit, géolocalisation (coordonnées,
+  geohash, adresse, zone) et valeurs des champs fichier, signature et
+  géolocalisation sont effacés, les pièces jointes supprimées du disque;
+- « delete »: les réponses sont supprimées avec leurs fichiers, courriels
+  et index.
+
+Le parcours suit l'index (form_id, submitted_at, id), de la dernière date
+traitée (Form.retention_applied_until) à la date limite, par lots de
+RETENTION_BATCH_SIZE réponses: chaque lot est une courte transaction,
+suivie d'une pause (RETENTION_BATCH_PAUSE) qui laisse passer les
+soumissions. Les passages suivants ne relisent que les réponses devenues
+trop anciennes depuis: la taille des tables reste bornée par la durée de
+conservation. Les lots sont idempotents, une exécution interrompue reprend
+simplement au passage suivant.
+
+Compteurs, statistiques et séries temporelles suivent les suppressions
+(via l'ORM pour les réponses actives, par variations pour les archives).
+"""
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import func, tuple_, update
+
+from app import db
+from app.models import EmailLog, Form, FormFile, FormResponse, ResponseArchive, ResponseFieldValue
+from app.utils.admin_stats import apply_stat_deltas, response_stat_keys
+from app.utils.archive import iter_archived_data, rewrite_archive_block
+from app.utils.clusters import invalidate_form_clusters
+from app.utils.counters import apply_counter_deltas, remaining_last_submission, response_file_bytes
+from app.utils.database import shard_connection
+from app.utils.deletion import delete_upload, is_upload_path, response_file_names
+from app.utils.rollups import apply_rollup_deltas, rollup_keys
+from app.utils.search import remove_documents, search_connection
+from app.utils.shard_routing import use_shard
+
+RETENTION_ACTIONS = ('anonymize', 'delete')
+# Colonnes effacées à l'anonymisation
+PERSONAL_COLUMNS = ('ip_address', 'ip_location', 'geolocation', 'latitude', 'longitude', 'geohash', 'address',
+                    'geofence_name')
+# Champs dont la valeur est effacée à l'anonymisation
+PERSONAL_FIELD_TYPES = ('file', 'signature', 'geolocation')
+
+
+def personal_field_keys(form_data):
+    """
+    Clés des valeurs personnelles dans response_data (identifiant et nom: le formulaire HTML et l'API diffèrent)
+
+    Args:
+        form_data (list): Structure des champs du formulaire
+
+    Returns:
+        set: Identifiants et noms des champs fichier, signature et géolocalisation
+    """
+    keys = set()
+    for field in form_data or []:
+        if isinstance(field, dict) and field.get('type') in PERSONAL_FIELD_TYPES:
+            keys.update(key for key in (field.get('id'), field.get('name')) if key)
+    return keys
+
+
+def anonymized_data(response_data, keys):
+    """
+    Données d'une réponse sans valeurs personnelles ni références de fichiers
+
+    Args:
+        response_data (dict): Données de la réponse
+        keys (set): Clés des champs personnels (voir personal_field_keys)
+
+    Returns:
+        dict: Nouvelles données (les autres valeurs sont conservées)
+    """
+    if not isinstance(response_data, dict):
+        return response_data
+    return {
+        key: None if key in keys or (isinstance(value, dict) and value.get('filename')) or is_upload_path(value) else value
+        for key, value in response_data.items()
+    }
+
+
+def cutoff_for(form, now=None):
+    """Date limite de conservation d'un formulaire (None sans règle)"""
+    if not form.retention_days:
+        return None
+    return (now or datetime.utcnow()) - timedelta(days=form.retention_days)
+
+
+def _anonymize_batch(form, keys, rows):
+    """Anonymiser un lot de réponses actives; renvoie les fichiers à supprimer du disque"""
+    ids = [row.id for row in rows]
+    files = db.session.query(FormFile.filename, FormFile.file_size).filter(FormFile.response_id.in_(ids)).all()
+    removed = [f.filename for f in files]
+    freed = sum(f.file_size or 0 for f in files)
+    changes = []
+    for row in rows:
+        data = anonymized_data(row.response_data, keys)
+        if data != row.response_data:
+            changes.append({'id': row.id, 'response_data': data})
+            removed.extend(response_file_names(row.response_data))
+            freed += response_file_bytes(row.response_data) - response_file_bytes(data)
+
+    # Mises à jour en masse: seuls les octets des fichiers changent dans les compteurs
+    FormResponse.query.filter(FormResponse.id.in_(ids)).update(dict.fromkeys(PERSONAL_COLUMNS), synchronize_session=False)
+    if changes:
+        db.session.execute(update(FormResponse), changes)
+    FormFile.query.filter(FormFile.response_id.in_(ids)).delete(synchronize_session=False)
+    ResponseFieldValue.query.filter(
+        ResponseFieldValue.response_id.in_(ids), ResponseFieldValue.field_id.in_(keys)
+    ).delete(synchronize_session=False)
+    if freed:
+        apply_counter_deltas(shard_connection(), {form.id: [0, -freed, None]})
+    return removed
+
+
+def _delete_batch(rows):
+    """Supprimer un lot de réponses actives; renvoie les fichiers à supprimer du disque"""
+    ids = [row.id for row in rows]
+    removed = [name for (name,) in db.session.query(FormFile.filename).filter(FormFile.response_id.in_(ids))]
+    for row in rows:
+        removed.extend(response_file_names(row.response_data))
+    EmailLog.query.filter(EmailLog.response_id.in_(ids)).delete(synchronize_session=False)
+    # Suppression par l'ORM: fichiers et index en cascade, compteurs, statistiques, séries et recherche à jour
+    for response in FormResponse.query.filter(FormResponse.id.in_(ids)).all():
+        db.session.delete(response)
+    return removed
+
+
+def _forget_archived(form_id, rows):
+    """Retirer des compteurs, statistiques, séries et de la recherche des réponses archivées supprimées"""
+    connection = shard_connection()
+    freed = sum(response_file_bytes(data.get('response_data')) for data in rows)
+    # Dernière soumission restante (le bloc réécrit est déjà en session)
+    apply_counter_deltas(connection, {form_id: [-len(rows), -freed, None]},
+                         {form_id: remaining_last_submission(db.session, form_id)})
+    stats, series = Counter(), Counter()
+    for data in rows:
+        stats.subtract(response_stat_keys(data['submitted_at']))
+        series.subtract(rollup_keys(data['form_id'], data['user_id'], data['submitted_at']))
+    apply_stat_deltas(connection, {name: value for name, value in stats.items() if value})
+    apply_rollup_deltas(connection, {key: value for key, value in series.items() if value})
+    remove_documents(search_connection(), [data['id'] for data in rows])
+
+
+def _apply_to_archives(form, keys, since, cutoff, upload_folder, pause):
+    blocks = db.session.query(ResponseArchive.id).filter(
+        ResponseArchive.form_id == form.id, ResponseArchive.period_start < cutoff
+    )
+    if since is not None:
+        blocks = blocks.filter(ResponseArchive.period_end >= since)
+
+    count = 0
+    for (archive_id,) in blocks.order_by(ResponseArchive.period_start).all():
+        kept, expired, removed, changed = [], [], [], False
+        freed = 0  # Octets décrits dans response_data (ceux des réponses supprimées: voir _forget_archived)
+        for data in iter_archived_data(archive_id=archive_id):
+            if data['submitted_at'] >= cutoff:
+                kept.append(data)
+                continue
+            removed.extend(response_file_names(data.get('response_data')))
+            if form.retention_action == 'delete':
+                expired.append(data)
+                continue
+            anonymized = dict(data, response_data=anonymized_data(data.get('response_data'), keys),
+                              **dict.fromkeys(PERSONAL_COLUMNS))
+            if anonymized != data:
+                changed = True
+                freed += response_file_bytes(data.get('response_data')) - response_file_bytes(anonymized['response_data'])
+                count += 1
+            kept.append(anonymized)
+        if not (changed or expired):
+            continue
+
+        rewrite_archive_block(archive_id, kept)
+        if removed:
+            # Fichiers des réponses archivées (FormFile détachés de la réponse à l'archivage)
+            files = FormFile.query.filter(FormFile.form_id == form.id, FormFile.filename.in_(removed))
+            freed += files.with_entities(func.coalesce(func.sum(FormFile.file_size), 0)).scalar()
+            files.delete(synchronize_session=False)
+        if freed:
+            apply_counter_deltas(shard_connection(), {form.id: [0, -freed, None]})
+        if expired:
+            _forget_archived(form.id, expired)
+            count += len(expired)
+        db.session.commit()
+        invalidate_form_clusters(form.id)
+        for filename in removed:
+            delete_upload(upload_folder, filename)
+        time.sleep(pause)
+    return count
+
+
+def apply_form_retention(form, now=None, batch_size=200, pause=0.0):
+    """
+    Appliquer la règle de conservation d'un formulaire
+
+    Args:
+        form (Form): Formulaire (retention_days renseigné)
+        now (datetime): Date de référence (maintenant par défaut)
+        batch_size (int): Nombre de réponses par transaction
+        pause (float): Pause (secondes) entre deux lots
+
+    Returns:
+        int: Nombre de réponses anonymisées ou supprimées
+    """
+    cutoff = cutoff_for(form, now)
+    if cutoff is None:
+        return 0
+    if form.retention_action not in RETENTION_ACTIONS:
+        raise ValueError(f"Action de conservation inconnue: {form.retention_action}")
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    keys = personal_field_keys(form.form_data)
+    since = form.retention_applied_until
+
+    # Réponses et archives dans la base du formulaire (app/utils/shards.py)
+    with use_shard(form.shard):
+        count = _apply_to_archives(form, keys, since, cutoff, upload_folder, pause)
+
+        query = db.session.query(FormResponse.id, FormResponse.submitted_at, FormResponse.response_data).filter(
+            FormResponse.form_id == form.id, FormResponse.submitted_at < cutoff
+        )
+        if since is not None:
+            query = query.filter(FormResponse.submitted_at >= since)
+        position = None
+        while True:
+            batch = query
+            if position is not None and form.retention_action == 'anonymize':
+                batch = batch.filter(tuple_(FormResponse.submitted_at, FormResponse.id) > tuple_(*position))
+            rows = batch.order_by(FormResponse.submitted_at, FormResponse.id).limit(batch_size).all()
+            if not rows:
+                break
+            if form.retention_action == 'delete':
+                removed = _delete_batch(rows)
+            else:
+                removed = _anonymize_batch(form, keys, rows)
+            position = (rows[-1].submitted_at, rows[-1].id)
+            # Reprise au passage suivant à partir du dernier lot validé
+            form.retention_applied_until = rows[-1].submitted_at
+            db.session.commit()
+            # Positions effacées par UPDATE en masse (sans les écouteurs): tuiles de la carte à recalculer
+            invalidate_form_clusters(form.id)
+            for filename in removed:
+                delete_upload(upload_folder, filename)
+            count += len(rows)
+            time.sleep(pause)
+
+    form.retention_applied_until = cutoff
+    db.session.commit()
+    return count
+
+
+def apply_retention(form_id=None, now=None, batch_size=200, pause=0.0):
+    """
+    Appliquer les règles de conservation (d'un formulaire ou de tous ceux qui en ont une)
+
+    Args:
+        form_id (int): Identifiant du formulaire, ou None pour tous
+        now (datetime): Date de référence (maintenant par défaut)
+        batch_size (int): Nombre de réponses par transaction
+        pause (float): Pause (secondes) entre deux lots
+
+    Returns:
+        int: Nombre de réponses anonymisées ou supprimées
+    """
+    query = Form.query.filter(Form.retention_days.isnot(None))
+    if form_id is not None:
+        query = query.filter(Form.id == form_id)
+    count = 0
+    for form in query.order_by(Form.id).all():
+        count += apply_form_retention(form, now, batch_size=batch_size, pause=pause)
+    return count
@@ -0,0 +1,237 @@
+"""
+Séries temporelles des soumissions (agrégats par heure et par jour)
+
+Chaque soumission incrémente, dans la transaction qui l'enregistre, trois
+compteurs de submission_rollups: l'heure et le jour du formulaire (tous
+répondants, user_id = 0) et le jour du répondant s'il est connecté. Les
+courbes se lisent donc sur quelques centaines de lignes d'agrégats, jamais
+sur form_responses, même sur des années de données.
+
+Les agrégats horaires ne servent qu'aux vues récentes: « flask
+compact-rollups » supprime ceux plus anciens que ROLLUP_HOURLY_RETENTION_DAYS
+(les agrégats journaliers sont conservés). « flask rebuild-rollups »
+recalcule tout depuis les réponses.
+
+Les agrégats d'un formulaire placé dans un shard (app/utils/shards.py) sont
+dans la base du shard, avec ses réponses; ils se lisent avec le shard du
+formulaire comme shard courant (celui de la requête).
+"""
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+
+from app import db
+from app.models import FormResponse, SubmissionRollup, User
+from app.utils.archive import iter_archived_data
+from app.utils.database import read_session, shard_connection, upsert_insert
+from app.utils.shard_routing import each_shard
+
+GRANULARITIES = ('hour', 'day', 'month')
+ALL_USERS = 0
+MAX_POINTS = 2000
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _day(moment):
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _month(moment):
+    return _day(moment).replace(day=1)
+
+
+def rollup_keys(form_id, user_id, submitted_at):
+    """Compteurs (form_id, user_id, granularité, début) touchés par une soumission"""
+    keys = [(form_id, ALL_USERS, 'hour', _hour(submitted_at)), (form_id, ALL_USERS, 'day', _day(submitted_at))]
+    if user_id:
+        keys.append((form_id, user_id, 'day', _day(submitted_at)))
+    return keys
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_rollup_deltas(session, flush_context):
+    deltas = Counter()
+    for obj in session.new:
+        if isinstance(obj, FormResponse) and obj.submitted_at is not None:
+            deltas.update(rollup_keys(obj.form_id, obj.user_id, obj.submitted_at))
+    for obj in session.deleted:
+        if isinstance(obj, FormResponse) and obj.submitted_at is not None:
+            deltas.subtract(rollup_keys(obj.form_id, obj.user_id, obj.submitted_at))
+    deltas = {key: value for key, value in deltas.items() if value}
+    if deltas:
+        apply_rollup_deltas(shard_connection(session), deltas)
+
+
+def apply_rollup_deltas(connection, deltas):
+    """
+    Ajouter des variations aux agrégats (création des lignes manquantes pour les ajouts)
+
+    Args:
+        connection: Connexion SQLAlchemy vers la base des réponses (voir shard_connection)
+        deltas (dict): Variation par clé (form_id, user_id, granularité, début)
+    """
+    table = SubmissionRollup.__table__
+    insert = upsert_insert(connection)
+    for (form_id, user_id, granularity, bucket), delta in sorted(deltas.items()):
+        key = dict(form_id=form_id, user_id=user_id, granularity=granularity, bucket=bucket)
+        condition = [table.c[name] == value for name, value in key.items()]
+        if delta < 0:
+            # Réponse supprimée: jamais de ligne négative (agrégat horaire ancien déjà compacté)
+            connection.execute(table.update().where(*condition).values(count=table.c.count + delta))
+            continue
+        if insert is not None:
+            statement = insert(table).values(count=delta, **key)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=[table.c.form_id, table.c.user_id, table.c.granularity, table.c.bucket],
+                set_={'count': table.c.count + statement.excluded.count}
+            ))
+            continue
+        result = connection.execute(table.update().where(*condition).values(count=table.c.count + delta))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(count=delta, **key))
+
+
+def _steps(start, end, granularity):
+    """Débuts des intervalles entre start et end (inclus)"""
+    current = {'hour': _hour, 'day': _day, 'month': _month}[granularity](start)
+    while current <= end:
+        yield current
+        if granularity == 'hour':
+            current += timedelta(hours=1)
+        elif granularity == 'day':
+            current += timedelta(days=1)
+        else:
+            current = (current + timedelta(days=32)).replace(day=1)
+
+
+def submission_series(form_id, granularity, start, end, user_id=None):
+    """
+    Nombre de soumissions par intervalle, lu dans les agrégats
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        granularity (str): 'hour', 'day' ou 'month' (somme des jours)
+        start, end (datetime): Période (UTC)
+        user_id (int): Répondant (séries journalières et mensuelles), ou None pour tous
+
+    Returns:
+        list: Tuples (début de l'intervalle, nombre), intervalles vides compris
+
+    Raises:
+        ValueError: Granularité inconnue, série par heure d'un répondant ou trop de points
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularité inconnue: {granularity}")
+    if granularity == 'hour' and user_id:
+        raise ValueError("Les séries par répondant sont journalières ou mensuelles.")
+    buckets = list(_steps(start, end, granularity))
+    if len(buckets) > MAX_POINTS:
+        raise ValueError(f"Période trop longue pour cette granularité (maximum {MAX_POINTS} points).")
+    if not buckets:
+        return []
+
+    stored = 'hour' if granularity == 'hour' else 'day'
+    counts = Counter()
+    rows = read_session().query(SubmissionRollup.bucket, SubmissionRollup.count).filter(
+        SubmissionRollup.form_id == form_id,
+        SubmissionRollup.user_id == (user_id or ALL_USERS),
+        SubmissionRollup.granularity == stored,
+        SubmissionRollup.bucket >= buckets[0],
+        SubmissionRollup.bucket <= end
+    )
+    for bucket, count in rows:
+        counts[_month(bucket) if granularity == 'month' else bucket] += count
+    return [(bucket, counts.get(bucket, 0)) for bucket in buckets]
+
+
+def top_respondents(form_id, start, end, limit=10):
+    """
+    Répondants connectés les plus actifs sur une période, lus dans les agrégats journaliers
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        start, end (datetime): Période (UTC)
+        limit (int): Nombre de répondants
+
+    Returns:
+        list: Tuples (user_id, nom d'utilisateur, nombre de soumissions)
+    """
+    total = func.sum(SubmissionRollup.count)
+    rows = read_session().query(SubmissionRollup.user_id, total).filter(
+        SubmissionRollup.form_id == form_id,
+        SubmissionRollup.user_id != ALL_USERS,
+        SubmissionRollup.granularity == 'day',
+        SubmissionRollup.bucket >= _day(start),
+        SubmissionRollup.bucket <= end
+    ).group_by(SubmissionRollup.user_id).order_by(total.desc(), SubmissionRollup.user_id).limit(limit).all()
+    # Noms lus à part: les agrégats peuvent être dans un shard, les utilisateurs dans la base principale
+    names = dict(db.session.query(User.id, User.username).filter(User.id.in_([user_id for user_id, _ in rows])))
+    return [(user_id, names[user_id], count) for user_id, count in rows if user_id in names]
+
+
+def rebuild_rollups(form_id=None, batch_size=5000):
+    """
+    Recalculer les agrégats depuis les réponses (actives et archivées)
+
+    Args:
+        form_id (int): Identifiant du formulaire, ou None pour tous
+        batch_size (int): Nombre de réponses lues par requête
+
+    Returns:
+        int: Nombre de lignes d'agrégats écrites
+    """
+    rollups = SubmissionRollup.query
+    responses = db.session.query(FormResponse.id, FormResponse.form_id, FormResponse.user_id, FormResponse.submitted_at)
+    if form_id is not None:
+        rollups = rollups.filter(SubmissionRollup.form_id == form_id)
+        responses = responses.filter(FormResponse.form_id == form_id)
+
+    written = 0
+    # Agrégats de chaque base recalculés depuis ses réponses
+    for _ in each_shard():
+        counts = Counter()
+        last_id = 0
+        while True:
+            rows = responses.filter(FormResponse.id > last_id).order_by(FormResponse.id).limit(batch_size).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+            for row in rows:
+                if row.submitted_at is not None:
+                    counts.update(rollup_keys(row.form_id, row.user_id, row.submitted_at))
+        for data in iter_archived_data(form_id):
+            counts.update(rollup_keys(data['form_id'], data['user_id'], data['submitted_at']))
+
+        rollups.delete(synchronize_session=False)
+        mappings = [dict(form_id=f, user_id=u, granularity=g, bucket=b, count=c) for (f, u, g, b), c in counts.items()]
+        for i in range(0, len(mappings), batch_size):
+            db.session.bulk_insert_mappings(SubmissionRollup, mappings[i:i + batch_size])
+        db.session.commit()
+        written += len(mappings)
+    return written
+
+
+def compact_rollups(retention_days):
+    """
+    Supprimer les agrégats horaires anciens (les agrégats journaliers restent)
+
+    Args:
+        retention_days (int): Ancienneté (jours) au-delà de laquelle les heures sont supprimées
+
+    Returns:
+        int: Nombre de lignes supprimées
+    """
+    cutoff = _day(datetime.utcnow() - timedelta(days=retention_days))
+    deleted = 0
+    for _ in each_shard():
+        deleted += SubmissionRollup.query.filter(
+            SubmissionRollup.granularity == 'hour',
+            SubmissionRollup.bucket < cutoff
+        ).delete(synchronize_session=False)
+        db.session.commit()
+    return deleted
@@ -0,0 +1,355 @@
+"""
+Recherche plein texte dans les réponses
+
+Les réponses aux champs texte d'un formulaire sont indexées dans la table
+response_search: une table virtuelle FTS5 sous SQLite, une table avec une
+colonne tsvector (index GIN) sous PostgreSQL. Le texte est normalisé en
+Python avant l'indexation comme avant la recherche (minuscules, accents
+retirés, mots vides ignorés, racinisation légère du français), si bien que
+« Réparées », « reparee » et « réparer » se retrouvent, quel que soit le
+moteur.
+
+L'index est tenu à jour dans la transaction de l'écriture: les réponses
+ajoutées ou supprimées par l'ORM sont indexées ou retirées après chaque
+flush. Le formulaire fait partie du document indexé (jeton f<id>) pour que
+la recherche dans un formulaire reste un parcours d'index, même avec des
+millions de réponses au total.
+"""
+import re
+import unicodedata
+
+from sqlalchemy import DDL, event, select, text
+from sqlalchemy.orm import Session, selectinload
+
+from app import db
+from app.models import Form, FormResponse
+from app.utils.archive import get_archived_responses
+from app.utils.database import shard_connection
+from app.utils.helpers import field_names, response_value
+from app.utils.shard_routing import use_shard
+
+# Types de champs dont la réponse est un texte libre ou un choix
+TEXT_FIELD_TYPES = ('text', 'textarea', 'email', 'select', 'radio')
+MAX_QUERY_TERMS = 12
+
+STOP_WORDS = frozenset((
+    'a', 'au', 'aux', 'avec', 'ce', 'ces', 'dans', 'de', 'des', 'du', 'elle', 'en', 'et', 'il', 'ils',
+    'je', 'la', 'le', 'les', 'leur', 'lui', 'ma', 'mais', 'me', 'mes', 'ne', 'nous', 'on', 'ou', 'par',
+    'pas', 'pour', 'qu', 'que', 'qui', 'sa', 'se', 'ses', 'son', 'sur', 'ta', 'te', 'tes', 'toi', 'ton',
+    'tu', 'un', 'une', 'vos', 'votre', 'vous', 'y'
+))
+
+_WORD_RE = re.compile(r'\w+')
+
+SQLITE_SEARCH_TABLE = "CREATE VIRTUAL TABLE IF NOT EXISTS response_search USING fts5(form, document, tokenize='unicode61')"
+
+# Création de la table d'index avec db.create_all (la migration fait de même, app/utils/shards.py dans chaque shard)
+event.listen(db.metadata, 'after_create', DDL(SQLITE_SEARCH_TABLE).execute_if(dialect='sqlite'))
+event.listen(db.metadata, 'after_create', DDL(
+    "CREATE TABLE IF NOT EXISTS response_search ("
+    "response_id INTEGER PRIMARY KEY, "  # Sans clé étrangère: les réponses archivées restent indexées
+    "form_id INTEGER NOT NULL, document TSVECTOR NOT NULL);"
+    "CREATE INDEX IF NOT EXISTS ix_response_search_document ON response_search USING GIN (document)"
+).execute_if(dialect='postgresql'))
+event.listen(db.metadata, 'before_drop', DDL("DROP TABLE IF EXISTS response_search"))
+
+
+def fold(value):
+    """
+    Minuscules sans accents (« Élagué » → « elague »)
+
+    Args:
+        value (str): Texte
+
+    Returns:
+        str: Texte replié
+    """
+    value = value.lower().replace('œ', 'oe').replace('æ', 'ae')
+    return ''.join(c for c in unicodedata.normalize('NFKD', value) if not unicodedata.combining(c))
+
+
+def stem(word):
+    """
+    Racinisation légère du français (pluriels, formes en -e, -er, -é)
+
+    Args:
+        word (str): Mot replié (voir fold)
+
+    Returns:
+        str: Racine du mot
+    """
+    if len(word) > 4 and word.endswith('aux'):
+        return word[:-3] + 'al'
+    if len(word) > 3 and word[-1] in 'sx':
+        word = word[:-1]
+    if len(word) > 4 and word.endswith('r'):
+        word = word[:-1]
+    for _ in range(2):
+        if len(word) > 4 and word.endswith('e'):
+            word = word[:-1]
+    if len(word) > 4 and word[-1] == word[-2] and word[-1].isalpha():
+        word = word[:-1]
+    return word
+
+
+def tokenize(value):
+    """
+    Jetons indexés d'un texte
+
+    Args:
+        value (str): Texte libre
+
+    Returns:
+        list: Racines des mots, mots vides exclus
+    """
+    return [stem(word) for word in _WORD_RE.findall(fold(value)) if word not in STOP_WORDS]
+
+
+def _form_token(form_id):
+    return f'f{form_id}'
+
+
+def text_field_ids(form_data):
+    """
+    Identifiants des champs texte d'un formulaire
+
+    Args:
+        form_data (list): Structure des champs du formulaire
+
+    Returns:
+        list: Identifiants des champs dont la réponse est indexée
+    """
+    return [f['id'] for f in (form_data or []) if isinstance(f, dict) and f.get('id') and f.get('type') in TEXT_FIELD_TYPES]
+
+
+def response_document(field_ids, response_data, names=None):
+    """
+    Document indexé d'une réponse
+
+    Args:
+        field_ids (list): Champs texte du formulaire
+        response_data (dict): Données de la réponse
+        names (dict): Nom par identifiant (voir field_names): valeurs des réponses de l'API, enregistrées par nom
+
+    Returns:
+        str: Jetons séparés par des espaces (vide si rien à indexer)
+    """
+    if not isinstance(response_data, dict):
+        return ''
+    names = names or {}
+    tokens = []
+    for field_id in field_ids:
+        value = response_value(response_data, field_id, names)
+        if isinstance(value, str):
+            tokens.extend(tokenize(value))
+    return ' '.join(tokens)
+
+
+def search_connection(session=None):
+    """
+    Connexion de la transaction en cours vers la base des réponses (celle du shard courant, comme l'index)
+
+    Args:
+        session (Session): Session (db.session par défaut)
+
+    Returns:
+        Connection: Connexion SQLAlchemy
+    """
+    return shard_connection(session)
+
+
+def _is_postgresql(connection):
+    return connection.dialect.name == 'postgresql'
+
+
+def index_documents(connection, documents):
+    """
+    Indexer des réponses (remplace leur document s'il existe)
+
+    Args:
+        connection: Connexion SQLAlchemy (celle de la transaction en cours)
+        documents (list): Tuples (response_id, form_id, document)
+    """
+    rows = [{'id': response_id, 'form': _form_token(form_id), 'form_id': form_id, 'document': document}
+            for response_id, form_id, document in documents if document]
+    if not rows:
+        return
+    if _is_postgresql(connection):
+        connection.execute(text(
+            "INSERT INTO response_search (response_id, form_id, document) "
+            "VALUES (:id, :form_id, to_tsvector('simple', :document)) "
+            "ON CONFLICT (response_id) DO UPDATE SET form_id = EXCLUDED.form_id, document = EXCLUDED.document"
+        ), rows)
+    else:
+        connection.execute(text(
+            "INSERT OR REPLACE INTO response_search (rowid, form, document) VALUES (:id, :form, :document)"
+        ), rows)
+
+
+def remove_documents(connection, response_ids):
+    """
+    Retirer des réponses de l'index
+
+    Args:
+        connection: Connexion SQLAlchemy
+        response_ids (list): Identifiants des réponses
+    """
+    if not response_ids:
+        return
+    column = 'response_id' if _is_postgresql(connection) else 'rowid'
+    connection.execute(text(f"DELETE FROM response_search WHERE {column} = :id"), [{'id': i} for i in response_ids])
+
+
+def remove_form_documents(connection, form_id):
+    """
+    Retirer de l'index toutes les réponses d'un formulaire (actives et archivées)
+
+    Args:
+        connection: Connexion SQLAlchemy
+        form_id (int): Identifiant du formulaire
+    """
+    if _is_postgresql(connection):
+        connection.execute(text("DELETE FROM response_search WHERE form_id = :form_id"), {'form_id': form_id})
+    else:
+        connection.execute(text(
+            "DELETE FROM response_search WHERE rowid IN "
+            "(SELECT rowid FROM response_search WHERE response_search MATCH :query)"
+        ), {'query': f'form:{_form_token(form_id)}'})
+
+
+@event.listens_for(Session, 'after_flush')
+def _index_flushed_responses(session, flush_context):
+    fields = {}  # Champs texte et noms des champs par formulaire, pour ce flush
+    documents, removed = [], []
+    for obj in session.new:
+        if isinstance(obj, FormResponse):
+            if obj.form_id not in fields:
+                form_data = session.execute(select(Form.form_data).where(Form.id == obj.form_id)).scalar()
+                fields[obj.form_id] = (text_field_ids(form_data), field_names(form_data))
+            field_ids, names = fields[obj.form_id]
+            documents.append((obj.id, obj.form_id, response_document(field_ids, obj.response_data, names)))
+    for obj in session.deleted:
+        if isinstance(obj, FormResponse):
+            removed.append(obj.id)
+    if documents or removed:
+        connection = search_connection(session)
+        remove_documents(connection, removed)
+        index_documents(connection, documents)
+
+
+def _match_expression(query):
+    """Requête FTS5: tous les termes requis"""
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    return ' '.join(f'"{term}"' for term in terms) if terms else None
+
+
+def _tsquery(query):
+    """Requête tsquery: tous les termes requis"""
+    terms = tokenize(query)[:MAX_QUERY_TERMS]
+    return ' & '.join(terms) if terms else None
+
+
+def search_response_ids(form_id, query, page=1, per_page=20, filters=(), session=None):
+    """
+    Rechercher dans les réponses d'un formulaire
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        query (str): Texte recherché
+        page (int): Page de résultats (à partir de 1)
+        per_page (int): Résultats par page
+        filters (list): Tuples (field_id, valeur) sur des champs indexés, tous requis
+        session (Session): Session de lecture (db.session par défaut)
+
+    Returns:
+        tuple: (identifiants des réponses par pertinence décroissante, True s'il y a une page suivante)
+    """
+    connection = search_connection(session)
+    postgresql = _is_postgresql(connection)
+    expression = _tsquery(query) if postgresql else _match_expression(query)
+    if expression is None:
+        return [], False
+
+    id_column = 'response_id' if postgresql else 'rowid'
+    params = {'query': expression, 'form_id': form_id, 'limit': per_page + 1, 'offset': (max(page, 1) - 1) * per_page}
+    # Filtres sur champs indexés: sous-requêtes sur l'index response_field_values
+    restrictions = ''
+    for i, (field_id, value) in enumerate(filters):
+        restrictions += (f" AND {id_column} IN (SELECT response_id FROM response_field_values "
+                         f"WHERE form_id = :form_id AND field_id = :field_{i} AND value = :value_{i})")
+        params[f'field_{i}'], params[f'value_{i}'] = field_id, value
+
+    if postgresql:
+        sql = ("SELECT response_id FROM response_search, to_tsquery('simple', :query) AS q "
+               f"WHERE form_id = :form_id AND document @@ q{restrictions} "
+               "ORDER BY ts_rank(document, q) DESC, response_id DESC LIMIT :limit OFFSET :offset")
+    else:
+        params['query'] = f'form:{_form_token(form_id)} AND document:({expression})'
+        sql = ("SELECT rowid FROM response_search "
+               f"WHERE response_search MATCH :query{restrictions} "
+               "ORDER BY bm25(response_search, 0.0, 1.0), rowid DESC LIMIT :limit OFFSET :offset")
+    rows = connection.execute(text(sql), params).scalars().all()
+    return rows[:per_page], len(rows) > per_page
+
+
+def search_responses(form_id, query, page=1, per_page=20, filters=(), session=None):
+    """
+    Réponses d'un formulaire correspondant à une recherche, par pertinence
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        query (str): Texte recherché
+        page (int): Page de résultats (à partir de 1)
+        per_page (int): Résultats par page
+        filters (list): Tuples (field_id, valeur) sur des champs indexés
+        session (Session): Session de lecture (db.session par défaut)
+
+    Returns:
+        tuple: (liste de FormResponse, True s'il y a une page suivante)
+    """
+    session = session or db.session
+    ids, has_next = search_response_ids(form_id, query, page, per_page, filters, session=session)
+    if not ids:
+        return [], has_next
+    responses = session.query(FormResponse).options(selectinload(FormResponse.responder)).filter(FormResponse.id.in_(ids))
+    by_id = {r.id: r for r in responses}
+    missing = [i for i in ids if i not in by_id]
+    if missing:
+        # Réponses archivées: toujours indexées, relues dans leur bloc
+        by_id.update(get_archived_responses(form_id, missing, session=session))
+    return [by_id[i] for i in ids if i in by_id], has_next
+
+
+def rebuild_search_index(form_id=None, batch_size=1000):
+    """
+    Reconstruire l'index de recherche (d'un formulaire ou de tous)
+
+    Args:
+        form_id (int): Identifiant du formulaire, ou None pour tous
+        batch_size (int): Nombre de réponses traitées par transaction
+
+    Returns:
+        int: Nombre de réponses indexées
+    """
+    forms = db.session.query(Form.id, Form.form_data, Form.shard)
+    if form_id is not None:
+        forms = forms.filter(Form.id == form_id)
+
+    count = 0
+    for form in forms.all():
+        field_ids, names = text_field_ids(form.form_data), field_names(form.form_data)
+        query = db.session.query(FormResponse.id, FormResponse.response_data).filter(FormResponse.form_id == form.id)
+        last_id = 0
+        with use_shard(form.shard):
+            while True:
+                rows = query.filter(FormResponse.id > last_id).order_by(FormResponse.id).limit(batch_size).all()
+                if not rows:
+                    break
+                last_id = rows[-1].id
+                connection = search_connection()
+                remove_documents(connection, [row.id for row in rows])
+                documents = [(row.id, form.id, response_document(field_ids, row.response_data, names)) for row in rows]
+                index_documents(connection, documents)
+                db.session.commit()
+                count += sum(1 for document in documents if document[2])
+    return count
@@ -0,0 +1,102 @@
+"""
+Routage des requêtes vers les bases de réponses (shards)
+
+Ce module ne dépend pas de l'application: la classe de session est passée à
+SQLAlchemy() à sa création (voir app/__init__.py et app/utils/shards.py).
+
+Le shard courant est une variable de contexte (un par requête, par thread
+d'écriture, par tâche): quand il est défini, les requêtes sur les tables des
+réponses et de leurs agrégats (SHARDED_TABLES) partent vers sa base, les
+autres (utilisateurs, formulaires, partages...) vers la base principale.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import sqlalchemy as sa
+from flask import current_app
+from flask_sqlalchemy.session import Session
+
+# Tables des données de réponses et de leurs agrégats (compteurs, statistiques, séries),
+# stockées dans la base du shard du formulaire
+SHARDED_TABLES = frozenset((
+    'form_responses', 'form_files', 'email_logs', 'response_field_values', 'response_archives',
+    'form_counters', 'admin_stats', 'submission_rollups'
+))
+
+_current_shard = ContextVar('current_shard', default=None)
+
+
+def shard_bind_key(name):
+    """Clé de SQLALCHEMY_BINDS de la base d'un shard"""
+    return f'shard:{name}'
+
+
+def current_shard():
+    """Shard courant (None: base principale)"""
+    return _current_shard.get()
+
+
+@contextmanager
+def use_shard(name):
+    """
+    Router les requêtes sur les réponses vers la base d'un shard (None: base principale)
+
+    Args:
+        name (str): Nom du shard
+    """
+    token = _current_shard.set(name)
+    try:
+        yield name
+    finally:
+        _current_shard.reset(token)
+
+
+def shard_names(app=None):
+    """
+    Noms des shards déclarés (DATABASE_SHARDS)
+
+    Args:
+        app (Flask): Application (l'application courante par défaut)
+
+    Returns:
+        list: Noms des shards, dans l'ordre de la configuration
+    """
+    names = (app or current_app).config.get('DATABASE_SHARDS') or ''
+    if isinstance(names, str):
+        names = names.split(',')
+    return [name.strip() for name in names if name.strip()]
+
+
+def each_shard():
+    """
+    Parcourir la base principale puis chaque shard, le shard parcouru devenant le shard courant
+
+    Yields:
+        str: Nom du shard (None pour la base principale)
+    """
+    for name in [None] + shard_names():
+        with use_shard(name):
+            yield name
+
+
+def _is_sharded(mapper, clause):
+    if mapper is not None:
+        return sa.inspect(mapper).local_table.name in SHARDED_TABLES
+    if isinstance(clause, sa.Table):
+        return clause.name in SHARDED_TABLES
+    table = getattr(clause, 'table', None)  # INSERT, UPDATE, DELETE
+    if isinstance(table, sa.Table):
+        return table.name in SHARDED_TABLES
+    if isinstance(clause, sa.Select):
+        return any(isinstance(t, sa.Table) and t.name in SHARDED_TABLES for t in clause.get_final_froms())
+    return False
+
+
+class RoutingSession(Session):
+    """Session de Flask-SQLAlchemy dont les tables des réponses suivent le shard courant"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        shard = current_shard()
+        if bind is None and shard is not None and _is_sharded(mapper, clause):
+            return self._db.engines[shard_bind_key(shard)]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
@@ -0,0 +1,203 @@
+"""
+Bases SQLite séparées pour les réponses (shards)
+
+Avec SQLite, tous les formulaires partagent un fichier et son verrou
+d'écriture: une campagne massive sur un formulaire ralentit les soumissions
+de tous les autres. Un formulaire peut donc être placé dans un shard, une
+base SQLite à part (DATABASE_SHARD_DIR/<nom>.db) qui reçoit ses réponses,
+fichiers, courriels, valeurs indexées, archives, son index de recherche et
+les agrégats de ses réponses: compteurs du formulaire (form_counters),
+statistiques (admin_stats) et séries (submission_rollups). Utilisateurs,
+formulaires, partages, brouillons et tâches restent dans la base principale.
+
+- Les shards sont déclarés par DATABASE_SHARDS; leur schéma est créé au
+  démarrage et enregistré dans database_shards. « flask assign-shard »
+  place un formulaire (sans réponses) dans un shard; plusieurs formulaires,
+  ceux d'une même organisation par exemple, peuvent partager un shard.
+- La session route les requêtes selon le shard courant
+  (app/utils/shard_routing.py): celui du formulaire de l'URL pour une
+  requête HTTP (form_id ou jeton de brouillon), form_shard() pour les
+  traitements d'un formulaire, each_shard() pour ceux qui parcourent toutes
+  les réponses.
+- Les identifiants d'un shard commencent à id << 40 (AUTOINCREMENT): une
+  réponse garde un identifiant unique sur l'ensemble des bases.
+- Une soumission n'écrit que dans le shard: réponse et agrégats sont validés
+  ensemble, sans prendre le verrou de la base principale. Les lectures
+  fusionnent: compteurs des formulaires (attach_form_counters), statistiques
+  (somme des bases), séries (lues dans le shard du formulaire).
+- Les traitements qui écrivent dans les deux bases (suppression d'un
+  formulaire, brouillon soumis) écrivent d'abord dans le shard, puis dans la
+  base principale: l'ordre de prise des verrous est le même partout. Les
+  deux commits se suivent, sans validation atomique commune.
+
+Chaque shard est un fichier que l'on sauvegarde à part (sqlite3 .backup).
+Les migrations Alembic ne portent que sur la base principale: une migration
+qui modifie une table des réponses doit aussi être appliquée aux shards.
+"""
+import os
+import re
+from contextlib import ExitStack, contextmanager
+
+from flask import g, request
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import make_url
+
+from app import db
+from app.models import DatabaseShard, Form, FormDraft, FormFile, FormResponse, ResponseArchive
+from app.utils.shard_routing import SHARDED_TABLES, shard_bind_key, shard_names, use_shard
+
+# Décalage des identifiants: 2^40 lignes par table et par shard
+ID_SHIFT = 40
+
+_NAME_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def configure_shards(app):
+    """
+    Déclarer les bases des shards dans SQLALCHEMY_BINDS (à appeler avant db.init_app)
+
+    Args:
+        app (Flask): Application
+
+    Raises:
+        ValueError: Nom de shard invalide, ou base principale autre que SQLite
+    """
+    names = shard_names(app)
+    if not names:
+        return
+    if make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name() != 'sqlite':
+        raise ValueError("Les shards de réponses ne sont disponibles qu'avec une base principale SQLite.")
+    folder = os.path.abspath(app.config.get('DATABASE_SHARD_DIR') or os.path.join(app.instance_path, 'shards'))
+    os.makedirs(folder, exist_ok=True)
+    binds = app.config.setdefault('SQLALCHEMY_BINDS', {})
+    for name in names:
+        if not _NAME_RE.match(name):
+            raise ValueError(f"Nom de shard invalide: {name} (lettres, chiffres, - et _)")
+        binds[shard_bind_key(name)] = f'sqlite:///{os.path.join(folder, name)}.db'
+
+
+def _id_tables():
+    """Tables du shard à identifiant entier (plage d'identifiants propre au shard)"""
+    return sorted(name for name in SHARDED_TABLES if 'id' in db.metadata.tables[name].c)
+
+
+def _shard_metadata():
+    """Copie du schéma, tables des réponses en AUTOINCREMENT (les autres ne servent qu'aux clés étrangères)"""
+    metadata = MetaData()
+    for table in db.metadata.sorted_tables:
+        copy = table.to_metadata(metadata)
+        if table.name in _id_tables():
+            copy.dialect_kwargs['sqlite_autoincrement'] = True
+    return metadata
+
+
+def create_shard_schema(name):
+    """
+    Enregistrer un shard et créer son schéma (sans effet sur un shard existant)
+
+    Args:
+        name (str): Nom du shard (déclaré dans DATABASE_SHARDS)
+
+    Returns:
+        DatabaseShard: Shard enregistré
+    """
+    from app.utils.search import SQLITE_SEARCH_TABLE
+
+    shard = DatabaseShard.query.filter_by(name=name).first()
+    if shard is None:
+        shard = DatabaseShard(name=name)
+        db.session.add(shard)
+        db.session.commit()
+
+    metadata = _shard_metadata()
+    with db.engines[shard_bind_key(name)].begin() as connection:
+        metadata.create_all(connection, tables=[metadata.tables[table] for table in sorted(SHARDED_TABLES)])
+        connection.execute(text(SQLITE_SEARCH_TABLE))
+        # Plage d'identifiants du shard: SQLite reprend après la plus grande valeur de sqlite_sequence
+        seeded = set(connection.execute(text("SELECT name FROM sqlite_sequence")).scalars())
+        for table in sorted(set(_id_tables()) - seeded):
+            connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"),
+                               {'name': table, 'seq': shard.id << ID_SHIFT})
+    return shard
+
+
+def form_shard_name(form_id):
+    """Shard d'un formulaire (None: base principale)"""
+    return db.session.query(Form.shard).filter(Form.id == form_id).execution_options(include_deleted=True).scalar()
+
+
+@contextmanager
+def form_shard(form_id):
+    """
+    Router les requêtes sur les réponses vers la base d'un formulaire
+
+    Args:
+        form_id (int): Identifiant du formulaire
+    """
+    with use_shard(form_shard_name(form_id)) as name:
+        yield name
+
+
+def assign_form_shard(form, name):
+    """
+    Placer un formulaire dans un shard, ou le ramener dans la base principale (name=None)
+
+    Les réponses ne sont pas déplacées d'une base à l'autre: seul un
+    formulaire sans réponses (actives, archivées ou fichiers) peut changer de
+    base. La modification est validée avec la transaction de l'appelant.
+
+    Args:
+        form (Form): Formulaire
+        name (str): Nom du shard, ou None
+
+    Raises:
+        ValueError: Shard non déclaré, ou formulaire ayant déjà des réponses
+    """
+    if name is not None and name not in shard_names():
+        raise ValueError(f"Shard non déclaré dans DATABASE_SHARDS: {name}")
+    with use_shard(form.shard):
+        has_data = any(
+            db.session.query(model.id).filter(model.form_id == form.id).first() is not None
+            for model in (FormResponse, ResponseArchive, FormFile)
+        )
+    if has_data:
+        raise ValueError("Le formulaire a déjà des réponses: elles ne sont pas déplacées d'une base à l'autre.")
+    form.shard = name
+
+
+def _request_shard(view_args):
+    if 'form_id' in view_args:
+        return form_shard_name(view_args['form_id'])
+    if 'token' in view_args:
+        # Routes des brouillons: le formulaire du brouillon
+        return db.session.query(Form.shard).join(FormDraft, FormDraft.form_id == Form.id).filter(
+            FormDraft.token == view_args['token']
+        ).scalar()
+    return None
+
+
+def init_shards(app):
+    """
+    Créer les schémas des shards déclarés et router chaque requête vers le shard de son formulaire
+
+    Args:
+        app (Flask): Application
+    """
+    names = shard_names(app)
+    if not names:
+        return
+    with app.app_context():
+        for name in names:
+            create_shard_schema(name)
+
+    @app.before_request
+    def _use_request_shard():
+        stack = ExitStack()
+        stack.enter_context(use_shard(_request_shard(request.view_args or {})))
+        g.shard_stack = stack
+
+    @app.teardown_request
+    def _leave_request_shard(exception=None):
+        stack = g.pop('shard_stack', None)
+        if stack is not None:
+            stack.close()
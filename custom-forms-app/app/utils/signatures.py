@@ -0,0 +1,354 @@
+"""
+Stockage vectoriel des signatures et rendu raster à la demande
+
+Le navigateur envoie la signature sous forme de traits (listes de points
+quantifiés au pixel, encodés en deltas) plutôt qu'un PNG en base64. Le serveur
+conserve ces traits dans un petit fichier binaire compressé (.sig) et génère
+les images à la résolution demandée par chaque consommateur (miniature,
+cellule Excel, email), avec un cache sur disque. Le PDF dessine directement
+les traits en vectoriel.
+"""
+import os
+import sys
+import json
+import struct
+import zlib
+from array import array
+
+from PIL import Image, ImageDraw
+
+from app.utils.helpers import generate_unique_filename
+
+# Préfixe des données envoyées par signature.js
+STROKES_PREFIX = 'strokes:'
+
+# En-tête du fichier binaire: magic, largeur, hauteur, nombre de traits
+SIGNATURE_MAGIC = b'SGV1'
+_HEADER = struct.Struct('<4sHHH')
+_STROKE_HEADER = struct.Struct('<H')
+
+SIGNATURE_EXTENSION = 'sig'
+SIGNATURE_FOLDER = 'signatures'
+CACHE_FOLDER = 'cache'
+
+# Limites pour refuser les charges utiles aberrantes
+MAX_CANVAS_SIZE = 4000
+MAX_STROKES = 500
+MAX_POINTS = 20000
+
+# Tailles de rendu prédéfinies (largeur, hauteur) par consommateur
+RENDER_SIZES = {
+    'thumb': (200, 100),
+    'excel': (150, 100),
+    'email': (400, 200),
+    'full': (800, 400),
+}
+
+# Facteur de suréchantillonnage pour l'anticrénelage
+_SUPERSAMPLE = 3
+_STROKE_WIDTH = 2
+
+
+def is_stroke_data(value):
+    """
+    Vérifier si une valeur de formulaire contient une signature vectorielle
+
+    Args:
+        value (str): Valeur brute envoyée par le navigateur
+
+    Returns:
+        bool: True si la valeur est au format traits
+    """
+    return isinstance(value, str) and value.startswith(STROKES_PREFIX)
+
+
+def is_vector_signature(value):
+    """
+    Vérifier si une valeur de réponse référence une signature vectorielle
+
+    Args:
+        value (dict): Valeur stockée dans response_data
+
+    Returns:
+        bool: True si la signature est stockée en traits
+    """
+    return isinstance(value, dict) and value.get('extension') == SIGNATURE_EXTENSION
+
+
+def parse_stroke_data(value):
+    """
+    Décoder la charge utile envoyée par signature.js
+
+    Le format est ``strokes:{"w":W,"h":H,"s":[[x0,y0,dx1,dy1,...],...]}``
+    où chaque trait commence par un point absolu suivi de deltas entiers.
+
+    Args:
+        value (str): Valeur brute du champ caché
+
+    Returns:
+        tuple: (largeur, hauteur, liste de traits en coordonnées absolues)
+    """
+    try:
+        payload = json.loads(value[len(STROKES_PREFIX):])
+        width = int(payload['w'])
+        height = int(payload['h'])
+        raw_strokes = payload['s']
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Format de signature invalide.")
+
+    if not (0 < width <= MAX_CANVAS_SIZE and 0 < height <= MAX_CANVAS_SIZE):
+        raise ValueError("Dimensions de signature invalides.")
+    if not isinstance(raw_strokes, list) or len(raw_strokes) > MAX_STROKES:
+        raise ValueError("Nombre de traits invalide.")
+
+    strokes = []
+    total_points = 0
+    for raw in raw_strokes:
+        if not isinstance(raw, list) or len(raw) < 2 or len(raw) % 2:
+            raise ValueError("Trait de signature invalide.")
+        total_points += len(raw) // 2
+        if total_points > MAX_POINTS:
+            raise ValueError("Signature trop volumineuse.")
+
+        # Les points hors du canvas (sortie de souris) sont ramenés au bord
+        x, y = int(raw[0]), int(raw[1])
+        points = [(min(max(x, 0), width), min(max(y, 0), height))]
+        for i in range(2, len(raw), 2):
+            x += int(raw[i])
+            y += int(raw[i + 1])
+            points.append((min(max(x, 0), width), min(max(y, 0), height)))
+        strokes.append(points)
+
+    return width, height, strokes
+
+
+def encode_strokes(width, height, strokes):
+    """
+    Encoder des traits dans le format binaire compressé
+
+    Args:
+        width (int): Largeur du canvas d'origine
+        height (int): Hauteur du canvas d'origine
+        strokes (list): Liste de traits (listes de tuples (x, y))
+
+    Returns:
+        bytes: Données compressées
+    """
+    parts = [_HEADER.pack(SIGNATURE_MAGIC, width, height, len(strokes))]
+    for points in strokes:
+        values = array('h')
+        last_x, last_y = 0, 0
+        for x, y in points:
+            values.append(x - last_x)
+            values.append(y - last_y)
+            last_x, last_y = x, y
+        if sys.byteorder == 'big':
+            values.byteswap()
+        parts.append(_STROKE_HEADER.pack(len(points)))
+        parts.append(values.tobytes())
+    return zlib.compress(b''.join(parts), 9)
+
+
+def decode_strokes(blob):
+    """
+    Décoder le format binaire compressé
+
+    Args:
+        blob (bytes): Contenu d'un fichier .sig
+
+    Returns:
+        tuple: (largeur, hauteur, liste de traits en coordonnées absolues)
+    """
+    data = zlib.decompress(blob)
+    magic, width, height, count = _HEADER.unpack_from(data, 0)
+    if magic != SIGNATURE_MAGIC:
+        raise ValueError("Fichier de signature invalide.")
+
+    offset = _HEADER.size
+    strokes = []
+    for _ in range(count):
+        (npoints,) = _STROKE_HEADER.unpack_from(data, offset)
+        offset += _STROKE_HEADER.size
+        values = array('h')
+        values.frombytes(data[offset:offset + npoints * 4])
+        if sys.byteorder == 'big':
+            values.byteswap()
+        offset += npoints * 4
+
+        x, y = 0, 0
+        points = []
+        for i in range(0, len(values), 2):
+            x += values[i]
+            y += values[i + 1]
+            points.append((x, y))
+        strokes.append(points)
+
+    return width, height, strokes
+
+
+def save_signature_strokes(value, upload_folder):
+    """
+    Sauvegarder une signature vectorielle envoyée par le navigateur
+
+    Args:
+        value (str): Valeur brute du champ caché (préfixe ``strokes:``)
+        upload_folder (str): Dossier d'upload
+
+    Returns:
+        dict: Métadonnées à stocker dans response_data
+    """
+    width, height, strokes = parse_stroke_data(value)
+    if not strokes:
+        return None
+
+    filename = generate_unique_filename(SIGNATURE_FOLDER, SIGNATURE_EXTENSION)
+    file_path = os.path.join(upload_folder, filename)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+
+    blob = encode_strokes(width, height, strokes)
+    with open(file_path, 'wb') as f:
+        f.write(blob)
+
+    return {
+        'filename': filename,
+        'size': len(blob),
+        'extension': SIGNATURE_EXTENSION,
+        'width': width,
+        'height': height
+    }
+
+
+def load_signature(upload_folder, filename):
+    """
+    Charger les traits d'une signature stockée
+
+    Args:
+        upload_folder (str): Dossier d'upload
+        filename (str): Chemin relatif du fichier .sig
+
+    Returns:
+        tuple: (largeur, hauteur, traits)
+    """
+    with open(os.path.join(upload_folder, filename), 'rb') as f:
+        return decode_strokes(f.read())
+
+
+def _fit(src_width, src_height, width, height):
+    """Calculer l'échelle et le décalage pour centrer la signature"""
+    scale = min(width / src_width, height / src_height)
+    offset_x = (width - src_width * scale) / 2
+    offset_y = (height - src_height * scale) / 2
+    return scale, offset_x, offset_y
+
+
+def get_render_path(upload_folder, filename, size):
+    """
+    Chemin du rendu PNG en cache pour une taille donnée
+
+    Args:
+        upload_folder (str): Dossier d'upload
+        filename (str): Chemin relatif du fichier .sig
+        size (str): Nom de la taille (voir RENDER_SIZES)
+
+    Returns:
+        str: Chemin absolu du PNG en cache
+    """
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(upload_folder, SIGNATURE_FOLDER, CACHE_FOLDER, f"{stem}_{size}.png")
+
+
+def render_signature(upload_folder, filename, size='thumb'):
+    """
+    Rasteriser une signature à la taille demandée, avec cache sur disque
+
+    Args:
+        upload_folder (str): Dossier d'upload
+        filename (str): Chemin relatif du fichier .sig
+        size (str): Nom de la taille (voir RENDER_SIZES)
+
+    Returns:
+        str: Chemin du PNG généré
+    """
+    if size not in RENDER_SIZES:
+        raise ValueError(f"Taille de rendu inconnue: {size}")
+
+    render_path = get_render_path(upload_folder, filename, size)
+    if os.path.exists(render_path):
+        return render_path
+
+    src_width, src_height, strokes = load_signature(upload_folder, filename)
+    width, height = RENDER_SIZES[size]
+
+    # Dessiner en suréchantillonné puis réduire pour lisser les traits
+    canvas_w, canvas_h = width * _SUPERSAMPLE, height * _SUPERSAMPLE
+    scale, offset_x, offset_y = _fit(src_width, src_height, canvas_w, canvas_h)
+    line_width = max(1, round(_STROKE_WIDTH * scale))
+
+    img = Image.new('RGB', (canvas_w, canvas_h), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    for points in strokes:
+        scaled = [(offset_x + x * scale, offset_y + y * scale) for x, y in points]
+        if len(scaled) == 1:
+            x, y = scaled[0]
+            r = line_width / 2
+            draw.ellipse((x - r, y - r, x + r, y + r), fill=(0, 0, 0))
+        else:
+            draw.line(scaled, fill=(0, 0, 0), width=line_width, joint='curve')
+
+    img = img.resize((width, height), Image.Resampling.LANCZOS)
+
+    os.makedirs(os.path.dirname(render_path), exist_ok=True)
+    tmp_path = f"{render_path}.{os.getpid()}.tmp"
+    img.save(tmp_path, 'PNG', optimize=True)
+    os.replace(tmp_path, render_path)
+    return render_path
+
+
+def signature_drawing(upload_folder, filename, width, height):
+    """
+    Construire un dessin vectoriel ReportLab de la signature pour les PDF
+
+    Args:
+        upload_folder (str): Dossier d'upload
+        filename (str): Chemin relatif du fichier .sig
+        width (float): Largeur cible en points
+        height (float): Hauteur cible en points
+
+    Returns:
+        Drawing: Flowable ReportLab
+    """
+    from reportlab.graphics.shapes import Drawing, PolyLine, Circle
+    from reportlab.lib import colors
+
+    src_width, src_height, strokes = load_signature(upload_folder, filename)
+    scale, offset_x, offset_y = _fit(src_width, src_height, width, height)
+    stroke_width = _STROKE_WIDTH * scale
+
+    drawing = Drawing(width, height)
+    for points in strokes:
+        # ReportLab a l'origine en bas à gauche: inverser l'axe Y
+        coords = []
+        for x, y in points:
+            coords.append(offset_x + x * scale)
+            coords.append(height - (offset_y + y * scale))
+        if len(points) == 1:
+            drawing.add(Circle(coords[0], coords[1], stroke_width / 2,
+                               fillColor=colors.black, strokeColor=None))
+        else:
+            drawing.add(PolyLine(coords, strokeColor=colors.black, strokeWidth=stroke_width,
+                                 strokeLineCap=1, strokeLineJoin=1))
+    return drawing
+
+
+def delete_signature_renders(upload_folder, filename):
+    """
+    Supprimer les rendus en cache d'une signature
+
+    Args:
+        upload_folder (str): Dossier d'upload
+        filename (str): Chemin relatif du fichier .sig
+    """
+    for size in RENDER_SIZES:
+        render_path = get_render_path(upload_folder, filename, size)
+        if os.path.exists(render_path):
+            os.remove(render_path)
@@ -0,0 +1,114 @@
+"""
+Requêtes spatiales sur les réponses géolocalisées
+
+Les réponses portent des colonnes typées (latitude, longitude) et un geohash
+indexé avec form_id. Un rectangle est traduit en quelques intervalles de
+geohash (parcours d'index) puis filtré exactement sur latitude/longitude;
+une recherche par rayon part du rectangle englobant du cercle et ne garde
+que les points à la bonne distance (haversine).
+"""
+from sqlalchemy import and_, or_
+
+from app import db
+from app.models import FormResponse
+from app.utils.geo import bbox_around, geohash_ranges, haversine_m, split_bbox
+
+# Colonnes renvoyées par les requêtes spatiales (pas de chargement des objets complets)
+_COLUMNS = (FormResponse.id, FormResponse.latitude, FormResponse.longitude, FormResponse.submitted_at)
+
+
+def _bound(column, low, high, exclude_high):
+    """Intervalle [low, high], ou [low, high[ si exclude_high"""
+    if exclude_high:
+        return and_(column >= low, column < high)
+    return column.between(low, high)
+
+
+def bbox_conditions(min_lat, min_lon, max_lat, max_lon, exclude_max_lat=False, exclude_max_lon=False):
+    """
+    Conditions SQL sélectionnant les réponses d'un rectangle
+
+    Les bornes sont incluses; un découpage en tuiles exclut la borne nord ou
+    est des tuiles voisines, pour qu'un point sur un bord commun ne soit
+    compté que dans une tuile.
+
+    Args:
+        min_lat, min_lon, max_lat, max_lon (float): Rectangle en degrés (min_lon <= max_lon)
+        exclude_max_lat (bool): Exclure la borne nord
+        exclude_max_lon (bool): Exclure la borne est
+
+    Returns:
+        list: Conditions à passer à Query.filter (intervalles de geohash puis filtre exact)
+    """
+    ranges = []
+    for start, end in geohash_ranges(min_lat, min_lon, max_lat, max_lon):
+        condition = FormResponse.geohash >= start
+        if end is not None:
+            condition = and_(condition, FormResponse.geohash < end)
+        ranges.append(condition)
+    return [
+        or_(*ranges),
+        _bound(FormResponse.latitude, min_lat, max_lat, exclude_max_lat),
+        _bound(FormResponse.longitude, min_lon, max_lon, exclude_max_lon)
+    ]
+
+
+def _bbox_query(form_id, min_lat, min_lon, max_lat, max_lon, conditions=()):
+    """Requête des réponses d'un rectangle qui ne traverse pas l'antiméridien"""
+    return db.session.query(*_COLUMNS).filter(
+        FormResponse.form_id == form_id,
+        *bbox_conditions(min_lat, min_lon, max_lat, max_lon),
+        *conditions
+    )
+
+
+def responses_in_bbox(form_id, min_lat, min_lon, max_lat, max_lon, limit=None, conditions=()):
+    """
+    Réponses d'un formulaire situées dans un rectangle
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        min_lat, min_lon, max_lat, max_lon (float): Rectangle en degrés
+            (min_lon > max_lon pour un rectangle qui traverse l'antiméridien)
+        limit (int): Nombre maximal de réponses
+        conditions (list): Conditions supplémentaires (ex: filtres sur champs indexés)
+
+    Returns:
+        list: Lignes (id, latitude, longitude, submitted_at), les plus récentes d'abord
+    """
+    rows = []
+    for bbox in split_bbox(min_lat, min_lon, max_lat, max_lon):
+        query = _bbox_query(form_id, *bbox, conditions=conditions).order_by(FormResponse.submitted_at.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        rows.extend(query.all())
+
+    if len(rows) > 1:
+        rows.sort(key=lambda row: row.submitted_at, reverse=True)
+    return rows[:limit] if limit is not None else rows
+
+
+def responses_within_radius(form_id, lat, lon, radius_m, limit=None, conditions=()):
+    """
+    Réponses d'un formulaire situées à moins de ``radius_m`` mètres d'un point
+
+    Args:
+        form_id (int): Identifiant du formulaire
+        lat, lon (float): Centre en degrés
+        radius_m (float): Rayon en mètres
+        limit (int): Nombre maximal de réponses
+        conditions (list): Conditions supplémentaires (ex: filtres sur champs indexés)
+
+    Returns:
+        list: Tuples (ligne, distance en mètres), les plus proches d'abord
+    """
+    matches = []
+    for bbox in bbox_around(lat, lon, radius_m):
+        # Le rectangle englobant est un sur-ensemble: filtrage exact par distance
+        for row in _bbox_query(form_id, *bbox, conditions=conditions):
+            distance = haversine_m(lat, lon, row.latitude, row.longitude)
+            if distance <= radius_m:
+                matches.append((row, distance))
+
+    matches.sort(key=lambda match: match[1])
+    return matches[:limit] if limit is not None else matches
@@ -0,0 +1,203 @@
+"""
+Nettoyage des fichiers d'upload orphelins
+
+Des fichiers restent dans UPLOAD_FOLDER sans plus rien qui les référence:
+soumissions échouées après l'écriture des fichiers, anciennes suppressions,
+exports temporaires... « flask gc-uploads » les retrouve et les élimine en
+deux temps:
+
+1. le dossier d'upload est parcouru par lots de fichiers (sans le lister en
+   entier); chaque lot est comparé à l'ensemble des fichiers référencés
+   (données des réponses actives et archivées, brouillons), lu une fois par
+   lots de réponses, puis à FormFile (une requête IN par lot et par base,
+   shards compris). Les fichiers non référencés plus anciens que
+   UPLOAD_GC_GRACE_HOURS (une soumission en cours écrit ses fichiers avant
+   son commit) sont déplacés dans .quarantine/<date>/ avec leur chemin
+   relatif;
+2. les quarantaines de plus de UPLOAD_GC_QUARANTINE_DAYS jours sont vidées,
+   après une dernière vérification: un fichier de nouveau référencé est
+   remis à sa place.
+
+Les rendus en cache des signatures dont le fichier .sig n'existe plus sont
+supprimés directement (ils se régénèrent). En simulation (dry_run), rien
+n'est déplacé ni supprimé.
+"""
+import os
+import shutil
+from datetime import datetime, timedelta
+
+from app import db
+from app.models import FormDraft, FormFile, FormResponse
+from app.utils.archive import iter_archived_data
+from app.utils.deletion import response_file_names
+from app.utils.helpers import delete_file
+from app.utils.shard_routing import each_shard
+from app.utils.signatures import CACHE_FOLDER, RENDER_SIZES, SIGNATURE_EXTENSION, SIGNATURE_FOLDER
+
+QUARANTINE_FOLDER = '.quarantine'
+RENDER_CACHE = f'{SIGNATURE_FOLDER}/{CACHE_FOLDER}'
+
+
+def _normalize(name):
+    return os.path.normpath(name).replace(os.sep, '/')
+
+
+def referenced_uploads(batch_size=1000):
+    """
+    Fichiers référencés par les données des réponses (actives et archivées) et des brouillons
+
+    Args:
+        batch_size (int): Nombre de lignes lues par requête
+
+    Returns:
+        set: Chemins relatifs au dossier d'upload (séparateur '/')
+    """
+    names = set()
+
+    def scan(model, column):
+        last_id = 0
+        while True:
+            rows = db.session.query(model.id, column).filter(model.id > last_id).order_by(model.id).limit(batch_size).all()
+            if not rows:
+                break
+            for row in rows:
+                names.update(_normalize(name) for name in response_file_names(row[1]))
+            last_id = rows[-1].id
+
+    scan(FormDraft, FormDraft.draft_data)
+    # Réponses de la base principale et de chaque shard
+    for _ in each_shard():
+        scan(FormResponse, FormResponse.response_data)
+        for data in iter_archived_data():
+            names.update(_normalize(name) for name in response_file_names(data.get('response_data')))
+    return names
+
+
+def _iter_files(upload_folder, subfolder=''):
+    """Fichiers du dossier d'upload (chemin relatif, stat), hors quarantaine et rendus en cache"""
+    with os.scandir(os.path.join(upload_folder, subfolder)) as entries:
+        for entry in entries:
+            relpath = f'{subfolder}/{entry.name}' if subfolder else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if relpath not in (QUARANTINE_FOLDER, RENDER_CACHE):
+                    yield from _iter_files(upload_folder, relpath)
+            elif entry.is_file(follow_symlinks=False):
+                yield relpath, entry.stat(follow_symlinks=False)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _unreferenced(batch, referenced):
+    """Chemins du lot référencés ni par les données ni par FormFile"""
+    candidates = [relpath for relpath, _ in batch if relpath not in referenced]
+    if not candidates:
+        return set()
+    known = set()
+    for _ in each_shard():
+        known.update(_normalize(name) for (name,) in db.session.query(FormFile.filename).filter(FormFile.filename.in_(candidates)))
+    return set(candidates) - known
+
+
+def _move(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.move(source, target)
+
+
+def _purge_quarantine(upload_folder, referenced, cutoff, dry_run, batch_size, report):
+    root = os.path.join(upload_folder, QUARANTINE_FOLDER)
+    if not os.path.isdir(root):
+        return
+    for day in sorted(os.listdir(root)):
+        try:
+            expired = datetime.strptime(day, '%Y-%m-%d').date() <= cutoff
+        except ValueError:
+            continue
+        if not expired:
+            continue
+        day_folder = os.path.join(root, day)
+        for batch in _batches(_iter_files(day_folder), batch_size):
+            orphans = _unreferenced(batch, referenced)
+            for relpath, stat in batch:
+                if relpath not in orphans:
+                    # De nouveau référencé: remettre le fichier à sa place
+                    report['restored'] += 1
+                    if not dry_run and not os.path.exists(os.path.join(upload_folder, relpath)):
+                        _move(os.path.join(day_folder, relpath), os.path.join(upload_folder, relpath))
+                    continue
+                report['purged'] += 1
+                report['reclaimed_bytes'] += stat.st_size
+                if not dry_run:
+                    delete_file(os.path.join(day_folder, relpath))
+        if not dry_run:
+            shutil.rmtree(day_folder, ignore_errors=True)
+
+
+def _purge_renders(upload_folder, modified_before, dry_run, report):
+    cache_folder = os.path.join(upload_folder, SIGNATURE_FOLDER, CACHE_FOLDER)
+    if not os.path.isdir(cache_folder):
+        return
+    with os.scandir(cache_folder) as entries:
+        for entry in entries:
+            stem, _, size = os.path.splitext(entry.name)[0].rpartition('_')
+            if not entry.is_file(follow_symlinks=False) or size not in RENDER_SIZES:
+                continue
+            stat = entry.stat(follow_symlinks=False)
+            source = os.path.join(upload_folder, SIGNATURE_FOLDER, f'{stem}.{SIGNATURE_EXTENSION}')
+            if stat.st_mtime >= modified_before or os.path.exists(source):
+                continue
+            report['renders'] += 1
+            report['reclaimed_bytes'] += stat.st_size
+            if not dry_run:
+                delete_file(entry.path)
+
+
+def collect_upload_garbage(upload_folder, grace_hours=24, quarantine_days=7, dry_run=False, batch_size=1000):
+    """
+    Mettre en quarantaine les fichiers d'upload orphelins et vider les quarantaines expirées
+
+    Args:
+        upload_folder (str): Dossier d'upload
+        grace_hours (int): Âge minimal (heures) d'un fichier orphelin mis en quarantaine
+        quarantine_days (int): Durée (jours) de la quarantaine avant suppression
+        dry_run (bool): Simulation: compter sans rien déplacer ni supprimer
+        batch_size (int): Nombre de fichiers (et de lignes) traités par lot
+
+    Returns:
+        dict: scanned, quarantined, quarantined_bytes, purged, restored, renders (rendus supprimés)
+        et reclaimed_bytes (octets libérés)
+    """
+    report = dict.fromkeys(('scanned', 'quarantined', 'quarantined_bytes', 'purged', 'restored', 'renders',
+                            'reclaimed_bytes'), 0)
+    if not os.path.isdir(upload_folder):
+        return report
+
+    referenced = referenced_uploads(batch_size)
+    now = datetime.utcnow()
+    _purge_quarantine(upload_folder, referenced, (now - timedelta(days=quarantine_days)).date(), dry_run,
+                      batch_size, report)
+
+    modified_before = (datetime.now() - timedelta(hours=grace_hours)).timestamp()
+    quarantine = os.path.join(upload_folder, QUARANTINE_FOLDER, now.strftime('%Y-%m-%d'))
+    for batch in _batches(_iter_files(upload_folder), batch_size):
+        report['scanned'] += len(batch)
+        batch = [(relpath, stat) for relpath, stat in batch if stat.st_mtime < modified_before]
+        orphans = _unreferenced(batch, referenced)
+        for relpath, stat in batch:
+            if relpath not in orphans:
+                continue
+            report['quarantined'] += 1
+            report['quarantined_bytes'] += stat.st_size
+            if not dry_run:
+                _move(os.path.join(upload_folder, relpath), os.path.join(quarantine, relpath))
+
+    _purge_renders(upload_folder, modified_before, dry_run, report)
+    return report
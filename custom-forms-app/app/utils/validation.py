@@ -0,0 +1,343 @@
+"""
+Moteur de validation côté serveur des réponses aux formulaires
+
+La structure ``form_data`` d'un formulaire est compilée une seule fois en une
+liste de vérifications par champ (type, obligatoire, min/max, longueur,
+motifs). Les expressions régulières sont précompilées au chargement du module
+et les validateurs compilés sont mis en cache par formulaire, ce qui permet de
+valider une soumission ou des milliers de lignes importées sans recompiler.
+"""
+import json
+import re
+from collections import OrderedDict
+from datetime import datetime
+from threading import Lock
+
+# Expressions régulières précompilées
+EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+PHONE_RE = re.compile(r'^[\d\s\-\+\(\)\.]{8,}$')
+URL_RE = re.compile(r'^https?:\/\/(www\.)?[-a-zA-Z0-9@:%._\+~#=]{1,256}\.[a-zA-Z0-9()]{1,6}\b([-a-zA-Z0-9()@:%_\+.~#?&//=]*)$')
+
+# Formats de date/heure acceptés par type de champ
+DATETIME_FORMATS = {
+    'date': ('%Y-%m-%d', "Format de date invalide (YYYY-MM-DD)"),
+    'time': ('%H:%M', "Format d'heure invalide (HH:MM)"),
+    'datetime-local': ('%Y-%m-%dT%H:%M', "Format de date et heure invalide (YYYY-MM-DDTHH:MM)"),
+}
+
+# Types dont la valeur n'est pas du texte saisi (vérification de présence uniquement)
+PRESENCE_ONLY_TYPES = {'file', 'signature', 'geolocation', 'checkbox'}
+
+# Nombre maximum de validateurs compilés conservés en mémoire
+VALIDATOR_CACHE_SIZE = 256
+
+
+def _to_number(value):
+    """Convertir une option numérique de configuration, None si absente ou invalide"""
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value):
+    """Convertir une option de longueur de configuration, None si absente ou invalide"""
+    number = _to_number(value)
+    return int(number) if number else None
+
+
+def _regex_check(pattern, message):
+    match = pattern.match
+
+    def check(value):
+        if not match(value):
+            return message
+        return None
+    return check
+
+
+def _number_check(min_val, max_val):
+    def check(value):
+        try:
+            num_value = float(value)
+        except (TypeError, ValueError):
+            return "Doit être un nombre valide"
+        if min_val is not None and num_value < min_val:
+            return f"La valeur doit être supérieure ou égale à {min_val:g}"
+        if max_val is not None and num_value > max_val:
+            return f"La valeur doit être inférieure ou égale à {max_val:g}"
+        return None
+    return check
+
+
+def _datetime_check(fmt, message):
+    strptime = datetime.strptime
+
+    def check(value):
+        try:
+            strptime(value, fmt)
+        except (TypeError, ValueError):
+            return message
+        return None
+    return check
+
+
+def _choice_check(allowed):
+    def check(value):
+        if value not in allowed:
+            return "Valeur non autorisée"
+        return None
+    return check
+
+
+def _length_check(min_length, max_length):
+    def check(value):
+        length = len(str(value))
+        if min_length and length < min_length:
+            return f"Minimum {min_length} caractères requis"
+        if max_length and length > max_length:
+            return f"Maximum {max_length} caractères autorisés"
+        return None
+    return check
+
+
+def _extension_check(extensions):
+    def check(value):
+        extension = str(value).rsplit('.', 1)[-1].lower() if '.' in str(value) else ''
+        if extension not in extensions:
+            return f"Extension non autorisée (autorisées: {', '.join(sorted(extensions))})"
+        return None
+    return check
+
+
+class CompiledField:
+    """Vérifications précompilées pour un champ de formulaire"""
+
+    __slots__ = ('field_id', 'name', 'label', 'type', 'required', 'checks')
+
+    def __init__(self, field):
+        self.field_id = field.get('id')
+        self.name = field.get('name')
+        self.label = field.get('label', self.name or self.field_id)
+        self.type = field.get('type')
+        self.required = bool(field.get('required', False))
+        self.checks = self._compile_checks(field)
+
+    def _compile_checks(self, field):
+        field_type = self.type
+        checks = []
+
+        if field_type == 'email':
+            checks.append(_regex_check(EMAIL_RE, "Format d'email invalide"))
+        elif field_type == 'number':
+            checks.append(_number_check(_to_number(field.get('min')), _to_number(field.get('max'))))
+        elif field_type == 'tel':
+            checks.append(_regex_check(PHONE_RE, "Format de téléphone invalide"))
+        elif field_type == 'url':
+            checks.append(_regex_check(URL_RE, "Format d'URL invalide"))
+        elif field_type in DATETIME_FORMATS:
+            checks.append(_datetime_check(*DATETIME_FORMATS[field_type]))
+        elif field_type in ('radio', 'select') and field.get('choices'):
+            allowed = frozenset(str(c.get('value')) for c in field['choices'] if isinstance(c, dict))
+            checks.append(_choice_check(allowed))
+        elif field_type == 'file' and field.get('allowed_extensions'):
+            extensions = frozenset(e.lower().lstrip('.') for e in field['allowed_extensions'] if e)
+            checks.append(_extension_check(extensions))
+
+        if field_type not in PRESENCE_ONLY_TYPES:
+            min_length = _to_int(field.get('min_length'))
+            max_length = _to_int(field.get('max_length'))
+            if min_length or max_length:
+                checks.append(_length_check(min_length, max_length))
+
+            pattern = field.get('pattern')
+            if pattern:
+                try:
+                    compiled = re.compile(pattern)
+                except re.error:
+                    compiled = None
+                if compiled is not None:
+                    checks.append(_regex_check(compiled, field.get('pattern_message') or "Format invalide"))
+
+        return tuple(checks)
+
+    def validate(self, value):
+        """
+        Valider une valeur pour ce champ
+
+        Args:
+            value: Valeur soumise (chaîne, booléen ou None)
+
+        Returns:
+            str: Message d'erreur, ou None si la valeur est valide
+        """
+        if value is None or value == '' or value is False:
+            return "Ce champ est obligatoire" if self.required else None
+        for check in self.checks:
+            error = check(value)
+            if error:
+                return error
+        return None
+
+
+class FormValidator:
+    """Validateur compilé pour l'ensemble des champs d'un formulaire"""
+
+    def __init__(self, form_data):
+        self.fields = [CompiledField(f) for f in (form_data or []) if isinstance(f, dict)]
+
+    def validate(self, values, key='id'):
+        """
+        Valider un dictionnaire de valeurs
+
+        Args:
+            values (dict): Valeurs indexées par identifiant ou nom de champ
+            key (str): 'id' ou 'name', selon l'indexation de ``values``
+
+        Returns:
+            dict: Erreurs par identifiant de champ (vide si tout est valide)
+        """
+        errors = {}
+        get = values.get
+        for field in self.fields:
+            error = field.validate(get(field.field_id if key == 'id' else field.name))
+            if error:
+                errors[field.field_id] = error
+        return errors
+
+    def validate_many(self, rows, key='id'):
+        """
+        Valider un lot de lignes (import en masse)
+
+        Args:
+            rows (iterable): Dictionnaires de valeurs
+            key (str): 'id' ou 'name', selon l'indexation des lignes
+
+        Returns:
+            list: Tuples (index de ligne, erreurs) pour les lignes invalides uniquement
+        """
+        fields = [(f.field_id if key == 'id' else f.name, f.field_id, f.validate) for f in self.fields]
+        invalid = []
+        for index, row in enumerate(rows):
+            get = row.get
+            errors = None
+            for lookup, field_id, validate in fields:
+                error = validate(get(lookup))
+                if error:
+                    if errors is None:
+                        errors = {}
+                    errors[field_id] = error
+            if errors:
+                invalid.append((index, errors))
+        return invalid
+
+    def validate_request(self, form, files=None):
+        """
+        Valider les données brutes d'une requête de soumission
+
+        Args:
+            form (MultiDict): request.form
+            files (MultiDict): request.files
+
+        Returns:
+            dict: Erreurs par identifiant de champ (vide si tout est valide)
+        """
+        errors = {}
+        for field in self.fields:
+            name = field.name
+            if field.type == 'file':
+                file_storage = files.get(name) if files else None
+                value = file_storage.filename if file_storage and file_storage.filename else None
+            elif field.type == 'geolocation':
+                lat = form.get(f'{name}_lat')
+                lon = form.get(f'{name}_lon')
+                value = f"{lat},{lon}" if lat and lon else None
+            elif field.type == 'checkbox':
+                value = form.get(name) == 'on'
+            else:
+                value = form.get(name)
+            error = field.validate(value)
+            if error:
+                errors[field.field_id] = error
+        return errors
+
+    def format_errors(self, errors):
+        """
+        Formater les erreurs pour l'affichage à l'utilisateur
+
+        Args:
+            errors (dict): Erreurs par identifiant de champ
+
+        Returns:
+            list: Messages "Libellé: erreur"
+        """
+        labels = {f.field_id: f.label for f in self.fields}
+        return [f"{labels.get(field_id, field_id)}: {message}" for field_id, message in errors.items()]
+
+
+_validator_cache = OrderedDict()
+_validator_cache_lock = Lock()
+
+
+def get_form_validator(form_obj):
+    """
+    Obtenir le validateur compilé d'un formulaire, depuis le cache si possible
+
+    Le cache est indexé par (id, updated_at): toute modification du formulaire
+    met à jour ``updated_at`` et provoque une recompilation.
+
+    Args:
+        form_obj: Objet Form
+
+    Returns:
+        FormValidator: Validateur compilé
+    """
+    cache_key = (form_obj.id, form_obj.updated_at)
+    with _validator_cache_lock:
+        validator = _validator_cache.get(cache_key)
+        if validator is not None:
+            _validator_cache.move_to_end(cache_key)
+            return validator
+
+    validator = FormValidator(form_obj.form_data)
+
+    with _validator_cache_lock:
+        _validator_cache[cache_key] = validator
+        while len(_validator_cache) > VALIDATOR_CACHE_SIZE:
+            _validator_cache.popitem(last=False)
+    return validator
+
+
+_field_cache = OrderedDict()
+_field_cache_lock = Lock()
+
+
+def get_compiled_field(field):
+    """
+    Obtenir un champ compilé isolé (hors formulaire), depuis le cache si possible
+
+    Le cache est indexé par la configuration du champ sérialisée: deux
+    configurations identiques partagent leurs vérifications compilées.
+
+    Args:
+        field (dict): Définition du champ (type, options)
+
+    Returns:
+        CompiledField: Champ compilé
+    """
+    cache_key = json.dumps(field, sort_keys=True, default=str)
+    with _field_cache_lock:
+        compiled = _field_cache.get(cache_key)
+        if compiled is not None:
+            _field_cache.move_to_end(cache_key)
+            return compiled
+
+    compiled = CompiledField(field)
+
+    with _field_cache_lock:
+        _field_cache[cache_key] = compiled
+        while len(_field_cache) > VALIDATOR_CACHE_SIZE:
+            _field_cache.popitem(last=False)
+    return compiled
@@ -4,6 +4,17 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'your_secret_key_here'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///forms.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Profil du moteur (app/utils/database.py): sqlite-wal, sqlite-durable, postgresql, default
+    # (par défaut selon SQLALCHEMY_DATABASE_URI) et base en lecture seule pour les lectures lourdes
+    DATABASE_PROFILE = os.environ.get('DATABASE_PROFILE')
+    DATABASE_READONLY_URL = os.environ.get('DATABASE_READONLY_URL')
+    DATABASE_POOL_SIZE = int(os.environ['DATABASE_POOL_SIZE']) if os.environ.get('DATABASE_POOL_SIZE') else None
+    DATABASE_MAX_OVERFLOW = int(os.environ['DATABASE_MAX_OVERFLOW']) if os.environ.get('DATABASE_MAX_OVERFLOW') else None
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ['SQLITE_BUSY_TIMEOUT_MS']) if os.environ.get('SQLITE_BUSY_TIMEOUT_MS') else None
+    # Bases SQLite séparées pour les réponses (app/utils/shards.py): noms des shards (séparés par des virgules)
+    # et dossier de leurs fichiers (instance/shards par défaut); « flask assign-shard » y place un formulaire
+    DATABASE_SHARDS = os.environ.get('DATABASE_SHARDS') or ''
+    DATABASE_SHARD_DIR = os.environ.get('DATABASE_SHARD_DIR')
     UPLOAD_FOLDER = 'uploads'
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16 MB max upload size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx', 'xls', 'xlsx', 'txt', 'csv'}
@@ -15,6 +26,88 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    
+    # Ingestion des soumissions: regroupement des commits (group commit)
+    # Utile avec SQLite lors des pics de soumissions; chaque requête attend le commit de son lot
+    INGEST_GROUP_COMMIT = os.environ.get('INGEST_GROUP_COMMIT') is not None
+    INGEST_BATCH_INTERVAL_MS = int(os.environ.get('INGEST_BATCH_INTERVAL_MS') or 5)
+    INGEST_BATCH_MAX_SIZE = int(os.environ.get('INGEST_BATCH_MAX_SIZE') or 200)
+    INGEST_ACK_TIMEOUT = float(os.environ.get('INGEST_ACK_TIMEOUT') or 10)
+    # Chemin async (/api/forms/<id>/submit/async): pool d'E/S et nombre maximum de soumissions simultanées
+    INGEST_ASYNC_WORKERS = int(os.environ.get('INGEST_ASYNC_WORKERS') or 8)
+    INGEST_ASYNC_MAX_CONCURRENCY = int(os.environ.get('INGEST_ASYNC_MAX_CONCURRENCY') or 32)
+    
+    # Brouillons: sauvegarde automatique (secondes) et durée de conservation des brouillons abandonnés
+    DRAFT_AUTOSAVE_INTERVAL = int(os.environ.get('DRAFT_AUTOSAVE_INTERVAL') or 5)
+    DRAFT_RETENTION_DAYS = int(os.environ.get('DRAFT_RETENTION_DAYS') or 30)
+    
+    # Limitation de débit des soumissions anonymes (seaux à jetons, ex: "10/minute")
+    # Backend 'memory' (par processus) ou 'shared' (mémoire partagée entre workers)
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'true').lower() in ('true', '1', 'yes')
+    RATELIMIT_BACKEND = os.environ.get('RATELIMIT_BACKEND') or 'memory'
+    RATELIMIT_SHM_PATH = os.environ.get('RATELIMIT_SHM_PATH')
+    RATELIMIT_SHM_SLOTS = int(os.environ.get('RATELIMIT_SHM_SLOTS') or 65536)
+    RATELIMIT_PER_IP = os.environ.get('RATELIMIT_PER_IP') or '10/minute'
+    RATELIMIT_PER_FORM = os.environ.get('RATELIMIT_PER_FORM') or '300/minute'
+    # Pièces jointes des brouillons (une par champ fichier): seau par IP distinct de celui des soumissions
+    RATELIMIT_DRAFT_UPLOADS = os.environ.get('RATELIMIT_DRAFT_UPLOADS') or '60/minute'
+    RATELIMIT_AUTHENTICATED = os.environ.get('RATELIMIT_AUTHENTICATED') is not None
+    RATELIMIT_FORM_CACHE_TTL = int(os.environ.get('RATELIMIT_FORM_CACHE_TTL') or 60)
+    
+    # Géocodage inverse hors ligne: fichier GeoNames (TSV) ou BAN (CSV ';'), éventuellement .gz
+    GEOCODER_GAZETTEER = os.environ.get('GEOCODER_GAZETTEER')
+    GEOCODER_MAX_DISTANCE_M = float(os.environ.get('GEOCODER_MAX_DISTANCE_M') or 5000)
+    GEOCODER_CACHE_SIZE = int(os.environ.get('GEOCODER_CACHE_SIZE') or 65536)
+
+    # Géolocalisation IP hors ligne: plages DB-IP ou IP2Location (CSV), rechargées si le fichier change
+    IPGEO_DATABASE = os.environ.get('IPGEO_DATABASE')
+    IPGEO_CACHE_SIZE = int(os.environ.get('IPGEO_CACHE_SIZE') or 65536)
+    IPGEO_RELOAD_INTERVAL = int(os.environ.get('IPGEO_RELOAD_INTERVAL') or 60)
+
+    # Requêtes spatiales (/responses/within, /responses/nearby)
+    SPATIAL_MAX_RESULTS = int(os.environ.get('SPATIAL_MAX_RESULTS') or 10000)
+    SPATIAL_MAX_RADIUS_M = float(os.environ.get('SPATIAL_MAX_RADIUS_M') or 100000)
+
+    # Carte des réponses: grille de regroupement par tuile et cache des tuiles
+    CLUSTER_GRID = int(os.environ.get('CLUSTER_GRID') or 8)
+    CLUSTER_CACHE_SIZE = int(os.environ.get('CLUSTER_CACHE_SIZE') or 10000)
+    CLUSTER_CACHE_TTL = int(os.environ.get('CLUSTER_CACHE_TTL') or 300)
+
+    # Tableau de bord administrateur: durée du cache des statistiques (secondes)
+    ADMIN_STATS_CACHE_TTL = int(os.environ.get('ADMIN_STATS_CACHE_TTL') or 15)
+
+    # Page des réponses (pagination par curseur)
+    RESPONSES_PER_PAGE = int(os.environ.get('RESPONSES_PER_PAGE') or 50)
+
+    # Recherche plein texte dans les réponses
+    SEARCH_RESULTS_PER_PAGE = int(os.environ.get('SEARCH_RESULTS_PER_PAGE') or 25)
+
+    # Séries temporelles des soumissions: conservation des agrégats horaires (jours)
+    ROLLUP_HOURLY_RETENTION_DAYS = int(os.environ.get('ROLLUP_HOURLY_RETENTION_DAYS') or 90)
+
+    # Archivage des réponses anciennes (blocs JSON compressés) et cache des blocs décompressés
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS') or 365)
+    ARCHIVE_BLOCK_SIZE = int(os.environ.get('ARCHIVE_BLOCK_SIZE') or 1000)
+    ARCHIVE_BLOCK_CACHE_SIZE = int(os.environ.get('ARCHIVE_BLOCK_CACHE_SIZE') or 64)
+
+    # Tâches de fond (suppression des formulaires...): 'thread' (un thread par processus),
+    # 'inline' (dans la requête) ou 'none' (« flask run-jobs » seulement)
+    JOB_WORKER = os.environ.get('JOB_WORKER') or 'thread'
+    JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE') or 500)
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL') or 5)
+    JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS') or 300)
+
+    # Fichiers d'upload orphelins (« flask gc-uploads »): âge minimal avant quarantaine, durée de la quarantaine
+    UPLOAD_GC_GRACE_HOURS = int(os.environ.get('UPLOAD_GC_GRACE_HOURS') or 24)
+    UPLOAD_GC_QUARANTINE_DAYS = int(os.environ.get('UPLOAD_GC_QUARANTINE_DAYS') or 7)
+
+    # Conservation des données personnelles (« flask apply-retention »): réponses par transaction, pause entre lots
+    RETENTION_BATCH_SIZE = int(os.environ.get('RETENTION_BATCH_SIZE') or 200)
+    RETENTION_BATCH_PAUSE = float(os.environ.get('RETENTION_BATCH_PAUSE') or 0.05)
+
+    # Migrations de données (« flask run-data-migration »): lignes par transaction, pause entre lots (secondes)
+    DATA_MIGRATION_BATCH_SIZE = int(os.environ.get('DATA_MIGRATION_BATCH_SIZE') or 500)
+    DATA_MIGRATION_PAUSE = float(os.environ.get('DATA_MIGRATION_PAUSE') or 0.05)
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -23,6 +116,8 @@ class DevelopmentConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    RATELIMIT_ENABLED = False
+    JOB_WORKER = 'inline'
     FLASK_ENV = 'testing'
 
 class ProductionConfig(Config):
@@ -0,0 +1,63 @@
+"""Decode double-encoded JSON in form_data and response_data
+
+Revision ID: c9a3d7e1f5b6
+Revises: b8f2c6d0e4a5
+Create Date: 2026-10-19 15:42:10.503817
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9a3d7e1f5b6'
+down_revision = 'b8f2c6d0e4a5'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+
+def _decode(value):
+    # Les anciennes écritures stockaient json.dumps(...) dans une colonne JSON:
+    # la valeur lue est alors une chaîne contenant le document
+    while isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            break
+    return value
+
+
+def _decode_column(table_name, column_name):
+    table = sa.table(table_name, sa.column('id', sa.Integer), sa.column(column_name, sa.JSON))
+    column = table.c[column_name]
+    bind = op.get_bind()
+
+    last_id = 0
+    while True:
+        # Pagination par identifiant: chaque lot est une requête indexée
+        rows = bind.execute(
+            sa.select(table.c.id, column).where(table.c.id > last_id).order_by(table.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        updates = [{'row_id': row_id, 'value': _decode(value)} for row_id, value in rows if isinstance(value, str)]
+        if updates:
+            bind.execute(
+                table.update().where(table.c.id == sa.bindparam('row_id')).values({column_name: sa.bindparam('value')}),
+                updates
+            )
+
+
+def upgrade():
+    _decode_column('forms', 'form_data')
+    _decode_column('form_responses', 'response_data')
+
+
+def downgrade():
+    # Les documents natifs restent lisibles: rien à réencoder
+    pass
@@ -0,0 +1,36 @@
+"""Add response_search full-text index
+
+Revision ID: e1c5f9a3b7d8
+Revises: d0b4e8f2a6c7
+Create Date: 2026-10-19 17:03:52.640178
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1c5f9a3b7d8'
+down_revision = 'd0b4e8f2a6c7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Table d'index propre au moteur; les réponses existantes sont indexées
+    # ensuite par la commande « flask rebuild-search-index »
+    if op.get_bind().dialect.name == 'postgresql':
+        op.create_table('response_search',
+        sa.Column('response_id', sa.Integer(), nullable=False),
+        sa.Column('form_id', sa.Integer(), nullable=False),
+        sa.Column('document', sa.dialects.postgresql.TSVECTOR(), nullable=False),
+        sa.ForeignKeyConstraint(['response_id'], ['form_responses.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('response_id')
+        )
+        op.create_index('ix_response_search_document', 'response_search', ['document'], unique=False, postgresql_using='gin')
+    else:
+        op.execute("CREATE VIRTUAL TABLE response_search USING fts5(form, document, tokenize='unicode61')")
+
+
+def downgrade():
+    op.execute("DROP TABLE IF EXISTS response_search")
@@ -1,5 +1,8 @@
 import os
+import click
+from datetime import datetime, timedelta
 from app import create_app, db
+from app.utils.shard_routing import use_shard
 from flask_migrate import upgrade, migrate, init, stamp
 
 # Définir l'environnement Flask
@@ -27,5 +30,254 @@ def migrate_db_command():
         upgrade()
     print('Base de données migrée.')
 
+@app.cli.command('purge-drafts')
+@click.option('--days', type=int, default=None, help='Ancienneté minimale (jours) des brouillons à supprimer.')
+def purge_drafts_command(days):
+    """Supprime les brouillons abandonnés et leurs pièces jointes."""
+    from app.models import FormDraft
+    from app.utils.drafts import delete_draft_files
+    days = days if days is not None else app.config['DRAFT_RETENTION_DAYS']
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    with app.app_context():
+        count = 0
+        for draft in FormDraft.query.filter(FormDraft.updated_at < cutoff).all():
+            delete_draft_files(draft, app.config['UPLOAD_FOLDER'])
+            db.session.delete(draft)
+            count += 1
+        db.session.commit()
+    print(f'{count} brouillon(s) supprimé(s).')
+
+def _print_data_migration_progress(checkpoint):
+    print(f"{checkpoint.name} [{checkpoint.shard or 'principale'}]: {checkpoint.processed}/{checkpoint.total} "
+          f"ligne(s) lue(s), {checkpoint.changed} modifiée(s)")
+
+def _run_data_migration(name, **kwargs):
+    """Exécute une migration de données et rend le nombre de lignes modifiées par cette exécution."""
+    from app.utils.data_migrations import DataMigrationBusyError, run_data_migration
+    from app.models import DataMigrationCheckpoint
+    before = {c.shard: c.changed for c in DataMigrationCheckpoint.query.filter_by(name=name)}
+    try:
+        checkpoints = run_data_migration(name, progress=_print_data_migration_progress, **kwargs)
+    except (ValueError, DataMigrationBusyError) as e:
+        raise click.ClickException(str(e))
+    paused = [c for c in checkpoints if c.status == 'paused']
+    if paused:
+        print(f'{name}: interrompue, reprise avec « flask run-data-migration {name} ».')
+    if kwargs.get('restart'):
+        before = {}
+    return sum(c.changed - before.get(c.shard, 0) for c in checkpoints)
+
+@app.cli.command('backfill-ip-locations')
+@click.option('--batch-size', type=int, default=None, help='Nombre de réponses traitées par transaction.')
+@click.option('--force', is_flag=True, help='Recalculer aussi les réponses déjà localisées.')
+def backfill_ip_locations_command(batch_size, force):
+    """Renseigne le lieu déduit de l'adresse IP des réponses existantes."""
+    from app.utils.ipgeo import get_ip_locator
+    with app.app_context():
+        if get_ip_locator(app) is None:
+            print('IPGEO_DATABASE n\'est pas configuré.')
+            return
+        count = _run_data_migration('backfill-ip-locations', options={'force': force}, restart=force, batch_size=batch_size)
+    print(f'{count} réponse(s) localisée(s).')
+
+@app.cli.command('backfill-geo-columns')
+@click.option('--batch-size', type=int, default=None, help='Nombre de réponses traitées par transaction.')
+@click.option('--force', is_flag=True, help='Recalculer aussi les réponses déjà renseignées.')
+def backfill_geo_columns_command(batch_size, force):
+    """Renseigne latitude, longitude et geohash des réponses existantes."""
+    with app.app_context():
+        count = _run_data_migration('backfill-geo-columns', options={'force': force}, restart=force, batch_size=batch_size)
+    print(f'{count} réponse(s) géolocalisée(s).')
+
+@app.cli.command('data-migrations')
+def data_migrations_command():
+    """Liste les migrations de données et leur progression par base."""
+    from app.utils.data_migrations import data_migration_status
+    with app.app_context():
+        for migration in data_migration_status():
+            print(f"{migration['name']}: {migration['description']}")
+            for checkpoint in migration['checkpoints']:
+                print(f"  [{checkpoint['shard'] or 'principale'}] {checkpoint['status']} {checkpoint['percent']}% "
+                      f"({checkpoint['processed']}/{checkpoint['total']}, {checkpoint['changed']} modifiée(s))"
+                      + (f" - {checkpoint['message']}" if checkpoint['message'] else ''))
+
+@app.cli.command('run-data-migration')
+@click.argument('name')
+@click.option('--batch-size', type=int, default=None, help='Nombre de lignes traitées par transaction.')
+@click.option('--pause', type=float, default=None, help='Pause entre deux lots (secondes).')
+@click.option('--max-batches', type=int, default=None, help='Nombre maximum de lots (la prochaine exécution reprend ensuite).')
+@click.option('--restart', is_flag=True, help='Repartir du début, même si la migration est terminée.')
+def run_data_migration_command(name, batch_size, pause, max_batches, restart):
+    """Exécute ou reprend une migration de données, par lots, pendant que l'application tourne."""
+    with app.app_context():
+        count = _run_data_migration(name, restart=restart, batch_size=batch_size, pause=pause, max_batches=max_batches)
+    print(f'{count} ligne(s) modifiée(s).')
+
+@app.cli.command('pause-data-migration')
+@click.argument('name')
+def pause_data_migration_command(name):
+    """Interrompt une migration de données en cours à la fin de son lot."""
+    from app.utils.data_migrations import pause_data_migration
+    with app.app_context():
+        count = pause_data_migration(name)
+    print(f'{name}: interrompue sur {count} base(s).')
+
+@app.cli.command('import-geofences')
+@click.argument('form_id', type=int)
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--replace', is_flag=True, help='Supprimer d\'abord les zones existantes du formulaire.')
+def import_geofences_command(form_id, path, replace):
+    """Importe les zones autorisées d'un formulaire depuis un fichier GeoJSON."""
+    import json
+    from app.models import Form
+    from app.utils.geofence import import_geofences
+    with app.app_context():
+        form = Form.query.get(form_id)
+        if form is None:
+            raise click.ClickException(f'Formulaire {form_id} introuvable.')
+        with open(path, encoding='utf-8') as f:
+            try:
+                count = import_geofences(form, json.load(f), replace=replace)
+            except ValueError as e:
+                raise click.ClickException(f'Fichier GeoJSON invalide: {e}')
+    print(f'{count} zone(s) importée(s).')
+
+@app.cli.command('reindex-response-fields')
+@click.argument('form_id', type=int, required=False)
+@click.option('--batch-size', type=int, default=1000, help='Nombre de réponses traitées par transaction.')
+def reindex_response_fields_command(form_id, batch_size):
+    """Reconstruit l'index des champs indexés (d'un formulaire ou de tous)."""
+    from app.models import Form
+    from app.utils.field_index import indexed_field_ids, reindex_responses
+    with app.app_context():
+        query = Form.query if form_id is None else Form.query.filter_by(id=form_id)
+        count = 0
+        for form in query.all():
+            field_ids = indexed_field_ids(form.form_data)
+            if field_ids:
+                with use_shard(form.shard):
+                    count += reindex_responses(form.id, field_ids, batch_size=batch_size)
+    print(f'{count} valeur(s) indexée(s).')
+
+@app.cli.command('rebuild-search-index')
+@click.argument('form_id', type=int, required=False)
+@click.option('--batch-size', type=int, default=1000, help='Nombre de réponses traitées par transaction.')
+def rebuild_search_index_command(form_id, batch_size):
+    """Reconstruit l'index de recherche plein texte (d'un formulaire ou de tous)."""
+    from app.utils.search import rebuild_search_index
+    with app.app_context():
+        count = rebuild_search_index(form_id, batch_size=batch_size)
+    print(f'{count} réponse(s) indexée(s).')
+
+@app.cli.command('reconcile-form-counters')
+@click.argument('form_id', type=int, required=False)
+@click.option('--batch-size', type=int, default=1000, help='Nombre de réponses lues par requête.')
+def reconcile_form_counters_command(form_id, batch_size):
+    """Recalcule les compteurs de réponses des formulaires (d'un formulaire ou de tous)."""
+    from app.utils.counters import reconcile_form_counters
+    with app.app_context():
+        fixed = reconcile_form_counters(form_id, batch_size=batch_size)
+    print(f'{fixed} formulaire(s) corrigé(s).')
+
+@app.cli.command('rebuild-admin-stats')
+def rebuild_admin_stats_command():
+    """Recalcule les statistiques du tableau de bord administrateur depuis les tables."""
+    from app.utils.admin_stats import rebuild_admin_stats
+    with app.app_context():
+        stats = rebuild_admin_stats()
+    print(f"{len(stats)} compteur(s) recalculé(s): {stats['users']} utilisateur(s), "
+          f"{stats['forms']} formulaire(s), {stats['responses']} réponse(s).")
+
+@app.cli.command('rebuild-rollups')
+@click.argument('form_id', type=int, required=False)
+@click.option('--batch-size', type=int, default=5000, help='Nombre de réponses lues par requête.')
+def rebuild_rollups_command(form_id, batch_size):
+    """Recalcule les séries temporelles des soumissions (d'un formulaire ou de tous)."""
+    from app.utils.rollups import rebuild_rollups
+    with app.app_context():
+        count = rebuild_rollups(form_id, batch_size=batch_size)
+    print(f'{count} agrégat(s) écrit(s).')
+
+@app.cli.command('compact-rollups')
+@click.option('--days', type=int, default=None, help='Ancienneté (jours) au-delà de laquelle les agrégats horaires sont supprimés.')
+def compact_rollups_command(days):
+    """Supprime les agrégats horaires anciens (les agrégats journaliers sont conservés)."""
+    from app.utils.rollups import compact_rollups
+    days = days if days is not None else app.config['ROLLUP_HOURLY_RETENTION_DAYS']
+    with app.app_context():
+        count = compact_rollups(days)
+    print(f'{count} agrégat(s) horaire(s) supprimé(s).')
+
+@app.cli.command('archive-responses')
+@click.argument('form_id', type=int, required=False)
+@click.option('--days', type=int, default=None, help='Ancienneté minimale (jours) des réponses à archiver.')
+@click.option('--block-size', type=int, default=None, help='Nombre de réponses par bloc compressé.')
+def archive_responses_command(form_id, days, block_size):
+    """Archive les réponses anciennes en blocs compressés (d'un formulaire ou de tous)."""
+    from app.utils.archive import archive_responses
+    days = days if days is not None else app.config['ARCHIVE_AFTER_DAYS']
+    block_size = block_size or app.config['ARCHIVE_BLOCK_SIZE']
+    with app.app_context():
+        count = archive_responses(datetime.utcnow() - timedelta(days=days), form_id, block_size=block_size)
+    print(f'{count} réponse(s) archivée(s).')
+
+@app.cli.command('run-jobs')
+@click.option('--limit', type=int, default=None, help='Nombre maximum de tâches à exécuter.')
+def run_jobs_command(limit):
+    """Exécute les tâches de fond en attente (suppressions de formulaires...)."""
+    from app.utils.jobs import run_pending_jobs
+    with app.app_context():
+        count = run_pending_jobs(limit)
+    print(f'{count} tâche(s) exécutée(s).')
+
+@app.cli.command('apply-retention')
+@click.argument('form_id', type=int, required=False)
+@click.option('--batch-size', type=int, default=None, help='Nombre de réponses traitées par transaction.')
+def apply_retention_command(form_id, batch_size):
+    """Anonymise ou supprime les réponses dépassant la durée de conservation de leur formulaire."""
+    from app.utils.retention import apply_retention
+    batch_size = batch_size or app.config['RETENTION_BATCH_SIZE']
+    with app.app_context():
+        count = apply_retention(form_id, batch_size=batch_size, pause=app.config['RETENTION_BATCH_PAUSE'])
+    print(f'{count} réponse(s) anonymisée(s) ou supprimée(s).')
+
+@app.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Simuler: compter sans rien déplacer ni supprimer.')
+@click.option('--grace-hours', type=int, default=None, help='Âge minimal (heures) d\'un fichier orphelin mis en quarantaine.')
+@click.option('--quarantine-days', type=int, default=None, help='Durée (jours) de la quarantaine avant suppression.')
+@click.option('--batch-size', type=int, default=1000, help='Nombre de fichiers comparés par lot.')
+def gc_uploads_command(dry_run, grace_hours, quarantine_days, batch_size):
+    """Met en quarantaine puis supprime les fichiers d'upload qui ne sont plus référencés."""
+    from app.utils.helpers import format_file_size
+    from app.utils.upload_gc import collect_upload_garbage
+    grace_hours = grace_hours if grace_hours is not None else app.config['UPLOAD_GC_GRACE_HOURS']
+    quarantine_days = quarantine_days if quarantine_days is not None else app.config['UPLOAD_GC_QUARANTINE_DAYS']
+    with app.app_context():
+        report = collect_upload_garbage(app.config['UPLOAD_FOLDER'], grace_hours, quarantine_days,
+                                        dry_run=dry_run, batch_size=batch_size)
+    prefix = '[simulation] ' if dry_run else ''
+    print(f"{prefix}{report['scanned']} fichier(s) examiné(s), {report['quarantined']} orphelin(s) mis en quarantaine "
+          f"({format_file_size(report['quarantined_bytes'])}).")
+    print(f"{prefix}{report['purged']} fichier(s) et {report['renders']} rendu(s) de signature supprimé(s), "
+          f"{report['restored']} restauré(s): {format_file_size(report['reclaimed_bytes'])} libéré(s).")
+
+@app.cli.command('assign-shard')
+@click.argument('form_id', type=int)
+@click.argument('shard', required=False)
+def assign_shard_command(form_id, shard):
+    """Place les réponses futures d'un formulaire (sans réponses) dans un shard, ou dans la base principale sans SHARD."""
+    from app.models import Form
+    from app.utils.shards import assign_form_shard
+    with app.app_context():
+        form = Form.query.get(form_id)
+        if form is None:
+            raise click.ClickException(f'Formulaire {form_id} introuvable.')
+        try:
+            assign_form_shard(form, shard)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        db.session.commit()
+    print(f'Formulaire {form_id}: réponses dans {shard or "la base principale"}.')
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Benchmark du débit de soumission des réponses
+
+Soumet des réponses en parallèle sur une base SQLite fichier temporaire et
+mesure le débit soutenu (soumissions/seconde), avec et sans group commit.
+
+Avec --slow-clients, l'application est servie par un vrai serveur HTTP
+(werkzeug, multi-thread) et chaque client envoie son corps de requête par
+morceaux espacés, pour comparer le chemin synchrone (/submit) au chemin
+async (/submit/async) face à des clients lents.
+
+Le gain du group commit vient surtout du flush unique par lot: les
+agrégats (compteurs, statistiques, séries, index de recherche) sont écrits
+une fois par lot au lieu d'une fois par réponse. DATABASE_PROFILE choisit
+le profil du moteur (sqlite-durable: fsync à chaque commit).
+
+Usage:
+    python scripts/bench_submissions.py --threads 16 --requests 200
+    DATABASE_PROFILE=sqlite-durable python scripts/bench_submissions.py
+    python scripts/bench_submissions.py --slow-clients --chunk-delay 5
+"""
+import os
+import sys
+import time
+import shutil
+import socket
+import argparse
+import tempfile
+from threading import Thread
+
+from werkzeug.serving import make_server
+
+# Ajouter le répertoire parent au chemin pour que 'app' soit importable
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+WORK_DIR = tempfile.mkdtemp(prefix='bench_submissions_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(WORK_DIR, 'bench.db')}"
+
+from app import create_app, db
+from app.models import User, Form, FormResponse
+
+FIELDS = [
+    {'id': 'f1', 'name': 'nom', 'type': 'text', 'label': 'Nom', 'required': True},
+    {'id': 'f2', 'name': 'email', 'type': 'email', 'label': 'Email'},
+    {'id': 'f3', 'name': 'commentaire', 'type': 'textarea', 'label': 'Commentaire'},
+    {'id': 'f4', 'name': 'piece_jointe', 'type': 'file', 'label': 'Pièce jointe'},
+]
+
+
+def setup(app):
+    """Créer un utilisateur et un formulaire public pour le benchmark"""
+    with app.app_context():
+        user = User(username='bench', email='bench@example.com', role='creator')
+        user.set_password('bench-password')
+        db.session.add(user)
+        db.session.commit()
+        form = Form(title='Benchmark', user_id=user.id, form_data=FIELDS, allow_anonymous=True)
+        db.session.add(form)
+        db.session.commit()
+        return form.id
+
+
+def run(app, url, threads, requests_per_thread):
+    """Lancer les soumissions concurrentes et retourner (soumissions/s, erreurs)"""
+    errors = []
+
+    def worker():
+        client = app.test_client()
+        for i in range(requests_per_thread):
+            response = client.post(url, data={
+                'nom': f'Utilisateur {i}',
+                'email': f'user{i}@example.com',
+                'commentaire': 'Intervention terminée sans réserve.'
+            })
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+    workers = [Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (threads * requests_per_thread) / elapsed, len(errors)
+
+
+def build_multipart(fields, files):
+    """Construire un corps multipart/form-data et son en-tête Content-Type"""
+    boundary = 'benchboundary7MA4YWxkTrZu0gW'
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, (filename, content) in files.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                     f'Content-Type: application/octet-stream\r\n\r\n'.encode() + content + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+def slow_post(port, path, body, content_type, chunks, chunk_delay):
+    """Envoyer une requête POST en plusieurs morceaux espacés et retourner le code HTTP"""
+    with socket.create_connection(('127.0.0.1', port)) as sock:
+        head = (f'POST {path} HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\nConnection: close\r\n\r\n').encode()
+        sock.sendall(head)
+        step = max(1, len(body) // chunks)
+        for offset in range(0, len(body), step):
+            sock.sendall(body[offset:offset + step])
+            time.sleep(chunk_delay)
+        status_line = sock.makefile('rb').readline()
+    return int(status_line.split()[1])
+
+
+def run_slow(port, path, threads, requests_per_thread, chunks, chunk_delay):
+    """Lancer des clients lents concurrents et retourner (soumissions/s, erreurs)"""
+    body, content_type = build_multipart(
+        {'nom': 'Client lent', 'email': 'lent@example.com', 'commentaire': 'Connexion mobile dégradée.'},
+        {'piece_jointe': ('rapport.txt', os.urandom(64 * 1024).hex().encode())}
+    )
+    errors = []
+
+    def worker():
+        for _ in range(requests_per_thread):
+            try:
+                status = slow_post(port, path, body, content_type, chunks, chunk_delay)
+            except OSError:
+                status = None
+            if status != 200:
+                errors.append(status)
+
+    workers = [Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return (threads * requests_per_thread) / elapsed, len(errors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--threads', type=int, default=16, help='Nombre de clients concurrents')
+    parser.add_argument('--requests', type=int, default=100, help='Soumissions par client')
+    parser.add_argument('--slow-clients', action='store_true', help='Comparer /submit et /submit/async avec des clients lents')
+    parser.add_argument('--chunks', type=int, default=8, help='Nombre de morceaux par corps de requête (clients lents)')
+    parser.add_argument('--chunk-delay', type=float, default=5, help='Délai entre deux morceaux en ms (clients lents)')
+    args = parser.parse_args()
+
+    app = create_app('production')
+    app.config['UPLOAD_FOLDER'] = os.path.join(WORK_DIR, 'uploads')
+    # Toutes les requêtes viennent de la même IP: sans cela, le banc mesurerait surtout des 429
+    app.config['RATELIMIT_ENABLED'] = False
+    form_id = setup(app)
+    url = f'/api/forms/{form_id}/submit'
+
+    try:
+        if args.slow_clients:
+            server = make_server('127.0.0.1', 0, app, threaded=True)
+            Thread(target=server.serve_forever, daemon=True).start()
+            for label, path in (('Vue synchrone', url), ('Vue async', f'{url}/async')):
+                rate, errors = run_slow(server.port, path, args.threads, args.requests,
+                                        args.chunks, args.chunk_delay / 1000.0)
+                print(f"{label:<22} {rate:10.1f} soumissions/s  ({errors} erreurs)")
+            server.shutdown()
+        else:
+            for label, group_commit in (('Commit par réponse', False), ('Group commit', True)):
+                app.config['INGEST_GROUP_COMMIT'] = group_commit
+                rate, errors = run(app, url, args.threads, args.requests)
+                print(f"{label:<22} {rate:10.1f} soumissions/s  ({errors} erreurs)")
+
+        with app.app_context():
+            print(f"Réponses enregistrées: {FormResponse.query.count()}")
+    finally:
+        shutil.rmtree(WORK_DIR, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()